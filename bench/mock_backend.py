@@ -0,0 +1,110 @@
+"""In-process stand-in for the Anthropic client, for benchmarks and soak runs.
+
+install() swaps anthropic.Anthropic for MockClient, whose messages.stream()
+replays a canned tutor JSON reply in small chunks after a configurable
+latency, and reports plausible token usage. Requests made with the reply
+or analysis prompt (split turns) get the matching part of it, and requests
+made with the exercise prompt a canned exercise batch.
+"""
+import json
+import os
+import time
+from types import SimpleNamespace
+
+CANNED_REPLY = {
+    "reply": "Great job! Remember to use the past simple for finished actions: 'I went'.",
+    "feedback": {
+        "positive": "Ai formulat clar ideea.",
+        "correction": "Folosește past simple: 'I went', nu 'I have went'.",
+        "tip": "Past simple se folosește pentru acțiuni terminate.",
+    },
+    "level": "intermediate",
+    "newWords": ["journey", "schedule"],
+    "goals": ["Exersează past simple", "Folosește articolele corect", "Vorbește despre călătorii"],
+}
+
+CANNED_EXERCISES = {
+    "exercises": [
+        {"kind": "gap_fill", "prompt": "Yesterday I ___ to the office.", "answer": "went",
+         "hint": "Past simple de la 'go'."},
+        {"kind": "translate", "prompt": "Am un interviu mâine.",
+         "answer": "I have an interview tomorrow.|I've got an interview tomorrow.",
+         "hint": "Articolul 'an' înainte de vocală."},
+        {"kind": "gap_fill", "prompt": "My ___ starts at nine every morning.", "answer": "schedule",
+         "hint": "Programul zilnic."},
+        {"kind": "translate", "prompt": "Călătoria a fost lungă.", "answer": "The journey was long.",
+         "hint": None},
+    ]
+}
+
+
+class _MockStream:
+    def __init__(self, text: str, latency_s: float, first_token_s: float):
+        self._text = text
+        self._latency_s = latency_s
+        self._first_token_s = first_token_s
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def text_stream(self):
+        time.sleep(self._first_token_s)
+        chunks = [self._text[i:i + 16] for i in range(0, len(self._text), 16)]
+        pause = max(self._latency_s - self._first_token_s, 0) / max(len(chunks), 1)
+        for chunk in chunks:
+            yield chunk
+            if pause:
+                time.sleep(pause)
+
+    def get_final_message(self):
+        usage = SimpleNamespace(
+            input_tokens=1200, output_tokens=len(self._text) // 4,
+            cache_creation_input_tokens=0, cache_read_input_tokens=0,
+        )
+        return SimpleNamespace(
+            content=[SimpleNamespace(type="text", text=self._text)],
+            stop_reason="end_turn",
+            usage=usage,
+        )
+
+
+class MockClient:
+    latency_s = 0.0
+    first_token_s = 0.0
+    reply = json.dumps(CANNED_REPLY, ensure_ascii=False)
+
+    def __init__(self, **kwargs):
+        self.messages = self
+
+    def _reply_for(self, kwargs) -> str:
+        from core.exercises import EXERCISE_SYSTEM_PROMPT
+        from core.tutor import ANALYSIS_PROMPT, REPLY_PROMPT
+
+        system = kwargs.get("system")
+        if system == EXERCISE_SYSTEM_PROMPT:
+            return json.dumps(CANNED_EXERCISES, ensure_ascii=False)
+        prompt = system[0]["text"] if isinstance(system, list) else system
+        if prompt == REPLY_PROMPT:
+            return json.loads(self.reply)["reply"]
+        if prompt == ANALYSIS_PROMPT:
+            return json.dumps({k: v for k, v in json.loads(self.reply).items() if k != "reply"}, ensure_ascii=False)
+        return self.reply
+
+    def stream(self, **kwargs):
+        return _MockStream(self._reply_for(kwargs), self.latency_s, self.first_token_s)
+
+    def create(self, **kwargs):
+        return _MockStream(self._reply_for(kwargs), 0.0, 0.0).get_final_message()
+
+
+def install(latency_s: float = 0.0, first_token_s: float = 0.0) -> None:
+    import anthropic
+
+    os.environ["ANTHROPIC_API_KEY"] = "sk-ant-mock-backend"
+    MockClient.latency_s = latency_s
+    MockClient.first_token_s = first_token_s
+    anthropic.Anthropic = MockClient
@@ -0,0 +1,427 @@
+"""Benchmark runner.
+
+Builds a synthetic database at the chosen scale, times every public
+function in db/database.py, _parse_response on valid/fenced/malformed
+input, past-mistake retrieval, word-index lookups, history import, ChatWidget.add_message and
+the MainWindow turn path (offscreen Qt, mock API backend), and writes the results as
+JSON so runs from different commits can be compared:
+
+    python -m bench.run --scale medium --out before.json
+    python -m bench.run --scale medium --out after.json --compare before.json
+"""
+import argparse
+import inspect
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+# Synthetic history spans years; keep background archival out of the timings
+os.environ.setdefault("TUTOR_ARCHIVE_DAYS", "0")
+
+from bench.synthetic import SCALES, generate  # noqa: E402
+from db import database  # noqa: E402
+
+MIN_TIME_S = 0.2
+MAX_REPEAT = 2000
+
+
+def timeit(fn, min_time_s: float = MIN_TIME_S, max_repeat: int = MAX_REPEAT) -> dict:
+    """Call fn repeatedly (after one warm-up) and summarise the per-call times in ms."""
+    fn()
+    samples = []
+    deadline = time.perf_counter() + min_time_s
+    while len(samples) < max_repeat and (len(samples) < 5 or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "n": len(samples),
+        "median_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[int(0.95 * (len(samples) - 1))], 4),
+        "min_ms": round(samples[0], 4),
+    }
+
+
+def _db_benchmarks(ctx: dict) -> dict:
+    """name -> zero-arg callable, one per public function of db.database."""
+    from core.mistakes import classify
+
+    sid = ctx["session_id"]
+    scratch = database.create_session()
+    msg = database.save_message(scratch, "assistant", "Scratch message")
+    first = database.get_messages(sid)[0]["id"]
+    head = database.get_session_head(sid)
+    fb = database.save_feedback(msg, "ok", "articolul 'an'", "tip")
+    exercise = {"kind": "gap_fill", "prompt": "I ___ to the office.", "answer": "went", "hint": None}
+    database.save_exercises(scratch, [exercise] * 8, 0)
+    queued = [database.enqueue_turn(scratch, msg) for _ in range(3)]
+    now = datetime.utcnow()
+    metrics = {
+        "kind": "chat", "model": "bench", "started_at": now, "queue_wait_ms": 1.0,
+        "ttft_ms": 300.0, "total_ms": 900.0, "input_tokens": 1000, "output_tokens": 200,
+        "cache_creation_tokens": 0, "cache_read_tokens": 0, "retries": 0,
+        "stop_reason": "end_turn", "parse_ok": True, "error": None, "cost_usd": 0.006,
+    }
+
+    def with_conn(fn):
+        def call():
+            with database.get_connection() as conn:
+                fn(conn)
+        return call
+
+    def with_shard(fn):
+        with database.shard(database.DB_PATH):
+            fn()
+
+    def with_read_only(fn):
+        with database.read_only():
+            fn()
+
+    def listen_once():
+        database.add_write_listener(print)
+        database._write_listeners.remove(print)
+
+    return {
+        "to_epoch_ms": lambda: database.to_epoch_ms(now),
+        "from_epoch_ms": lambda: database.from_epoch_ms(1_700_000_000_000),
+        "get_connection": lambda: database.get_connection().close(),
+        "current_db_path": database.current_db_path,
+        "shard": lambda: with_shard(database.get_last_session),
+        "read_only": lambda: with_read_only(database.get_cumulative_stats),
+        "add_write_listener": listen_once,
+        "init_db": database.init_db,
+        "backfill_search_index": database.backfill_search_index,
+        "search_history": lambda: database.search_history("past simple", limit=20),
+        "create_session": database.create_session,
+        "get_last_session": database.get_last_session,
+        "save_message": lambda: database.save_message(scratch, "user", "I have went to the office."),
+        "save_branch_message": lambda: database.save_branch_message(scratch, "user", "I went there.", msg),
+        "get_session_head": lambda: database.get_session_head(sid),
+        "set_session_head": lambda: database.set_session_head(scratch, msg),
+        "get_siblings": lambda: database.get_siblings(sid, head),
+        "get_branch_leaf": lambda: database.get_branch_leaf(sid, first),
+        "is_on_active_branch": lambda: database.is_on_active_branch(sid, first),
+        "save_feedback": lambda: database.save_feedback(msg, "ok", "articolul 'an'", "tip"),
+        "tag_feedback": lambda: database.tag_feedback(fb, ["articles"]),
+        "backfill_feedback_tags": lambda: database.backfill_feedback_tags(classify),
+        "get_error_profile": database.get_error_profile,
+        "get_daily_category_rollups": database.get_daily_category_rollups,
+        "get_session_corrections": lambda: database.get_session_corrections(sid),
+        "save_exercises": lambda: database.save_exercises(scratch, [exercise] * 8, 0),
+        "next_exercise": lambda: database.next_exercise(scratch),
+        "record_exercise_result": lambda: database.record_exercise_result(1, True),
+        "count_pending_exercises": lambda: database.count_pending_exercises(scratch),
+        "invalidate_exercises": lambda: database.invalidate_exercises(scratch),
+        "evict_exercises": database.evict_exercises,
+        "get_corrections": lambda: database.get_corrections(0, 500),
+        "get_corrections_by_id": lambda: database.get_corrections_by_id([fb, fb - 1, fb - 2]),
+        "save_vocabulary": lambda: database.save_vocabulary(["journey", "deadline"], scratch),
+        "save_goals": lambda: database.save_goals(["a", "b", "c"], scratch),
+        "get_goals": lambda: database.get_goals(sid),
+        "add_goal": lambda: database.add_goal("bench goal", scratch),
+        "delete_goal": lambda: database.delete_goal("bench goal", scratch),
+        "get_messages": lambda: database.get_messages(sid),
+        "get_messages_page": lambda: database.get_messages_page(sid, limit=50),
+        "get_branch_path": lambda: database.get_branch_path(head, 20),
+        "get_outbox": database.get_outbox,
+        "defer_turns": lambda: database.defer_turns(queued, "APIConnectionError"),
+        "drop_turns": lambda: database.drop_turns(queued),
+        # Dropped again, so the UI benchmarks start with an empty outbox
+        "enqueue_turn": lambda: database.drop_turns([database.enqueue_turn(scratch, msg, "context")]),
+        # Under the scratch head, which the reply then becomes
+        "attach_reply": lambda: database.attach_reply(database.get_session_head(scratch), "Reply.", []),
+        "count_messages": lambda: database.count_messages(sid, "user"),
+        "load_archived_session": with_conn(lambda c: database.load_archived_session(c, sid)),
+        "update_stats": lambda: database.update_stats(scratch, 90.0, 3, 1),
+        "get_stats": lambda: database.get_stats(sid),
+        "get_cumulative_stats": database.get_cumulative_stats,
+        "get_activity": lambda: database.get_activity(now - timedelta(days=365), now, "week"),
+        "record_daily_rollup": lambda: database.record_daily_rollup("intermediate", True, 1),
+        "get_daily_rollups": database.get_daily_rollups,
+        "save_api_metrics": lambda: database.save_api_metrics(metrics),
+        "get_api_metrics": lambda: database.get_api_metrics(now - timedelta(days=30)),
+        "get_recent_api_metrics": database.get_recent_api_metrics,
+        "update_session_level": lambda: database.update_session_level(scratch, "intermediate"),
+        "get_session_level": lambda: database.get_session_level(sid),
+        "get_vocabulary": lambda: database.get_vocabulary(sid),
+    }
+
+
+def _uncovered(benchmarks: dict) -> list[str]:
+    public = {
+        name for name, obj in vars(database).items()
+        if inspect.isfunction(obj) and obj.__module__ == database.__name__ and not name.startswith("_")
+    }
+    return sorted(public - set(benchmarks))
+
+
+def _parse_benchmarks() -> dict:
+    from core.tutor import _parse_response
+    from bench.mock_backend import CANNED_REPLY
+
+    valid = json.dumps(CANNED_REPLY, ensure_ascii=False)
+    return {
+        "valid": lambda: _parse_response(valid),
+        "fenced": lambda: _parse_response(f"```json\n{valid}\n```"),
+        "malformed": lambda: _parse_response(valid[: len(valid) // 2]),
+    }
+
+
+def _memory_benchmarks() -> dict:
+    from core import memory
+
+    while not memory.sync_memory(batch_size=5000):
+        pass
+    query = "Yesterday I have went to the interview with my colleagues."
+    return {
+        "embed": lambda: memory.embed([query]),
+        "search": lambda: memory.get_memory().search(query),
+        "recall": lambda: memory.recall(query),
+    }
+
+
+def _lexicon_benchmarks(workdir: Path) -> dict:
+    """Word-index lookups against a 100k-word list of the synthetic chat words plus filler."""
+    import random
+    import string
+    from bench.synthetic import OBJECTS, REPLIES, SUBJECTS, TAILS, VERBS, WORDS, _sentence
+    from core import lexicon
+
+    rng = random.Random(7)
+    chat = " ".join(SUBJECTS + VERBS + OBJECTS + TAILS + REPLIES + WORDS)
+    words = list(dict.fromkeys(lexicon.tokens(chat)))
+    while len(words) < 100_000:
+        words.append("".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 11))))
+    freq = workdir / "frequencies.txt"
+    freq.write_text("\n".join(words))
+    lexicon.build(freq, lexicon.default_dir())
+    index = lexicon.get_lexicon()
+    transcript = [_sentence(rng) for _ in range(10)]
+    return {
+        "build_100k": lambda: lexicon.build(freq, workdir / "lexicon-rebuild"),
+        "lookup": lambda: index.lookup("colleagues"),
+        "difficulty_10_messages": lambda: index.difficulty(transcript),
+        "rank_vocabulary": lambda: lexicon.rank_vocabulary(WORDS[:8], "intermediate"),
+        "smooth_level": lambda: lexicon.smooth_level("advanced", "intermediate", transcript),
+    }
+
+
+def _transfer_benchmarks(ctx: dict, workdir: Path) -> dict:
+    """Importing a session into a database whose newest session is archived.
+
+    Fails if the imported messages take ids the archived ones had, which
+    the rows left in the messages table alone would allow.
+    """
+    from db.archive import archive_session
+    from db.transfer import export_history, import_history
+
+    export = workdir / "session.jsonl"
+    export_history(export, session_ids=[ctx["session_id"]])
+    with database.get_connection() as conn:
+        newest = conn.execute(
+            "SELECT MAX(session_id) FROM messages WHERE session_id != ?", (ctx["session_id"],)
+        ).fetchone()[0]
+        archived = [row[0] for row in conn.execute("SELECT id FROM messages WHERE session_id = ?", (newest,))]
+        archive_session(conn, newest)
+    import_history(export)
+    with database.get_connection() as conn:
+        reused = conn.execute(
+            f"SELECT COUNT(*) FROM messages WHERE id IN ({', '.join('?' for _ in archived)})", archived
+        ).fetchone()[0]
+    if reused:
+        raise RuntimeError(f"import_history reused {reused} ids of archived messages")
+    return {"import_session": lambda: import_history(export)}
+
+
+def _ui_benchmarks(ctx: dict) -> dict:
+    from PyQt6.QtCore import QEventLoop
+    from PyQt6.QtWidgets import QApplication
+    from bench.mock_backend import CANNED_REPLY, install
+    from core.queries import query_executor
+    from ui.chat_widget import ChatWidget
+    from ui.main_window import MainWindow
+
+    install()
+    app = QApplication.instance() or QApplication(sys.argv)
+    chat = ChatWidget()
+    chat.resize(800, 600)
+    chat.show()
+    added = [0]
+
+    def add_message():
+        added[0] += 1
+        if added[0] % 500 == 0:
+            chat.clear_messages()
+        chat.add_message("Nice! Remember to use the past simple for finished actions.", "assistant")
+        app.processEvents()
+
+    # Splitter drag: widths sweep back and forth over a full transcript
+    widths = list(range(800, 500, -4)) + list(range(500, 800, 4))
+    swept = [0]
+
+    def resize_chat():
+        swept[0] += 1
+        chat.resize(widths[swept[0] % len(widths)], 600)
+        app.processEvents()
+
+    queries = query_executor()
+    window = MainWindow(session_id=ctx["session_id"])
+    window.show()
+    queries.wait()
+    app.processEvents()
+    tab = window.current_tab()
+
+    def refresh_stats():
+        tab._refresh_stats()
+        queries.wait()
+        app.processEvents()
+
+    def on_response():
+        # What the window does with a reply the outbox stored, and its analysis
+        message_id = tab._history.head.message_id
+        reply_id = database.attach_reply(message_id, CANNED_REPLY["reply"], [])
+        turn = {"outbox_ids": [], "session_id": tab.session_id, "message_id": message_id, "reply_id": reply_id}
+        window._on_reply(turn, CANNED_REPLY["reply"])
+        window._on_analysis(turn, dict(CANNED_REPLY))
+        queries.wait()
+        app.processEvents()
+
+    def full_turn():
+        loop = QEventLoop()
+        window._outbox.analysis_ready.connect(loop.quit)
+        tab._on_user_message("I have went to the office yesterday.")
+        loop.exec()
+        window._outbox.analysis_ready.disconnect(loop.quit)
+        app.processEvents()
+
+    def prewarmed_turn():
+        # The draft prepared while "typing" (off the clock would be fairer; this
+        # times the preparation too, just not on the send path)
+        tab._prewarmer.on_draft("I have went to the office yesterday.")
+        tab._prewarmer._prepare()
+        if tab._prewarmer._worker is not None:
+            tab._prewarmer._worker.wait()
+        app.processEvents()
+        full_turn()
+
+    def reload_tab():
+        # What showing a tab that was unloaded while idle costs
+        tab.unload()
+        tab.load()
+        queries.wait()
+        app.processEvents()
+
+    benchmarks = {
+        "ChatWidget.add_message": add_message,
+        "ChatWidget.resize": resize_chat,
+        "MainWindow.reply_and_analysis": on_response,
+        "MainWindow._refresh_stats": refresh_stats,
+        "MainWindow.turn_mock_backend": full_turn,
+        "MainWindow.turn_prewarmed": prewarmed_turn,
+        "SessionTab.reload": reload_tab,
+    }
+    ctx["_keepalive"] = (app, chat, window)
+    return benchmarks
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent.parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scale_name: str, groups: set[str]) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix="tutor-bench-"))
+    started = time.perf_counter()
+    counts = generate(workdir / "tutor.db", SCALES[scale_name])
+    setup_s = time.perf_counter() - started
+    with database.get_connection() as conn:
+        biggest = conn.execute(
+            "SELECT session_id FROM messages GROUP BY session_id ORDER BY COUNT(*) DESC LIMIT 1"
+        ).fetchone()[0]
+    ctx = {"session_id": biggest}
+
+    results: dict[str, dict] = {}
+    if "db" in groups:
+        benchmarks = _db_benchmarks(ctx)
+        for name in _uncovered(benchmarks):
+            print(f"warning: db.database.{name} has no benchmark", file=sys.stderr)
+        for name, fn in benchmarks.items():
+            results[f"db.{name}"] = timeit(fn)
+    if "parse" in groups:
+        for name, fn in _parse_benchmarks().items():
+            results[f"parse.{name}"] = timeit(fn)
+    if "memory" in groups:
+        for name, fn in _memory_benchmarks().items():
+            results[f"memory.{name}"] = timeit(fn)
+    if "lexicon" in groups:
+        for name, fn in _lexicon_benchmarks(workdir).items():
+            results[f"lexicon.{name}"] = timeit(fn, max_repeat=20 if name.startswith("build") else MAX_REPEAT)
+    if "ui" in groups:
+        for name, fn in _ui_benchmarks(ctx).items():
+            results[f"ui.{name}"] = timeit(fn, max_repeat=200)
+    if "transfer" in groups:
+        # Last: it archives a session and imports copies of another
+        for name, fn in _transfer_benchmarks(ctx, workdir).items():
+            results[f"transfer.{name}"] = timeit(fn, max_repeat=50)
+
+    return {
+        "commit": _git_commit(),
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale_name,
+        "rows": counts,
+        "setup_s": round(setup_s, 2),
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict) -> str:
+    lines = [f"{'benchmark':45} {'base ms':>10} {'now ms':>10} {'ratio':>7}"]
+    for name, res in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            lines.append(f"{name:45} {'—':>10} {res['median_ms']:>10.4f} {'new':>7}")
+            continue
+        ratio = res["median_ms"] / base["median_ms"] if base["median_ms"] else float("inf")
+        flag = "  <-- slower" if ratio > 1.2 else ""
+        lines.append(
+            f"{name:45} {base['median_ms']:>10.4f} {res['median_ms']:>10.4f} {ratio:>6.2f}x{flag}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the tutor benchmark suite.")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    groups = ("db", "parse", "memory", "lexicon", "ui", "transfer")
+    parser.add_argument("--only", nargs="+", choices=groups, default=groups)
+    parser.add_argument("--out", type=Path, help="write results JSON here")
+    parser.add_argument("--compare", type=Path, help="baseline results JSON to compare against")
+    args = parser.parse_args()
+
+    report = run(args.scale, set(args.only))
+    if args.out:
+        args.out.write_text(json.dumps(report, indent=2))
+    if args.compare:
+        print(compare(report, json.loads(args.compare.read_text())))
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
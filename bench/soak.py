@@ -0,0 +1,90 @@
+"""Marathon-session soak test.
+
+Drives one MainWindow through many turns against the mock API backend
+(offscreen Qt, throwaway database) and samples resident memory as it
+goes. With bounded-memory mode on, RSS should level off after the first
+few hundred turns:
+
+    python -m bench.soak --turns 10000
+    python -m bench.soak --turns 2000 --max-bubbles 0    # unbounded, for comparison
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def rss_mb() -> float:
+    """Current resident set size; falls back to peak RSS off Linux."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def soak(turns: int, sample_every: int) -> list[tuple[int, float]]:
+    from PyQt6.QtCore import QEventLoop
+    from PyQt6.QtWidgets import QApplication
+    from bench.mock_backend import install
+    from core.queries import query_executor
+    from db import database
+    from ui.main_window import MainWindow
+
+    workdir = Path(tempfile.mkdtemp(prefix="tutor-soak-"))
+    database.DATA_DIR = database.DB_DIR = workdir
+    database.DB_PATH = workdir / "tutor.db"
+    database.init_db()
+    install()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    window = MainWindow(session_id=database.create_session())
+    window.show()
+    query_executor().wait()
+    app.processEvents()
+
+    samples = []
+    for turn in range(1, turns + 1):
+        loop = QEventLoop()
+        window._outbox.analysis_ready.connect(loop.quit)
+        window.current_tab()._on_user_message(f"Turn {turn}: I have went to the office yesterday.")
+        loop.exec()
+        window._outbox.analysis_ready.disconnect(loop.quit)
+        app.processEvents()
+        if turn % sample_every == 0:
+            samples.append((turn, rss_mb()))
+            print(f"turn {turn:>6}  rss {samples[-1][1]:8.1f} MB", flush=True)
+    window.close()
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Soak-test memory over a long session.")
+    parser.add_argument("--turns", type=int, default=10_000)
+    parser.add_argument("--sample-every", type=int, default=500)
+    parser.add_argument("--max-bubbles", type=int, help="override TUTOR_MAX_BUBBLES")
+    args = parser.parse_args()
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    os.environ["TUTOR_ARCHIVE_DAYS"] = "0"
+    if args.max_bubbles is not None:
+        os.environ["TUTOR_MAX_BUBBLES"] = str(args.max_bubbles)
+
+    started = time.perf_counter()
+    samples = soak(args.turns, max(args.sample_every, 1))
+    elapsed = time.perf_counter() - started
+    if len(samples) >= 2:
+        # Ignore the first half: caches, fonts and the database settle early
+        (t0, r0), (t1, r1) = samples[len(samples) // 2], samples[-1]
+        slope = (r1 - r0) / max(t1 - t0, 1) * 1000
+        print(f"{args.turns} turns in {elapsed:.0f}s; "
+              f"second-half growth {r1 - r0:+.1f} MB ({slope:+.2f} MB per 1k turns)")
+
+
+if __name__ == "__main__":
+    main()
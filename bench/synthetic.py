@@ -0,0 +1,164 @@
+"""Synthetic learner-history generator for benchmarks.
+
+Fills a tutor database with plausible sessions, messages, feedback (with
+mistake tags), vocabulary, goals and stats spread over several years,
+using bulk inserts so even the large scale builds in seconds.
+
+    python -m bench.synthetic /tmp/tutor-large.db --scale large
+"""
+import argparse
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from db import database
+
+
+@dataclass(frozen=True)
+class Scale:
+    sessions: int
+    turns_per_session: int  # one user + one assistant message per turn
+    words_per_session: int
+    years: int
+
+
+SCALES = {
+    "small": Scale(sessions=20, turns_per_session=20, words_per_session=10, years=1),
+    "medium": Scale(sessions=300, turns_per_session=40, words_per_session=15, years=2),
+    "large": Scale(sessions=2000, turns_per_session=60, words_per_session=20, years=5),
+}
+
+LEVELS = ["beginner", "elementary", "intermediate", "upper-intermediate", "advanced"]
+SUBJECTS = ["I", "My friend", "We", "My sister", "They", "Yesterday I", "Last week we"]
+VERBS = ["go to", "have went to", "visited", "am working at", "like", "was at", "want to see"]
+OBJECTS = [
+    "the office", "school", "a restaurant", "the mountains", "my grandmother",
+    "an interview", "the cinema", "Bucharest", "a concert", "the library",
+]
+TAILS = ["yesterday.", "every weekend.", "because it is nice.", "with my colleagues.", "tomorrow."]
+REPLIES = [
+    "That sounds great! What did you like most about it?",
+    "Nice! Remember we use the past simple for finished actions: 'I went'.",
+    "Good sentence. Could you tell me more about your plans?",
+    "Interesting! Try using 'an' before words that start with a vowel sound.",
+    "Well done. How often do you do that?",
+]
+CORRECTIONS = [
+    "Folosește past simple: 'I went', nu 'I have went'.",
+    "Folosește articolul 'an' înainte de vocală: 'an interview'.",
+    "Prepoziția corectă este 'at': 'at the office'.",
+    "Ordinea cuvintelor: 'I always go', nu 'I go always'.",
+    "La persoana a treia singular se adaugă -s: 'she likes'.",
+    "Ai scris greșit: 'because', nu 'becouse'.",
+]
+TIPS = [
+    "Present perfect se folosește pentru experiențe fără moment precis.",
+    "'Since' se folosește cu un moment, 'for' cu o durată.",
+    "Adverbele de frecvență stau înaintea verbului principal.",
+]
+WORDS = [
+    "schedule", "colleague", "interview", "journey", "appointment", "deadline", "improve",
+    "achieve", "experience", "opportunity", "challenge", "neighbourhood", "recipe", "borrow",
+    "afford", "reliable", "comfortable", "environment", "knowledge", "suggest", "mention",
+]
+GOALS = [
+    "Exersează past simple", "Folosește articolele corect", "Învață 10 cuvinte noi pe săptămână",
+    "Vorbește despre planurile de viitor", "Pregătește-te pentru un interviu",
+]
+
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join((rng.choice(SUBJECTS), rng.choice(VERBS), rng.choice(OBJECTS), rng.choice(TAILS)))
+
+
+def generate(db_path: Path, scale: Scale, seed: int = 42) -> dict:
+    """Create and fill a fresh database at db_path; returns row counts."""
+    from core.mistakes import classify
+
+    rng = random.Random(seed)
+    database.DATA_DIR = database.DB_DIR = db_path.parent
+    database.DB_PATH = db_path
+    if db_path.exists():
+        db_path.unlink()
+    database.init_db()
+
+    start = datetime.utcnow() - timedelta(days=365 * scale.years)
+    span = timedelta(days=365 * scale.years).total_seconds()
+    counts = {"sessions": 0, "messages": 0, "feedback": 0, "vocabulary": 0, "goals": 0}
+    with database.get_connection() as conn:
+        message_id = 0
+        feedback_id = 0
+        for s in range(scale.sessions):
+            created = start + timedelta(seconds=span * s / scale.sessions)
+            level = LEVELS[min(len(LEVELS) - 1, s * len(LEVELS) // scale.sessions)]
+            session_id = conn.execute(
+                "INSERT INTO sessions (created_at, level, total_messages) VALUES (?, ?, ?)",
+                (created, level, scale.turns_per_session * 2),
+            ).lastrowid
+
+            messages, feedback, tags = [], [], []
+            corrections = 0
+            parent = None
+            for turn in range(scale.turns_per_session):
+                ts = created + timedelta(seconds=40 * turn)
+                messages.append((message_id + 1, session_id, "user", _sentence(rng), ts, parent))
+                messages.append((message_id + 2, session_id, "assistant", rng.choice(REPLIES),
+                                 ts + timedelta(seconds=3), message_id + 1))
+                message_id += 2
+                parent = message_id
+                correction = rng.choice(CORRECTIONS) if rng.random() < 0.4 else None
+                corrections += correction is not None
+                feedback_id += 1
+                feedback.append((feedback_id, message_id, "Bine formulat!", correction, rng.choice(TIPS)))
+                tags += [(feedback_id, c) for c in classify(correction)]
+            conn.executemany(
+                "INSERT INTO messages (id, session_id, role, content, timestamp, parent_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                messages,
+            )
+            conn.execute("UPDATE sessions SET head_id = ? WHERE id = ?", (message_id, session_id))
+            conn.executemany(
+                "INSERT INTO feedback (id, message_id, positive, correction, tip) VALUES (?, ?, ?, ?, ?)",
+                feedback,
+            )
+            database._insert_feedback_tags(conn, tags)
+            words = rng.sample(WORDS, min(scale.words_per_session, len(WORDS)))
+            conn.executemany(
+                "INSERT OR IGNORE INTO vocabulary (word, first_seen, session_id) VALUES (?, ?, ?)",
+                [(w, created, session_id) for w in words],
+            )
+            goals = rng.sample(GOALS, 3)
+            conn.executemany(
+                "INSERT INTO goals (goal_text, created_at, session_id) VALUES (?, ?, ?)",
+                [(g, created, session_id) for g in goals],
+            )
+            accuracy = 100.0 - corrections / scale.turns_per_session * 100
+            conn.execute(
+                "INSERT INTO stats (session_id, accuracy_pct, words_learned, corrections_count) "
+                "VALUES (?, ?, ?, ?)",
+                (session_id, accuracy, len(words), corrections),
+            )
+            counts["sessions"] += 1
+            counts["messages"] += len(messages)
+            counts["feedback"] += len(feedback)
+            counts["vocabulary"] += len(words)
+            counts["goals"] += len(goals)
+        database._rebuild_daily_rollups(conn)
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic tutor database.")
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    started = time.perf_counter()
+    counts = generate(args.path, SCALES[args.scale], args.seed)
+    print(f"{counts} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Time-series views over the daily_rollups table.
+
+Rollups are loaded once into NumPy arrays and every series the dashboard
+draws is derived from them with vectorised operations, so the cost depends
+on the number of days, never on the number of messages.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+LEVELS = ["beginner", "elementary", "intermediate", "upper-intermediate", "advanced"]
+_LEVEL_RANK = {name: rank for rank, name in enumerate(LEVELS)}
+
+
+@dataclass
+class Rollups:
+    """Dense per-day arrays; index 0 is first_day, gaps are zero-filled."""
+
+    first_day: int
+    user_messages: np.ndarray
+    corrections: np.ndarray
+    new_words: np.ndarray
+    level: np.ndarray  # rank into LEVELS, -1 where unknown
+    level_changes: np.ndarray
+
+    @property
+    def days(self) -> np.ndarray:
+        return np.arange(self.first_day, self.first_day + len(self.user_messages))
+
+
+def from_rows(rows) -> Rollups:
+    """Scatter sparse rollup rows into dense day-indexed arrays."""
+    if not rows:
+        empty = np.zeros(0, dtype=np.int64)
+        return Rollups(0, empty, empty, empty, empty, empty)
+    cols = list(zip(*(
+        (r["day"], r["user_messages"], r["corrections"], r["new_words"],
+         _LEVEL_RANK.get(r["level"], -1), r["level_changes"])
+        for r in rows
+    )))
+    day = np.asarray(cols[0], dtype=np.int64)
+    first = int(day[0])
+    idx = day - first
+    size = int(idx[-1]) + 1
+
+    def dense(values, fill=0):
+        out = np.full(size, fill, dtype=np.int64)
+        out[idx] = np.asarray(values, dtype=np.int64)
+        return out
+
+    level = dense(cols[4], fill=-1)
+    # Carry the last known level across idle days
+    known = np.where(level >= 0, np.arange(size), 0)
+    np.maximum.accumulate(known, out=known)
+    level = np.where(level[known] >= 0, level[known], -1)
+    return Rollups(first, dense(cols[1]), dense(cols[2]), dense(cols[3]), level, dense(cols[5]))
+
+
+def load_rollups(since_day: int = 0) -> Rollups:
+    from db.database import get_daily_rollups
+
+    return from_rows(get_daily_rollups(since_day))
+
+
+def rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    csum = np.cumsum(values, dtype=np.float64)
+    csum[window:] = csum[window:] - csum[:-window]
+    return csum
+
+
+def accuracy_trend(r: Rollups, window: int = 7) -> np.ndarray:
+    """Percent of user messages without a correction over a trailing window (NaN when idle)."""
+    msgs = rolling_sum(r.user_messages, window)
+    corr = rolling_sum(r.corrections, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        acc = 100.0 * (1.0 - corr / msgs)
+    acc[msgs == 0] = np.nan
+    return np.clip(acc, 0.0, 100.0)
+
+
+def weekly_totals(r: Rollups, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Sum a daily series per ISO week; returns (week start days, totals)."""
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    week = (r.days + 3) // 7  # epoch day 0 was a Thursday
+    week -= week[0]
+    totals = np.bincount(week, weights=values).astype(np.int64)
+    starts = (np.arange(len(totals)) + (r.first_day + 3) // 7) * 7 - 3
+    return starts, totals
+
+
+def level_transitions(r: Rollups) -> np.ndarray:
+    """Day numbers on which the level changed."""
+    return r.days[r.level_changes > 0]
+
+
+def category_rates(r: Rollups, category_rows, window: int = 30) -> dict[str, tuple[float, float]]:
+    """Corrections per 100 user messages, per category, for the last `window`
+    days and the `window` days before that: {category: (current, previous)}."""
+    if not category_rows or len(r.user_messages) == 0:
+        return {}
+    names = sorted({row["category"] for row in category_rows})
+    index = {name: i for i, name in enumerate(names)}
+    day = np.fromiter((row["day"] for row in category_rows), dtype=np.int64)
+    cat = np.fromiter((index[row["category"]] for row in category_rows), dtype=np.int64)
+    count = np.fromiter((row["count"] for row in category_rows), dtype=np.float64)
+
+    last_day = r.first_day + len(r.user_messages) - 1
+    rates = []
+    for lo, hi in ((last_day - window, last_day), (last_day - 2 * window, last_day - window)):
+        in_window = (day > lo) & (day <= hi)
+        totals = np.bincount(cat[in_window], weights=count[in_window], minlength=len(names))
+        msgs = r.user_messages[max(lo + 1 - r.first_day, 0):max(hi + 1 - r.first_day, 0)].sum()
+        rates.append(100.0 * totals / msgs if msgs else np.zeros(len(names)))
+    return {name: (float(rates[0][i]), float(rates[1][i])) for name, i in index.items()}
@@ -0,0 +1,246 @@
+"""Quiz exercises generated ahead of time from the learner's own material.
+
+While the learner chats, ExercisePrefetcher keeps a small queue of gap-fill
+and translation exercises per session in the exercises table. It builds
+them in the background from the session's vocabulary and latest
+corrections, one API call per batch. Serving the next exercise and
+checking an answer are local reads, so quiz mode never waits on the
+network. New vocabulary marks the queued batch stale; stale exercises are
+still served when nothing fresher exists, and are replaced by the next
+batch. Old exercises expire after EXERCISE_TTL_DAYS, and the table keeps at
+most MAX_EXERCISES, least recently used evicted first.
+"""
+import logging
+import os
+import re
+import time
+import unicodedata
+from functools import partial
+
+from PyQt6.QtCore import QObject, QThread, pyqtSignal
+
+from core.tutor import MAX_RETRIES, MODEL, _is_retryable, _parse_response_checked, _record_metrics
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 8
+LOW_WATER = 3  # refill when fewer unserved exercises than this remain
+MIN_REFILL_INTERVAL_S = 120
+EXERCISE_TTL_DAYS = 7
+MAX_EXERCISES = 500
+MAX_TOKENS = 1500
+KINDS = ("gap_fill", "translate")
+KIND_LABELS = {"gap_fill": "Completează spațiul liber", "translate": "Tradu în engleză"}
+
+EXERCISE_SYSTEM_PROMPT = """Ești Alex, profesor de engleză pentru vorbitori de română. Creezi exerciții scurte
+de recapitulare pe baza vocabularului și a greșelilor recente ale elevului.
+
+Tipuri de exerciții:
+- "gap_fill": o propoziție în engleză cu un singur spațiu liber marcat "___"; răspunsul este cuvântul lipsă
+- "translate": o propoziție scurtă în română; răspunsul este traducerea în engleză
+
+Pentru răspunsurile care acceptă mai multe variante, separă variantele cu "|".
+
+Returnează DOAR un JSON valid cu această structură:
+{
+  "exercises": [
+    {"kind": "gap_fill", "prompt": "I ___ to the office yesterday.", "answer": "went", "hint": "past simple de la 'go'"},
+    {"kind": "translate", "prompt": "Am un interviu mâine.", "answer": "I have an interview tomorrow.|I've got an interview tomorrow.", "hint": "articolul 'an' înainte de vocală"}
+  ]
+}"""
+
+
+def build_request(words: list[str], corrections: list[str], level: str, count: int = BATCH_SIZE) -> str:
+    lines = [f"Nivelul elevului: {level}.", f"Creează {count} exerciții, amestecând cele două tipuri."]
+    if words:
+        lines.append("Vocabular de exersat: " + ", ".join(words))
+    if corrections:
+        lines.append("Greșeli recente de exersat:\n" + "\n".join(f"- {c}" for c in corrections))
+    return "\n".join(lines)
+
+
+def parse_exercises(raw: str) -> list[dict]:
+    """Well-formed exercises from a model reply; anything malformed is dropped."""
+    data, ok = _parse_response_checked(raw)
+    if not ok or not isinstance(data, dict):
+        return []
+    exercises = []
+    for item in data.get("exercises") or []:
+        if not isinstance(item, dict) or item.get("kind") not in KINDS:
+            continue
+        prompt, answer = str(item.get("prompt") or "").strip(), str(item.get("answer") or "").strip()
+        if prompt and answer and (item["kind"] != "gap_fill" or "___" in prompt):
+            exercises.append({"kind": item["kind"], "prompt": prompt, "answer": answer,
+                              "hint": str(item.get("hint") or "").strip() or None})
+    return exercises
+
+
+def _normalise_answer(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).replace("’", "'").casefold()
+    return " ".join(re.sub(r"[^\w\s']", " ", text).split())
+
+
+def check_answer(answer: str, given: str) -> bool:
+    """True if given matches one of the "|"-separated accepted answers (case and punctuation aside)."""
+    given = _normalise_answer(given)
+    return bool(given) and any(given == _normalise_answer(a) for a in answer.split("|"))
+
+
+def _store_batch(session_id: int, exercises: list[dict], vocab_size: int) -> int:
+    """Store a batch and evict expired exercises; returns how many were stored. Runs on the writer thread."""
+    from db.database import evict_exercises, save_exercises
+
+    stored = save_exercises(session_id, exercises, vocab_size)
+    evict_exercises(EXERCISE_TTL_DAYS, MAX_EXERCISES)
+    return stored
+
+
+class ExerciseWorker(QThread):
+    """Generates one batch of exercises for a session and stores it.
+
+    A session with nothing to practise yet gets an empty batch (0 stored).
+    """
+
+    batch_ready = pyqtSignal(int)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, session_id: int, level: str, parent=None):
+        super().__init__(parent)
+        self._session_id = session_id
+        self._level = level
+
+    def run(self) -> None:
+        from core.telemetry import ApiCallMetrics
+        from core.queries import query_executor
+        from db.database import get_session_corrections, get_vocabulary
+
+        started = time.perf_counter()
+        metrics = ApiCallMetrics(kind="exercises", model=MODEL)
+        try:
+            import anthropic
+
+            api_key = os.getenv("ANTHROPIC_API_KEY", "")
+            if not api_key or api_key.startswith("sk-ant-your"):
+                self.error_occurred.emit("⚠️  No valid ANTHROPIC_API_KEY found. Please set it in your .env file.")
+                return
+            words = get_vocabulary(self._session_id)
+            corrections = [r["correction"] for r in get_session_corrections(self._session_id)]
+            if not words and not corrections:
+                self.batch_ready.emit(0)
+                return
+            request = build_request(words[-30:], corrections, self._level)
+
+            client = anthropic.Anthropic(api_key=api_key, max_retries=0)
+            while True:
+                try:
+                    message = client.messages.create(
+                        model=MODEL,
+                        max_tokens=MAX_TOKENS,
+                        system=EXERCISE_SYSTEM_PROMPT,
+                        messages=[{"role": "user", "content": request}],
+                    )
+                    break
+                except Exception as exc:  # noqa: BLE001
+                    if metrics.retries >= MAX_RETRIES or not _is_retryable(exc):
+                        raise
+                    metrics.retries += 1
+                    time.sleep(2 ** (metrics.retries - 1))
+            exercises = parse_exercises(message.content[0].text)
+            metrics.parse_ok = bool(exercises)
+            metrics.stop_reason = message.stop_reason
+            metrics.record_usage(message.usage)
+            metrics.total_ms = (time.perf_counter() - started) * 1000
+            _record_metrics(metrics)
+
+            if self.isInterruptionRequested():
+                return
+            stored = query_executor().write(_store_batch, self._session_id, exercises, len(words)).result()
+            self.batch_ready.emit(stored)
+        except Exception as exc:  # noqa: BLE001
+            metrics.error = type(exc).__name__
+            metrics.total_ms = (time.perf_counter() - started) * 1000
+            _record_metrics(metrics)
+            self.error_occurred.emit(f"⚠️  Exercise generation error: {exc}")
+
+
+class ExercisePrefetcher(QObject):
+    """Keeps each session's exercise queue topped up, one batch in flight at a time.
+
+    A forced refill asked for while a batch is in flight starts when it lands.
+    """
+
+    batch_ready = pyqtSignal(int, int)  # session id, exercises stored
+    error_occurred = pyqtSignal(int, str)  # session id, message
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._worker: ExerciseWorker | None = None
+        self._queued: tuple[int, str] | None = None
+        self._last_refill = float("-inf")
+
+    @property
+    def busy(self) -> bool:
+        return self._worker is not None
+
+    def maybe_refill(self, session_id: int, level: str, force: bool = False) -> None:
+        """Start a batch if the queue is running low (counted on the query executor)."""
+        from core.queries import query_executor
+        from db.database import count_pending_exercises
+
+        if self._worker is not None:
+            if force:
+                self._queued = (session_id, level)
+            return
+        if not force and time.monotonic() - self._last_refill < MIN_REFILL_INTERVAL_S:
+            return
+        query_executor().read(count_pending_exercises, session_id,
+                              callback=partial(self._refill_if_low, session_id, level, force))
+
+    def _refill_if_low(self, session_id: int, level: str, force: bool, pending: int):
+        if pending >= LOW_WATER:
+            return
+        if not force and time.monotonic() - self._last_refill < MIN_REFILL_INTERVAL_S:
+            return  # another check started one meanwhile
+        if self._worker is not None:  # started by another check meanwhile
+            if force:
+                self._queued = (session_id, level)
+            return
+        self._last_refill = time.monotonic()
+        self._worker = ExerciseWorker(session_id, level, self)
+        self._worker.batch_ready.connect(partial(self.batch_ready.emit, session_id))
+        self._worker.error_occurred.connect(partial(self._on_error, session_id))
+        self._worker.finished.connect(self._release_worker)
+        self._worker.start()
+
+    def _on_error(self, session_id: int, message: str):
+        log.warning("Session %d: %s", session_id, message)
+        self.error_occurred.emit(session_id, message)
+
+    def _release_worker(self):
+        worker, self._worker = self._worker, None
+        if worker is not None:
+            worker.deleteLater()
+        if self._queued is not None:
+            (session_id, level), self._queued = self._queued, None
+            self.maybe_refill(session_id, level, force=True)
+
+    def stop(self, timeout_ms: int = 2000) -> None:
+        """Give an in-flight batch a moment to finish; a later reply is dropped, not stored."""
+        self._queued = None
+        if self._worker is not None:
+            self._worker.requestInterruption()
+            self._worker.wait(timeout_ms)
+
+
+def exercise_payload(row) -> dict:
+    """The bits of an exercises row the quiz dialog shows."""
+    return {
+        "id": row["id"],
+        "kind": row["kind"],
+        "label": KIND_LABELS.get(row["kind"], row["kind"]),
+        "prompt": row["prompt"],
+        "answer": row["answer"],
+        "hint": row["hint"],
+        "repeat": row["served_count"] > 0,
+    }
+
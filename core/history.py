@@ -0,0 +1,109 @@
+"""Fixed-capacity conversation history for the API context window.
+
+The history is a persistent chain: each Turn points at its parent and is
+never modified, so branches of a conversation (edits of an earlier
+message) share their common prefix instead of copying it. Moving between
+branches just moves the head.
+"""
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class Turn:
+    role: str
+    content: str
+    parent: "Turn | None" = None
+    message_id: int | None = None
+    depth: int = 1
+
+
+class HistoryRing:
+    """The last `capacity` turns of the current branch, plus running counts.
+
+    Once the chain is twice as deep as it needs to be, the retained turns
+    are relinked onto a fresh root and the older ones left to the garbage
+    collector, so a session left open for days keeps a bounded footprint;
+    the full transcript stays in the database.
+    """
+
+    def __init__(self, capacity: int):
+        self._capacity = capacity
+        self._head: Turn | None = None
+        self.user_count = 0
+
+    def append(self, role: str, content: str, message_id: int | None = None) -> None:
+        self._push(role, content, message_id)
+        if role == "user":
+            self.user_count += 1
+
+    def _push(self, role: str, content: str, message_id: int | None) -> None:
+        head = self._head
+        self._head = Turn(role, content, head, message_id, head.depth + 1 if head else 1)
+        if self._head.depth > 2 * self._capacity:
+            turns = self._turns()
+            self._head = None
+            for turn in turns:
+                self._push(turn.role, turn.content, turn.message_id)
+
+    def extend(self, rows) -> None:
+        for row in rows:
+            self.append(row["role"], row["content"], row["id"])
+
+    def _turns(self) -> list[Turn]:
+        turns, turn = [], self._head
+        while turn is not None and len(turns) < self._capacity:
+            turns.append(turn)
+            turn = turn.parent
+        return turns[::-1]
+
+    def window(self) -> list[dict]:
+        """Snapshot of the retained turns, oldest first."""
+        return [{"role": t.role, "content": t.content} for t in self._turns()]
+
+    @property
+    def head(self) -> Turn | None:
+        return self._head
+
+    def fork(self, message_id: int | None) -> bool:
+        """Move the head back to the turn for message_id (None: before the first turn).
+
+        Returns False if that turn is no longer retained; the caller should
+        checkout() the branch from the database instead.
+        """
+        if message_id is None:
+            self._head = None
+            return True
+        turn = self._head
+        for _ in range(self._capacity):
+            if turn is None:
+                break
+            if turn.message_id == message_id:
+                self._head = turn
+                return True
+            turn = turn.parent
+        return False
+
+    def checkout(self, rows) -> None:
+        """Make rows (the newest stretch of a branch, oldest first) the current branch.
+
+        Turns this branch shares with the current one are reused; only the
+        divergent suffix is rebuilt.
+        """
+        retained = {t.message_id: t for t in self._turns() if t.message_id is not None}
+        start = 0
+        self._head = None
+        for i in range(len(rows) - 1, -1, -1):
+            if rows[i]["id"] in retained:
+                self._head, start = retained[rows[i]["id"]], i + 1
+                break
+        if len(rows) - start > self._capacity:
+            self._head, start = None, len(rows) - self._capacity
+        for row in rows[start:]:
+            self._push(row["role"], row["content"], row["id"])
+
+    def clear(self) -> None:
+        self._head = None
+        self.user_count = 0
+
+    def __len__(self) -> int:
+        return min(self._head.depth, self._capacity) if self._head else 0
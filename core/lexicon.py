@@ -0,0 +1,381 @@
+"""Offline word index: frequency rank, CEFR band and lemma of English words.
+
+The index is built once from a frequency list (and optionally a CEFR word
+list) with ``python -m core.lexicon build`` and stored as .npy files next
+to the database. At run time it is memory-mapped on first use. Words are
+found by a 64-bit hash in an open-addressing table at most half full, so
+a lookup is one or two probes whatever the size of the list.
+
+It is used to drop trivial words from the model's ``newWords`` before
+they are saved, and to estimate the lexical difficulty of the learner's
+recent messages, which smooths the level the model reports turn by turn.
+Without a built index both fall back to the model's output unchanged.
+"""
+import argparse
+import hashlib
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from core.analytics import LEVELS
+
+BANDS = ["A1", "A2", "B1", "B2", "C1", "C2"]
+# Band for words missing from the CEFR list, by frequency rank (upper bounds)
+BAND_RANKS = (500, 1000, 2000, 4000, 8000)
+# The most frequent words (articles, pronouns, auxiliaries) are never worth saving
+STOPWORD_RANK = 150
+MAX_WORD_LEN = 32
+DEFAULT_LIMIT = 100_000
+MIN_CONTENT_WORDS = 3
+# Even advanced writing is mostly A1-A2 content words, so the mean band of a
+# message is stretched onto the five levels
+DIFFICULTY_SCALE = 2.0
+RECENCY_DECAY = 0.8
+
+_ENTRY = np.dtype([("key", "<u8"), ("rank", "<u4"), ("lemma", "<u4"), ("band", "u1")])
+_WORD = re.compile(r"[a-z]+(?:'[a-z]+)?")
+_CLITICS = ("n't", "'s", "'re", "'ll", "'ve", "'d", "'m")
+_NEGATIONS = {"can't": "can", "won't": "will", "shan't": "shall", "ain't": "be"}
+
+# Irregular forms the suffix rules in _lemma_candidates cannot reach
+_IRREGULAR = dict(pair.split(":") for pair in """
+    am:be is:be are:be was:be were:be been:be has:have had:have does:do did:do done:do
+    went:go gone:go made:make said:say got:get gotten:get took:take taken:take saw:see seen:see
+    came:come knew:know known:know thought:think gave:give given:give found:find told:tell
+    became:become felt:feel left:leave brought:bring began:begin begun:begin kept:keep
+    held:hold wrote:write written:write stood:stand heard:hear meant:mean met:meet ran:run
+    paid:pay sat:sit spoke:speak spoken:speak led:lead grew:grow grown:grow lost:lose
+    fell:fall fallen:fall sent:send built:build understood:understand drew:draw drawn:draw
+    broke:break broken:break spent:spend rose:rise risen:rise drove:drive driven:drive
+    bought:buy wore:wear worn:wear chose:choose chosen:choose ate:eat eaten:eat slept:sleep
+    taught:teach caught:catch fought:fight flew:fly flown:fly forgot:forget forgotten:forget
+    sold:sell won:win sang:sing sung:sing swam:swim children:child men:man women:woman
+    people:person feet:foot teeth:tooth mice:mouse better:good best:good worse:bad worst:bad
+""".split())
+
+
+class Entry(NamedTuple):
+    rank: int  # 1 = most frequent
+    band: str
+    lemma: str
+
+
+@lru_cache(maxsize=1 << 16)
+def _key(word: str) -> int:
+    key = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+    return key or 1  # 0 marks an empty slot
+
+
+def _normalise(token: str) -> str:
+    token = token.lower().replace("’", "'")
+    if token in _NEGATIONS:
+        return _NEGATIONS[token]
+    for clitic in _CLITICS:
+        if token.endswith(clitic) and len(token) > len(clitic):
+            return token[: -len(clitic)]
+    return token
+
+
+def tokens(text: str) -> list[str]:
+    return [_normalise(t) for t in _WORD.findall(text.lower().replace("’", "'"))]
+
+
+class Lexicon:
+    """Read-only view over a built index directory."""
+
+    def __init__(self, directory: Path):
+        directory = Path(directory)
+        self._table = np.load(directory / "table.npy", mmap_mode="r")
+        self._words = np.load(directory / "words.npy", mmap_mode="r")
+        self._keys = self._table["key"]
+        self._mask = len(self._table) - 1
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def _slot(self, word: str) -> int:
+        key = _key(word)
+        slot = key & self._mask
+        while True:
+            found = int(self._keys[slot])
+            if found == key:
+                return slot
+            if found == 0:
+                return -1
+            slot = (slot + 1) & self._mask
+
+    def lookup(self, word: str) -> Entry | None:
+        """Entry for word, or for its lemma when only that is listed ("colleagues")."""
+        word = _normalise(word.strip())
+        slot = self._slot(word)
+        for candidate in _lemma_candidates(word) if slot < 0 else ():
+            slot = self._slot(candidate)
+            if slot >= 0:
+                break
+        if slot < 0:
+            return None
+        row = self._table[slot]
+        return Entry(int(row["rank"]), BANDS[row["band"]], self._words[row["lemma"]].decode())
+
+    def lookup_many(self, words: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """(rank, band index) per word, 0 and -1 for unknown words; probes all words at once."""
+        keys = np.fromiter((_key(w) for w in words), dtype=np.uint64, count=len(words))
+        slots = keys & np.uint64(self._mask)
+        found = np.full(len(words), -1, dtype=np.int64)
+        pending = np.arange(len(words))
+        while len(pending):
+            at = self._keys[slots[pending]]
+            hit = at == keys[pending]
+            found[pending[hit]] = slots[pending[hit]]
+            pending = pending[~hit & (at != 0)]
+            slots[pending] = (slots[pending] + np.uint64(1)) & np.uint64(self._mask)
+        rows = self._table[np.maximum(found, 0)]
+        known = found >= 0
+        # Widen before filling in the -1s, which uint8 bands would wrap to 255
+        return (np.where(known, rows["rank"].astype(np.int64), 0),
+                np.where(known, rows["band"].astype(np.int64), -1))
+
+    def difficulty(self, texts: list[str]) -> np.ndarray:
+        """Lexical difficulty of each text on the LEVELS scale (0 = beginner).
+
+        The mean CEFR band of the known words below the stopword ranks,
+        stretched by DIFFICULTY_SCALE; NaN for texts with fewer than
+        MIN_CONTENT_WORDS such words.
+        """
+        per_text = [tokens(t) for t in texts]
+        owner = np.repeat(np.arange(len(texts)), [len(t) for t in per_text])
+        rank, band = self.lookup_many([w for t in per_text for w in t])
+        content = rank > STOPWORD_RANK
+        counts = np.bincount(owner[content], minlength=len(texts))
+        totals = np.bincount(owner[content], weights=band[content], minlength=len(texts))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            score = totals / counts * DIFFICULTY_SCALE
+        score = np.minimum(score, len(LEVELS) - 1)
+        score[counts < MIN_CONTENT_WORDS] = np.nan
+        return score
+
+
+_lexicon: Lexicon | None = None
+_lexicon_dir: Path | None = None
+_lexicon_lock = threading.Lock()
+
+
+def default_dir() -> Path:
+    from db import database
+
+    return database.DATA_DIR / "lexicon"
+
+
+def get_lexicon() -> Lexicon | None:
+    """The shared word index, or None if it was never built."""
+    global _lexicon, _lexicon_dir
+    directory = default_dir()
+    with _lexicon_lock:
+        if _lexicon_dir != directory:
+            _lexicon_dir = directory
+            _lexicon = Lexicon(directory) if (directory / "table.npy").exists() else None
+        return _lexicon
+
+
+def rank_vocabulary(words: list[str], level: str) -> list[str]:
+    """The model's new words worth saving at this level, most frequent first.
+
+    Drops stopwords, words more than one band below the learner's level and
+    repeats of the same lemma. Phrases and words missing from the index are
+    kept, phrases ranked by their rarest word and unknown words last.
+    """
+    lexicon = get_lexicon()
+    if lexicon is None:
+        return list(words)
+    min_band = LEVELS.index(level) - 1 if level in LEVELS else 0
+    kept, lemmas = [], set()
+    for word in words:
+        word = word.strip()
+        parts = tokens(word)
+        if not parts:
+            continue
+        if len(parts) > 1:
+            rank = int(lexicon.lookup_many(parts)[0].max()) or DEFAULT_LIMIT + 1
+            kept.append((rank, word))
+            continue
+        entry = lexicon.lookup(parts[0])
+        if entry is None:
+            kept.append((DEFAULT_LIMIT + 1, word))
+            continue
+        if entry.rank <= STOPWORD_RANK or BANDS.index(entry.band) < min_band or entry.lemma in lemmas:
+            continue
+        lemmas.add(entry.lemma)
+        kept.append((entry.rank, word))
+    kept.sort(key=lambda item: item[0])
+    return [word for _, word in kept]
+
+
+def smooth_level(proposed: str, current: str, recent_texts: list[str]) -> str:
+    """The level to record, given the model's and the learner's recent messages.
+
+    Moves at most one step from current, and only in the model's direction
+    when the average of the model's level and the local lexical estimate
+    (recent messages weighted by RECENCY_DECAY) gets half a level past it.
+    """
+    lexicon = get_lexicon()
+    if lexicon is None:
+        return proposed
+    if proposed not in LEVELS:
+        return current
+    if current not in LEVELS or proposed == current:
+        return proposed
+    scores = lexicon.difficulty(recent_texts)
+    weights = RECENCY_DECAY ** np.arange(len(scores))[::-1]
+    valid = ~np.isnan(scores)
+    if not valid.any():
+        return proposed
+    estimate = float(np.average(scores[valid], weights=weights[valid]))
+    here, there = LEVELS.index(current), LEVELS.index(proposed)
+    blended = (there + estimate) / 2
+    if there > here and blended >= here + 0.5:
+        return LEVELS[here + 1]
+    if there < here and blended <= here - 0.5:
+        return LEVELS[here - 1]
+    return current
+
+
+# -- building ---------------------------------------------------------------
+
+def _read_frequencies(path: Path, limit: int) -> list[str]:
+    """Words from a frequency list, most frequent first.
+
+    One word per line, optionally followed by a count (``word 1234`` or
+    ``word<TAB>1234``); without counts the file order is the rank order.
+    """
+    counted = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f):
+            fields = line.split()
+            if not fields:
+                continue
+            word = fields[0].lower().replace("’", "'")
+            if not _WORD.fullmatch(word) or len(word.encode()) > MAX_WORD_LEN:
+                continue
+            count = float(fields[1]) if len(fields) > 1 and fields[1].replace(".", "", 1).isdigit() else None
+            counted.append((-count if count is not None else line_no, word))
+    counted.sort(key=lambda item: item[0])
+    seen, words = set(), []
+    for _, word in counted:
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+            if len(words) == limit:
+                break
+    return words
+
+
+def _read_cefr(path: Path) -> dict[str, int]:
+    """word -> band index from ``word,band`` lines (comma, tab or space separated)."""
+    bands: dict[str, int] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = re.split(r"[,\t ]+", line.strip())
+            if len(fields) < 2 or fields[-1].upper() not in BANDS:
+                continue
+            word = " ".join(fields[:-1]).lower()
+            if _WORD.fullmatch(word):
+                band = BANDS.index(fields[-1].upper())
+                bands[word] = min(band, bands.get(word, band))
+    return bands
+
+
+def _lemma_candidates(word: str):
+    if word in _IRREGULAR:
+        yield _IRREGULAR[word]
+    for suffix, replacements in (("ies", ("y",)), ("ied", ("y",)), ("ier", ("y",)), ("iest", ("y",)),
+                                 ("es", ("", "e")), ("s", ("",)), ("ed", ("", "e")),
+                                 ("ing", ("", "e")), ("er", ("", "e")), ("est", ("", "e"))):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 2:
+            stem = word[: -len(suffix)]
+            for replacement in replacements:
+                yield stem + replacement
+            if len(stem) >= 3 and stem[-1] == stem[-2]:
+                yield stem[:-1]  # stopped, running, bigger
+
+
+def build(frequency_path: Path, out_dir: Path, cefr_path: Path | None = None,
+          limit: int = DEFAULT_LIMIT) -> int:
+    """Write the index for a frequency list (and CEFR list) into out_dir; returns its size."""
+    words = _read_frequencies(frequency_path, limit)
+    cefr = _read_cefr(cefr_path) if cefr_path else {}
+    # Words the CEFR list has but the frequency list missed go after the rest
+    listed = set(words)
+    words += sorted(w for w in cefr if w not in listed)
+    index = {word: i for i, word in enumerate(words)}
+
+    lemma = np.arange(len(words), dtype=np.uint32)
+    for i, word in enumerate(words):
+        for candidate in _lemma_candidates(word):
+            j = index.get(candidate)
+            if j is not None and j != i and (j < i or word in _IRREGULAR):
+                lemma[i] = j
+                break
+    # Inflected forms are as easy as their lemma: "went" goes with "go"
+    rank = np.minimum(np.arange(1, len(words) + 1), lemma + 1)
+    band = np.searchsorted(np.asarray(BAND_RANKS), rank, side="left").astype(np.uint8)
+    for word, b in cefr.items():
+        band[index[word]] = b
+    band = np.minimum(band, band[lemma])
+
+    capacity = 1 << max((2 * len(words) - 1).bit_length(), 4)
+    mask = capacity - 1
+    slots = [0] * capacity
+    for i, word in enumerate(words):
+        slot = _key(word) & mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = i + 1
+    occupied = np.flatnonzero(slots)
+    entry = np.asarray(slots)[occupied] - 1
+    table = np.zeros(capacity, dtype=_ENTRY)
+    table["key"][occupied] = [_key(words[i]) for i in entry]
+    table["rank"][occupied] = entry + 1
+    table["lemma"][occupied] = lemma[entry]
+    table["band"][occupied] = band[entry]
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    width = max((len(w.encode()) for w in words), default=1)
+    for name, array in (("words", np.array(words, dtype=f"S{width}")), ("table", table)):
+        tmp = out_dir / f"{name}.tmp.npy"
+        np.save(tmp, array)
+        tmp.replace(out_dir / f"{name}.npy")
+    global _lexicon_dir
+    _lexicon_dir = None  # re-open on next use
+    return len(words)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Word-frequency / CEFR index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="build the index from a frequency list")
+    b.add_argument("frequencies", type=Path, help="word list, most frequent first or with counts")
+    b.add_argument("--cefr", type=Path, help="optional word,band list (A1..C2)")
+    b.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help="keep this many most frequent words")
+    b.add_argument("--out", type=Path, help="index directory (default: shared data directory)")
+    q = sub.add_parser("lookup", help="show rank, band and lemma of words")
+    q.add_argument("words", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        n = build(args.frequencies, args.out or default_dir(), args.cefr, args.limit)
+        print(f"indexed {n} words into {args.out or default_dir()}")
+    else:
+        lexicon = get_lexicon()
+        if lexicon is None:
+            parser.error("no index built yet; run `python -m core.lexicon build` first")
+        for word in args.words:
+            print(word, lexicon.lookup(word) or "unknown")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+from typing import Callable
+
+from PyQt6.QtCore import QThread
+
+from core.queries import query_executor
+
+
+class MaintenanceWorker(QThread):
+    """Background thread that runs incremental DB jobs until each reports done.
+
+    Every step is a callable doing one small chunk of work and returning True
+    once there is nothing left. Each chunk runs on the query executor's
+    writer, between the app's own writes, so neither waits on a long write
+    transaction of the other. A step that fails is logged and reported by
+    the executor like any write, and the steps after it still run.
+    """
+
+    def __init__(self, steps: list[Callable[[], bool]], pause_ms: int = 20, parent=None):
+        super().__init__(parent)
+        self._steps = steps
+        self._pause_ms = pause_ms
+        self._queries = query_executor()
+
+    def run(self) -> None:
+        for step in self._steps:
+            try:
+                while not self.isInterruptionRequested() and not self._queries.write(step).result():
+                    self.msleep(self._pause_ms)
+            except Exception:  # noqa: BLE001
+                continue  # already reported by the executor
@@ -0,0 +1,240 @@
+"""Local semantic memory of the learner's past mistakes.
+
+Every feedback row with a correction is embedded, together with the
+learner message it answered, as a signed hashed n-gram vector: word
+unigrams and bigrams plus character trigrams, hashed into DIM buckets and
+L2-normalised. No model, no network, and the same text always maps to the
+same vector.
+
+Vectors live in memory-mapped .npy files next to the database, alongside
+a 128-bit random-hyperplane sketch of each. A query ranks every row by
+Hamming distance between sketches (XOR and popcount over two uint64
+columns), then re-scores the best CANDIDATES rows by exact cosine. At
+100k rows that takes about 2 ms and keeps ~99% of the exact top-k score,
+where a dense matrix-vector product over the full vectors takes ~6 ms.
+"""
+import re
+import threading
+import unicodedata
+import zlib
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+DIM = 128
+SKETCH_WORDS = 2  # 128-bit sketches
+CANDIDATES = 1024
+MIN_SCORE = 0.4
+INITIAL_CAPACITY = 4096
+
+_WORD = re.compile(r"[a-z0-9']+")
+_PLANES = np.random.default_rng(20240611).standard_normal((DIM, 64 * SKETCH_WORDS)).astype(np.float32)
+
+if hasattr(np, "bitwise_count"):  # NumPy >= 2.0
+    def _popcount(x: np.ndarray) -> np.ndarray:
+        return np.bitwise_count(x)
+else:
+    _POPCOUNT16 = np.array([bin(i).count("1") for i in range(1 << 16)], dtype=np.uint8)
+
+    def _popcount(x: np.ndarray) -> np.ndarray:
+        return _POPCOUNT16[x.view(np.uint16)].reshape(len(x), 4).sum(axis=1, dtype=np.uint8)
+
+
+def _fold(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text.lower().replace("’", "'"))
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _features(text: str):
+    words = _WORD.findall(_fold(text))
+    for word in words:
+        yield word
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            yield padded[i:i + 3]
+    for first, second in zip(words, words[1:]):
+        yield f"{first} {second}"
+
+
+@lru_cache(maxsize=1 << 17)
+def _bucket(feature: str) -> tuple[int, float]:
+    h = zlib.crc32(feature.encode())
+    return h % DIM, 1.0 if h & 0x80000000 else -1.0
+
+
+def embed(texts: list[str]) -> np.ndarray:
+    """(len(texts), DIM) float32 unit vectors; all-zero rows for texts without words."""
+    rows, cols, signs = [], [], []
+    for row, text in enumerate(texts):
+        for feature in _features(text):
+            col, sign = _bucket(feature)
+            rows.append(row)
+            cols.append(col)
+            signs.append(sign)
+    out = np.zeros((len(texts), DIM), dtype=np.float32)
+    np.add.at(out, (rows, cols), signs)
+    out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-9)
+    return out
+
+
+def sketch(vectors: np.ndarray) -> np.ndarray:
+    """(SKETCH_WORDS, n) uint64: sign bits of each row's projections on fixed random hyperplanes."""
+    bits = np.packbits(vectors @ _PLANES > 0, axis=1, bitorder="little")
+    return np.ascontiguousarray(bits.view(np.uint64).T)
+
+
+def _memory_text(row) -> str:
+    return " ".join(filter(None, (row["learner_text"], row["correction"], row["tip"])))
+
+
+class MistakeMemory:
+    """Append-only vector store over feedback ids, backed by .npy memmaps in directory."""
+
+    def __init__(self, directory: Path):
+        self._dir = Path(directory)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()  # one sync at a time, or batches get stored twice
+        self._open()
+
+    def _paths(self) -> dict[str, Path]:
+        return {name: self._dir / f"{name}.npy" for name in ("vectors", "sketches", "ids")}
+
+    def _open(self) -> None:
+        paths = self._paths()
+        if all(p.exists() for p in paths.values()):
+            self._vectors = np.load(paths["vectors"], mmap_mode="r+")
+            self._sketches = np.load(paths["sketches"], mmap_mode="r+")
+            self._ids = np.load(paths["ids"], mmap_mode="r+")
+            self._count = int(np.count_nonzero(self._ids))
+        else:
+            self._allocate(INITIAL_CAPACITY)
+            self._count = 0
+
+    def _allocate(self, capacity: int) -> None:
+        """(Re)create the memmaps at capacity rows, keeping the rows stored so far."""
+        paths = self._paths()
+        shapes = {"vectors": (capacity, DIM), "sketches": (SKETCH_WORDS, capacity), "ids": (capacity,)}
+        dtypes = {"vectors": np.float32, "sketches": np.uint64, "ids": np.int64}
+        old = {"vectors": getattr(self, "_vectors", None), "sketches": getattr(self, "_sketches", None),
+               "ids": getattr(self, "_ids", None)}
+        for name, path in paths.items():
+            tmp = path.with_suffix(".tmp.npy")
+            new = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtypes[name], shape=shapes[name])
+            previous = old[name]
+            if previous is not None:
+                if name == "sketches":
+                    new[:, :previous.shape[1]] = previous
+                else:
+                    new[:len(previous)] = previous
+            new.flush()
+            del new
+            tmp.replace(path)
+        self._vectors = np.load(paths["vectors"], mmap_mode="r+")
+        self._sketches = np.load(paths["sketches"], mmap_mode="r+")
+        self._ids = np.load(paths["ids"], mmap_mode="r+")
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def last_id(self) -> int:
+        return int(self._ids[self._count - 1]) if self._count else 0
+
+    def add(self, feedback_ids: list[int], texts: list[str]) -> None:
+        if not feedback_ids:
+            return
+        vectors = embed(texts)
+        with self._lock:
+            needed = self._count + len(feedback_ids)
+            if needed > len(self._ids):
+                self._allocate(max(needed, 2 * len(self._ids)))
+            end = self._count + len(feedback_ids)
+            self._vectors[self._count:end] = vectors
+            self._sketches[:, self._count:end] = sketch(vectors)
+            self._ids[self._count:end] = feedback_ids
+            for array in (self._vectors, self._sketches, self._ids):
+                array.flush()
+            self._count = end
+
+    def search(self, text: str, k: int = 3, min_score: float = MIN_SCORE) -> list[tuple[int, float]]:
+        """Up to k (feedback_id, cosine) pairs most similar to text, best first."""
+        query = embed([text])[0]
+        with self._lock:
+            n = self._count
+            if n == 0 or not query.any():
+                return []
+            query_sketch = sketch(query[None, :])[:, 0]
+            distance = _popcount(self._sketches[0, :n] ^ query_sketch[0])
+            for word in range(1, SKETCH_WORDS):
+                distance += _popcount(self._sketches[word, :n] ^ query_sketch[word])
+            if n > CANDIDATES:
+                candidates = np.argpartition(distance, CANDIDATES - 1)[:CANDIDATES]
+            else:
+                candidates = np.arange(n)
+            candidates.sort()  # sequential reads from the memmap
+            scores = self._vectors[candidates] @ query
+            ids = self._ids[candidates]
+        best = np.argsort(scores)[::-1][:k]
+        return [(int(ids[i]), float(scores[i])) for i in best if scores[i] >= min_score]
+
+    def sync(self, batch_size: int = 500) -> bool:
+        """Embed one batch of corrections newer than the last stored one.
+
+        Returns True once caught up, so it doubles as a MaintenanceWorker step.
+        """
+        from db.database import get_corrections
+
+        with self._sync_lock:
+            rows = get_corrections(self.last_id, batch_size)
+            self.add([r["id"] for r in rows], [_memory_text(r) for r in rows])
+        return len(rows) < batch_size
+
+
+_memory: MistakeMemory | None = None
+_memory_lock = threading.Lock()
+
+
+def get_memory() -> MistakeMemory:
+    """The memory for the current database (re-opened if the database moves)."""
+    global _memory
+    from db import database
+
+    directory = database.DB_DIR / "memory"
+    with _memory_lock:
+        if _memory is None or _memory._dir != directory:
+            _memory = MistakeMemory(directory)
+        return _memory
+
+
+def sync_memory(batch_size: int = 500) -> bool:
+    return get_memory().sync(batch_size)
+
+
+def recall(text: str, k: int = 3, now: datetime | None = None) -> str:
+    """Compact prompt section listing past mistakes similar to text ("" if none)."""
+    from db.database import get_corrections_by_id
+
+    hits = get_memory().search(text, k=k * 4)
+    if not hits:
+        return ""
+    rows = {r["id"]: r for r in get_corrections_by_id([fid for fid, _ in hits])}
+    now = now or datetime.utcnow()
+    lines, seen = [], set()
+    for fid, _ in hits:
+        row = rows.get(fid)  # gone if its session was archived since
+        if row is None or row["correction"] in seen:
+            continue
+        seen.add(row["correction"])
+        days = (now - row["timestamp"]).days
+        when = "azi" if days <= 0 else "ieri" if days == 1 else f"acum {days} zile"
+        said = (row["learner_text"] or "").strip()
+        said = f"„{said[:80]}{'…' if len(said) > 80 else ''}” → " if said else ""
+        lines.append(f"- {when}: {said}{row['correction'][:160]}")
+        if len(lines) == k:
+            break
+    if not lines:
+        return ""
+    return "Greșeli asemănătoare făcute anterior (amintește-i dacă o repetă):\n" + "\n".join(lines)
@@ -0,0 +1,75 @@
+"""Rule-based classifier that maps a correction to mistake categories.
+
+Corrections come back from the model as short Romanian explanations quoting
+the English fix ("Folosește articolul 'an' înainte de vocală"), so a single
+compiled regex over diacritic-folded text is accurate enough and cheap
+enough to run on every turn and to backfill the whole history.
+"""
+import re
+
+# category -> (Romanian label, patterns matched against folded lowercase text)
+CATEGORIES: dict[str, tuple[str, list[str]]] = {
+    "articles": ("Articole", [
+        r"\barticol", r"\bnearticulat", r"\b(?:a|an|the)\b\s+(?:inainte|in loc)",
+        r"['\"](?:a|an|the)['\"]",
+    ]),
+    "tenses": ("Timpuri verbale", [
+        r"\btimpul\b", r"\btimpuri", r"\bpast (?:simple|continuous|perfect)",
+        r"\bpresent (?:simple|continuous|perfect)", r"\bfuture\b", r"\btrecut",
+        r"\bviitor", r"\bprezent(?:ul)?\b", r"\bconjug", r"\bforma de (?:trecut|prezent|viitor)",
+        r"\bparticipi", r"\bverb(?:ul)? (?:neregulat|la trecut)",
+    ]),
+    "prepositions": ("Prepoziții", [
+        r"\bprepozit", r"['\"](?:in|on|at|to|for|of|with|from|by|about)['\"]",
+    ]),
+    "word_order": ("Ordinea cuvintelor", [
+        r"\bordinea\b", r"\btopic", r"\bordine[a]? cuvintelor", r"\bpozitia (?:adverb|adjectiv)",
+    ]),
+    "spelling": ("Ortografie", [
+        r"\bortograf", r"\bscri(?:s|e|ere)(?:ea)? corect", r"\bse scrie\b", r"\bscris gresit", r"\bspelling",
+        r"\bgreseala de (?:tipar|scriere)", r"\blitera",
+    ]),
+    "agreement": ("Acord subiect-verb", [
+        r"\bacord", r"\bpersoana a (?:treia|iii)", r"\bsubiect(?:ul)? (?:la )?singular",
+        r"\b(?:does|doesn't|has|is) (?:pentru|cu) (?:he|she|it)",
+    ]),
+    "plurals": ("Plural", [r"\bplural"]),
+    "pronouns": ("Pronume", [r"\bpronume", r"\bpronumel"]),
+    "questions": ("Întrebări și auxiliare", [
+        r"\bauxiliar", r"\bintrebare", r"\bnegati", r"['\"](?:do|does|did)['\"]",
+    ]),
+    "punctuation": ("Punctuație și majuscule", [
+        r"\bpunctuat", r"\bvirgul", r"\bmajuscul", r"\bsemnul intrebarii", r"\bapostrof",
+    ]),
+    "vocabulary": ("Vocabular", [
+        r"\bcuvant(?:ul)? (?:potrivit|corect|mai bun)", r"\bvocabular", r"\bexpresi",
+        r"\bsinonim", r"\bfals(?:i)? prieten", r"\bse spune\b", r"\bcolocati",
+    ]),
+}
+OTHER = "other"
+LABELS = {name: label for name, (label, _) in CATEGORIES.items()} | {OTHER: "Altele"}
+
+_FOLD = str.maketrans("ăâîșşțţĂÂÎȘŞȚŢ’‘“”", "aaissttAAISSTT''\"\"")
+_PATTERN = re.compile(
+    "|".join(
+        f"(?P<{name}>{'|'.join(patterns)})"
+        for name, (_, patterns) in CATEGORIES.items()
+    )
+)
+
+
+def classify(correction: str | None) -> list[str]:
+    """Categories a correction belongs to; [] when there was no correction."""
+    if not correction or not correction.strip():
+        return []
+    text = correction.translate(_FOLD).lower()
+    found = {m.lastgroup for m in _PATTERN.finditer(text)}
+    return sorted(found) if found else [OTHER]
+
+
+def profile_summary(profile: list[tuple[str, int]]) -> str:
+    """One-line description of the learner's recurring mistakes, for the prompt."""
+    if not profile:
+        return ""
+    parts = ", ".join(f"{LABELS.get(cat, cat).lower()} ({count})" for cat, count in profile)
+    return f"Greșeli frecvente ale elevului până acum: {parts}. Insistă discret pe acestea."
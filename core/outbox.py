@@ -0,0 +1,247 @@
+"""Durable queue of learner messages waiting for Alex's reply.
+
+Every message the learner sends goes into the outbox table, and
+OutboxDispatcher sends the queue on TutorWorker threads: at most
+API_WORKERS requests at once and one per session, so the tabs open side
+by side share the same few connections. When more sessions are waiting
+than there are workers, the session served least so far goes next (the
+oldest message on a tie), so a busy tab can't starve a quiet one.
+Messages queued one after another on the same branch (typed while the
+connection was down) go out together and get one reply, under the last
+of them: Alex catches up on everything the learner wrote, and the
+transcript stays a chain of turns.
+
+When a request fails with a connection or overload error, its messages
+stay queued and the dispatcher tries again after a growing delay
+(RETRY_BASE_S doubling up to MAX_BACKOFF_S), or straight away when the
+learner sends another message; while offline only one request at a time
+goes out to probe the connection, and the window stays usable meanwhile.
+Messages still queued when the app closed are sent at the next start.
+
+Replies are stored with database.attach_reply(), which refuses one if
+the learner has written under its message while it was on its way; the
+messages then go out again together with the new one.
+
+The outbox is read and written only on the query executor's writer
+thread, so its reads see the writes queued before them. Choosing the
+next batches (_next_batches) runs there too, and a session counts as
+sending until the write that settles its turn (attach, defer or drop)
+has been made, so a batch chosen from an older read never goes out twice.
+"""
+import logging
+import os
+import time
+from functools import partial
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from core.queries import query_executor
+
+API_WORKERS = max(int(os.getenv("TUTOR_API_WORKERS", "3")), 1)
+RETRY_BASE_S = 5
+MAX_BACKOFF_S = 300
+
+log = logging.getLogger(__name__)
+
+
+def next_batch(entries) -> list:
+    """The oldest queued message and those queued after it as its direct replies."""
+    if not entries:
+        return []
+    batch = [entries[0]]
+    for entry in entries[1:]:
+        if entry["parent_id"] == batch[-1]["message_id"]:
+            batch.append(entry)
+    return batch
+
+
+def _next_batches(sending: frozenset[int], served: dict[int, int], limit: int) -> list[tuple[list, list[dict]]]:
+    """The batches to send next with their API histories, fairest first; runs on the writer thread.
+
+    Turns whose message is gone are dropped on the way.
+    """
+    from core.tutor import HISTORY_WINDOW
+    from db.database import drop_turns, get_branch_path, get_outbox
+
+    entries = get_outbox()
+    gone = [e["id"] for e in entries if not e["message_exists"]]
+    if gone:
+        drop_turns(gone)
+    waiting: dict[int, list] = {}
+    for entry in entries:
+        if entry["message_exists"] and entry["session_id"] not in sending:
+            waiting.setdefault(entry["session_id"], []).append(entry)
+    batches = []
+    while waiting and len(sending) + len(batches) < limit:
+        session_id = min(waiting, key=lambda s: (served.get(s, 0), waiting[s][0]["id"]))
+        batch = next_batch(waiting.pop(session_id))
+        history = [{"role": r["role"], "content": r["content"]}
+                   for r in get_branch_path(batch[-1]["message_id"], HISTORY_WINDOW)]
+        batches.append((batch, history))
+    return batches
+
+
+def _defer(outbox_ids: list[int], error: str) -> int:
+    """Record a failed attempt at outbox_ids; returns how many messages are still queued."""
+    from db.database import defer_turns, get_outbox
+
+    defer_turns(outbox_ids, error)
+    return len(get_outbox())
+
+
+class OutboxDispatcher(QObject):
+    """Sends queued messages from the GUI thread's event loop; the requests run on TutorWorkers.
+
+    Turns are dicts with the outbox ids they answer, session_id,
+    message_id (the message replied to) and reply_id (set once the reply
+    is stored).
+    """
+
+    started = pyqtSignal(int)  # session id: the learner's message went out straight away
+    reply_ready = pyqtSignal(dict, str)
+    analysis_ready = pyqtSignal(dict, object)
+    failed = pyqtSignal(dict, str)  # not worth retrying; the messages are taken off the queue
+    offline = pyqtSignal(int, float)  # messages queued, seconds until the next try
+    online = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._sending: set[int] = set()  # sessions with a reply on its way
+        self._served: dict[int, int] = {}  # requests sent per session, for fair turns
+        self._workers = set()
+        self._attaching: dict[int, list] = {}  # analyses waiting for their reply to be stored, by message
+        self._delay_s = 0.0
+        self._live: dict[int, tuple[float | None, bool]] = {}
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.dispatch)
+
+    @property
+    def is_offline(self) -> bool:
+        return self._delay_s > 0
+
+    def submit(self, session_id: int, message_id: int, context: str = "",
+               submitted: float | None = None, prewarmed: bool = False) -> None:
+        """Queue message_id for a reply; started is emitted if its request goes out straight away."""
+        from db.database import enqueue_turn
+
+        query_executor().write(enqueue_turn, session_id, message_id, context,
+                               callback=partial(self._on_queued, session_id, submitted, prewarmed))
+
+    def _on_queued(self, session_id: int, submitted: float | None, prewarmed: bool, outbox_id: int):
+        if session_id in self._sending or self.is_offline:
+            self.dispatch()
+            return
+        self._live[outbox_id] = (submitted, prewarmed)
+        self.dispatch(outbox_id)
+
+    def dispatch(self, live_id: int | None = None) -> None:
+        """Send the next batches, as many as there are free workers (one while offline).
+
+        live_id is a message the learner just sent: it counts as live only
+        if this dispatch sends it. Waiting for a free worker doesn't count;
+        the reply comes when it comes.
+        """
+        if len(self._sending) >= self._limit():
+            self._live.pop(live_id, None)
+            return
+        query_executor().write(_next_batches, frozenset(self._sending), dict(self._served), self._limit(),
+                               callback=partial(self._send_batches, live_id))
+
+    def _limit(self) -> int:
+        return 1 if self.is_offline else API_WORKERS
+
+    def _send_batches(self, live_id: int | None, batches: list):
+        for batch, history in batches:
+            if len(self._sending) >= self._limit():
+                break
+            if batch[-1]["session_id"] not in self._sending:
+                self._send(batch, history)
+        self._live.pop(live_id, None)
+
+    def _send(self, batch: list, history: list[dict]) -> None:
+        from core.tutor import TutorWorker
+
+        # A request going out is the next try; the timer restarts if it fails too
+        self._timer.stop()
+        last = batch[-1]
+        turn = {"outbox_ids": [e["id"] for e in batch], "session_id": last["session_id"],
+                "message_id": last["message_id"], "reply_id": None}
+        submitted, prewarmed = self._live.pop(last["id"], (None, False))
+        for entry in batch:
+            self._live.pop(entry["id"], None)
+        worker = TutorWorker(history, self, context=last["context"], prewarmed=prewarmed,
+                             prepare_ms=None if submitted is None else (time.perf_counter() - submitted) * 1000)
+        worker.reply_ready.connect(partial(self._on_reply, turn))
+        worker.response_ready.connect(partial(self._on_response, turn))
+        worker.analysis_ready.connect(partial(self._on_analysis, turn))
+        worker.offline.connect(partial(self._on_offline, turn))
+        worker.error_occurred.connect(partial(self._on_error, turn))
+        worker.finished.connect(partial(self._release_worker, worker))
+        self._workers.add(worker)
+        self._sending.add(turn["session_id"])
+        self._served[turn["session_id"]] = self._served.get(turn["session_id"], 0) + 1
+        if submitted is not None:
+            self.started.emit(turn["session_id"])
+        worker.start()
+
+    def _on_reply(self, turn: dict, reply: str):
+        from db.database import attach_reply
+
+        self._attaching[turn["message_id"]] = []
+        query_executor().write(attach_reply, turn["message_id"], reply, turn["outbox_ids"],
+                               callback=partial(self._on_attached, turn, reply))
+
+    def _on_attached(self, turn: dict, reply: str, reply_id: int | None):
+        self._sending.discard(turn["session_id"])
+        turn["reply_id"] = reply_id
+        if reply_id is not None:
+            if self.is_offline:
+                self._delay_s = 0.0
+                self.online.emit()
+            self.reply_ready.emit(turn, reply)
+        for data in self._attaching.pop(turn["message_id"], []):
+            self._on_analysis(turn, data)
+        self.dispatch()
+
+    def _on_response(self, turn: dict, data: dict):
+        self._on_reply(turn, data.get("reply", ""))
+        self._on_analysis(turn, data)
+
+    def _on_analysis(self, turn: dict, data: dict | None):
+        pending = self._attaching.get(turn["message_id"])
+        if pending is not None:
+            pending.append(data)  # shown once its reply is stored
+        elif turn["reply_id"] is not None:
+            self.analysis_ready.emit(turn, data)
+
+    def _on_offline(self, turn: dict, error: str):
+        query_executor().write(_defer, turn["outbox_ids"], error, callback=partial(self._on_deferred, turn, error))
+
+    def _on_deferred(self, turn: dict, error: str, queued: int):
+        self._sending.discard(turn["session_id"])
+        if self._timer.isActive():
+            return  # another request already found the connection down
+        self._delay_s = min(max(2 * self._delay_s, RETRY_BASE_S), MAX_BACKOFF_S)
+        self._timer.start(int(self._delay_s * 1000))
+        log.warning("Offline (next try in %.0fs): %s", self._delay_s, error)
+        self.offline.emit(queued, self._delay_s)
+
+    def _on_error(self, turn: dict, error: str):
+        from db.database import drop_turns
+
+        query_executor().write(drop_turns, turn["outbox_ids"], callback=partial(self._on_dropped, turn, error))
+
+    def _on_dropped(self, turn: dict, error: str, _):
+        self._sending.discard(turn["session_id"])
+        self.failed.emit(turn, error)
+        self.dispatch()
+
+    def _release_worker(self, worker):
+        self._workers.discard(worker)
+        worker.deleteLater()
+
+    def stop(self) -> None:
+        """Stop retrying; whatever is still queued is sent at the next start."""
+        self._timer.stop()
+
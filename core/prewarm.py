@@ -0,0 +1,228 @@
+"""Speculative work while the learner is typing.
+
+ChatWidget reports the draft as it changes. DEBOUNCE_MS after the last
+keystroke, Prewarmer builds on a worker thread the learner context that
+sending the draft would need (mistake profile and recalled past
+mistakes). If the draft is then sent as it was, with no turn in between,
+the turn starts with that context instead of building it (turn_context(),
+on the query executor's writer thread as the message is saved); if the
+draft changed since, the mistake profile is still reused and only the
+recall is redone.
+
+With TUTOR_PREWARM_CACHE=1 the worker also sends the request with
+max_tokens=1, so the prompt cache already holds the system prompt and the
+history window the turn will send when Enter is pressed. Warming is
+skipped when the prefix is too short to be cached (going by a token
+estimate from its length), when the same prefix was warmed within
+CACHE_TTL_S, after WARMS_PER_HOUR warms in the last hour, and when
+today's warming spend (api_metrics rows of kind "prewarm") would go over
+TUTOR_PREWARM_BUDGET_USD.
+
+Chat calls record whether they were prepared this way and how long the
+turn took to start (api_metrics.prewarmed / prepare_ms), for
+`python -m core.telemetry --prewarm`.
+"""
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+
+from PyQt6.QtCore import QObject, QThread, QTimer, pyqtSignal
+
+from core.tutor import (
+    HISTORY_WINDOW, MODEL, REPLY_PROMPT, SPLIT_TURNS, SYSTEM_PROMPT, _record_metrics, build_chat_request,
+)
+
+DEBOUNCE_MS = 800
+MIN_DRAFT_CHARS = 8
+CACHE_WARMING = os.getenv("TUTOR_PREWARM_CACHE", "") not in ("", "0")
+BUDGET_USD = float(os.getenv("TUTOR_PREWARM_BUDGET_USD", "0.05") or 0)
+CACHE_TTL_S = 270  # cache entries live 5 minutes from their last use
+WARMS_PER_HOUR = 20
+MIN_CACHE_TOKENS = 1024  # shorter prefixes aren't cached
+CHARS_PER_TOKEN = 3.5  # rough, for mixed English/Romanian text
+
+log = logging.getLogger(__name__)
+
+
+def estimate_tokens(system: list[dict], messages: list[dict]) -> int:
+    """Rough input-token count of a request, from its length in characters."""
+    chars = sum(len(block["text"]) for block in system)
+    for message in messages:
+        content = message["content"]
+        chars += len(content) if isinstance(content, str) else sum(len(b["text"]) for b in content)
+    return int(chars / CHARS_PER_TOKEN) + 4 * len(messages)
+
+
+def learner_profile() -> str:
+    from db.database import get_error_profile
+    from core.mistakes import profile_summary
+
+    return profile_summary(get_error_profile())
+
+
+def build_context(profile: str, text: str) -> str:
+    """The per-turn learner context for text: mistake profile plus similar past mistakes."""
+    from core.memory import recall
+
+    return "\n\n".join(filter(None, (profile, recall(text))))
+
+
+def turn_context(text: str, profile: str | None = None) -> str:
+    """build_context() for text, reading the mistake profile unless it is given; not for the GUI thread."""
+    return build_context(learner_profile() if profile is None else profile, text)
+
+
+@dataclass(frozen=True)
+class Prepared:
+    draft: str
+    head: object  # the history head the draft would follow
+    profile: str
+    context: str
+
+
+def _spent_today() -> float:
+    from db.database import get_api_metrics
+
+    midnight = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return sum(r["cost_usd"] for r in get_api_metrics(midnight) if r["kind"] == "prewarm")
+
+
+def warm_cache(system: list[dict], messages: list[dict]) -> bool:
+    """Send the request with max_tokens=1 so its prefix gets cached; False if skipped or failed."""
+    from core.telemetry import ApiCallMetrics, estimate_cost
+
+    api_key = os.getenv("ANTHROPIC_API_KEY", "")
+    if not api_key or api_key.startswith("sk-ant-your"):
+        return False
+    prefix_tokens = estimate_tokens(system, messages[:-1])
+    if prefix_tokens < MIN_CACHE_TOKENS:
+        return False
+    cost = estimate_cost(MODEL, estimate_tokens([], messages[-1:]), 1, prefix_tokens)
+    if _spent_today() + cost > BUDGET_USD:
+        return False
+
+    import anthropic
+
+    started = time.perf_counter()
+    metrics = ApiCallMetrics(kind="prewarm", model=MODEL)
+    try:
+        # No retries: a late warm is worth nothing
+        client = anthropic.Anthropic(api_key=api_key, max_retries=0)
+        message = client.messages.create(model=MODEL, max_tokens=1, system=system, messages=messages)
+        metrics.stop_reason = message.stop_reason
+        metrics.record_usage(message.usage)
+    except Exception as exc:  # noqa: BLE001
+        metrics.error = type(exc).__name__
+    metrics.total_ms = (time.perf_counter() - started) * 1000
+    _record_metrics(metrics)
+    return metrics.error is None
+
+
+class PrewarmWorker(QThread):
+    """Prepares the context for one draft, then optionally warms the prompt cache."""
+
+    prepared = pyqtSignal(object)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, draft: str, head, window: list[dict], warm: bool, parent=None):
+        super().__init__(parent)
+        self._draft = draft
+        self._head = head
+        # The window the turn will send once the draft is appended
+        self._window = (window + [{"role": "user", "content": draft}])[-HISTORY_WINDOW:]
+        self._warm = warm
+
+    def run(self) -> None:
+        try:
+            profile = learner_profile()
+            self.prepared.emit(Prepared(self._draft, self._head, profile, build_context(profile, self._draft)))
+            if self._warm and not self.isInterruptionRequested():
+                # Without the context, which comes after the cached prefix anyway;
+                # with split turns, the reply is the call the learner waits on
+                prompt = REPLY_PROMPT if SPLIT_TURNS else SYSTEM_PROMPT
+                warm_cache(*build_chat_request(self._window, prompt=prompt))
+        except Exception as exc:  # noqa: BLE001
+            self.error_occurred.emit(f"⚠️  Prewarm error: {exc}")
+
+
+class Prewarmer(QObject):
+    """Follows the draft being typed and keeps the request for it prepared, one worker at a time."""
+
+    def __init__(self, history, parent=None):
+        super().__init__(parent)
+        self._history = history
+        self._draft = ""
+        self._prepared: Prepared | None = None
+        self._worker: PrewarmWorker | None = None
+        self._warmed_head = None
+        self._warmed_at = float("-inf")
+        self._warm_times: deque[float] = deque()
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(DEBOUNCE_MS)
+        self._timer.timeout.connect(self._prepare)
+
+    def on_draft(self, text: str):
+        self._draft = text.strip()
+        if len(self._draft) >= MIN_DRAFT_CHARS:
+            self._timer.start()
+        else:
+            self._timer.stop()
+
+    def _prepare(self):
+        if self._worker is not None:
+            self._timer.start()  # after the one in flight
+            return
+        head = self._history.head
+        prepared = self._prepared
+        if prepared is not None and prepared.draft == self._draft and prepared.head is head:
+            return
+        self._worker = PrewarmWorker(self._draft, head, self._history.window(),
+                                     CACHE_WARMING and self._may_warm(head), self)
+        self._worker.prepared.connect(self._on_prepared)
+        self._worker.error_occurred.connect(log.warning)
+        self._worker.finished.connect(self._release_worker)
+        self._worker.start()
+
+    def _may_warm(self, head) -> bool:
+        now = time.monotonic()
+        if head is self._warmed_head and now - self._warmed_at < CACHE_TTL_S:
+            return False
+        while self._warm_times and now - self._warm_times[0] > 3600:
+            self._warm_times.popleft()
+        if len(self._warm_times) >= WARMS_PER_HOUR:
+            return False
+        self._warmed_head, self._warmed_at = head, now
+        self._warm_times.append(now)
+        return True
+
+    def _on_prepared(self, prepared: Prepared):
+        self._prepared = prepared
+
+    def _release_worker(self):
+        worker, self._worker = self._worker, None
+        if worker is not None:
+            worker.deleteLater()
+
+    def context(self, text: str) -> tuple[str | None, str | None]:
+        """The context prepared for sending text now, else None and the mistake profile if that was read.
+
+        What is missing is built by turn_context(text, profile) off the GUI
+        thread. Call before text is added to the history.
+        """
+        self._timer.stop()
+        prepared, self._prepared = self._prepared, None
+        if prepared is not None and prepared.head is self._history.head:
+            if prepared.draft == text:
+                return prepared.context, None
+            return None, prepared.profile
+        return None, None
+
+    def stop(self, timeout_ms: int = 2000) -> None:
+        self._timer.stop()
+        if self._worker is not None:
+            self._worker.requestInterruption()
+            self._worker.wait(timeout_ms)
@@ -0,0 +1,142 @@
+"""Opt-in diagnostics: GUI stall watchdog, cProfile and tracemalloc hooks.
+
+Everything here is off unless switched on through the environment:
+
+    TUTOR_WATCHDOG_MS=250     report event-loop stalls longer than 250 ms
+    TUTOR_PROFILE=1           cProfile each call of a @profiled function
+    TUTOR_TRACEMALLOC=1       snapshot allocations around each call
+    TUTOR_PROFILE_DIR=path    where reports go (default: <data dir>/profiles)
+
+When the profiling switches are off, @profiled returns the function itself,
+so there is no per-call cost at all. Since that is decided when a module is
+imported, .env is loaded here rather than left to core.tutor.
+"""
+import cProfile
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROFILE_ENABLED = os.getenv("TUTOR_PROFILE", "") not in ("", "0")
+TRACEMALLOC_ENABLED = os.getenv("TUTOR_TRACEMALLOC", "") not in ("", "0")
+
+log = logging.getLogger(__name__)
+
+
+def profile_dir() -> Path:
+    from db.database import DATA_DIR
+
+    path = Path(os.getenv("TUTOR_PROFILE_DIR", "") or DATA_DIR / "profiles")
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _report_path(name: str, suffix: str) -> Path:
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    return profile_dir() / f"{name}-{stamp}-{threading.get_ident()}.{suffix}"
+
+
+def profiled(name: str):
+    """Decorator: profile calls when TUTOR_PROFILE / TUTOR_TRACEMALLOC are set.
+
+    cProfile output is a .prof file (open with pstats or snakeviz);
+    tracemalloc output is the top allocation sites grown during the call.
+    """
+    def decorate(fn):
+        if not (PROFILE_ENABLED or TRACEMALLOC_ENABLED):
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profiler = cProfile.Profile() if PROFILE_ENABLED else None
+            before = None
+            if TRACEMALLOC_ENABLED:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(25)
+                before = tracemalloc.take_snapshot()
+            if profiler is not None:
+                profiler.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                    profiler.dump_stats(_report_path(name, "prof"))
+                if before is not None:
+                    stats = tracemalloc.take_snapshot().compare_to(before, "lineno")
+                    _report_path(name, "mem.txt").write_text(
+                        "\n".join(str(s) for s in stats[:50]) + "\n"
+                    )
+        return wrapper
+    return decorate
+
+
+class StallWatchdog(threading.Thread):
+    """Detect GUI event-loop stalls and capture the main thread's stack.
+
+    The GUI thread calls heartbeat() from a short QTimer; if no heartbeat
+    arrives within threshold_ms, the watchdog grabs the main thread's
+    current Python frame and writes the stack to the log and the profile
+    directory, once per stall.
+    """
+
+    def __init__(self, threshold_ms: int, poll_ms: int | None = None):
+        super().__init__(name="stall-watchdog", daemon=True)
+        self.threshold_s = threshold_ms / 1000
+        self._poll_s = (poll_ms or max(threshold_ms // 4, 10)) / 1000
+        self._main_ident = threading.main_thread().ident
+        self._last_beat = time.monotonic()
+        self._reported = False
+        self._stopped = threading.Event()
+
+    def heartbeat(self) -> None:
+        self._last_beat = time.monotonic()
+        self._reported = False
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self._poll_s):
+            stalled = time.monotonic() - self._last_beat
+            if stalled < self.threshold_s or self._reported:
+                continue
+            self._reported = True
+            frame = sys._current_frames().get(self._main_ident)
+            if frame is None:
+                continue
+            report = (
+                f"GUI thread stalled for {stalled * 1000:.0f} ms (still running):\n"
+                + "".join(traceback.format_stack(frame))
+            )
+            log.warning(report)
+            try:
+                _report_path("stall", "txt").write_text(report)
+            except OSError:
+                pass
+
+
+def start_watchdog(parent) -> StallWatchdog | None:
+    """Start the watchdog if TUTOR_WATCHDOG_MS is set; parent owns the heartbeat timer."""
+    threshold_ms = int(os.getenv("TUTOR_WATCHDOG_MS", "0") or 0)
+    if threshold_ms <= 0:
+        return None
+    from PyQt6.QtCore import QTimer
+
+    watchdog = StallWatchdog(threshold_ms)
+    timer = QTimer(parent)
+    timer.setInterval(max(threshold_ms // 4, 10))
+    timer.timeout.connect(watchdog.heartbeat)
+    timer.start()
+    watchdog.start()
+    return watchdog
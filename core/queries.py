@@ -0,0 +1,156 @@
+"""Database reads off the GUI thread.
+
+QueryExecutor runs db.database queries on a QThreadPool. Each pool thread
+reads through its own read-only connection (database.read_only()); WAL
+lets those read while the window writes. A query's result comes back as a
+concurrent Future, and to callbacks on the GUI thread through a queued
+signal.
+
+A query that is already in flight is not started twice: a second
+get_cumulative_stats() while the first is still running gets the first
+one's result. Queries tagged with the tables they read (database._reads)
+are kept in a small cache until a write touches one of those tables;
+writes report the tables they touched (database._writes) whichever thread
+makes them. Entries also expire after CACHE_TTL_S, for writes made by
+another process (e.g. a transfer import run while the app is open).
+
+write() queues a write instead: writes run one at a time, in order, on a
+single writer thread. A failed query is logged and reported through
+error_occurred; its callbacks are not called.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import nullcontext
+from functools import partial
+from typing import Callable
+
+from PyQt6.QtCore import QObject, QThreadPool, pyqtSignal
+
+from db import database
+
+READ_THREADS = 2
+CACHE_SIZE = 64  # query results
+CACHE_TTL_S = 30
+
+log = logging.getLogger(__name__)
+
+
+class _Query:
+    __slots__ = ("key", "tables", "future", "callbacks", "stale")
+
+    def __init__(self, key: tuple | None, tables: frozenset[str] | None):
+        self.key = key
+        self.tables = tables  # None: unknown, so any write makes it stale
+        self.future = Future()
+        self.callbacks: list[Callable] = []
+        self.stale = False
+
+
+class QueryExecutor(QObject):
+    error_occurred = pyqtSignal(str)
+    _done = pyqtSignal(object)
+
+    def __init__(self, threads: int = READ_THREADS, cache_size: int = CACHE_SIZE, parent=None):
+        super().__init__(parent)
+        self._readers = QThreadPool(self)
+        self._readers.setMaxThreadCount(threads)
+        self._writer = QThreadPool(self)
+        self._writer.setMaxThreadCount(1)
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self._in_flight: dict[tuple, _Query] = {}
+        self._cache: OrderedDict[tuple, tuple[object, frozenset[str], float]] = OrderedDict()
+        self._done.connect(self._deliver)
+        database.add_write_listener(self.invalidate)
+
+    def read(self, fn: Callable, *args, callback: Callable | None = None, **kwargs) -> Future:
+        """Run fn(*args, **kwargs) on a reader thread; callback(result) is called on the GUI thread.
+
+        A cached result is passed to callback straight away.
+        """
+        path = database.current_db_path()
+        key = (path, fn, args, tuple(sorted(kwargs.items())))
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and time.monotonic() - cached[2] < CACHE_TTL_S:
+                self._cache.move_to_end(key)
+                future = Future()
+                future.set_result(cached[0])
+            else:
+                future = None
+                query = self._in_flight.get(key)
+                if query is None:
+                    query = self._in_flight[key] = _Query(key, getattr(fn, "tables", None))
+                    self._readers.start(partial(self._run, query, path, fn, args, kwargs))
+                if callback is not None:
+                    query.callbacks.append(callback)
+        if future is not None and callback is not None:
+            callback(future.result())
+        return future or query.future
+
+    def write(self, fn: Callable, *args, callback: Callable | None = None, **kwargs) -> Future:
+        """Queue fn(*args, **kwargs) on the writer thread, after the writes already queued."""
+        query = _Query(None, None)
+        if callback is not None:
+            query.callbacks.append(callback)
+        self._writer.start(partial(self._run, query, database.current_db_path(), fn, args, kwargs, False))
+        return query.future
+
+    def _run(self, query: _Query, path, fn: Callable, args: tuple, kwargs: dict, read_only: bool = True):
+        try:
+            with database.shard(path), database.read_only() if read_only else nullcontext():
+                result = fn(*args, **kwargs)
+        except Exception as exc:  # noqa: BLE001
+            with self._lock:
+                if self._in_flight.get(query.key) is query:
+                    del self._in_flight[query.key]
+            query.future.set_exception(exc)
+        else:
+            with self._lock:
+                if self._in_flight.get(query.key) is query:
+                    del self._in_flight[query.key]
+                if query.tables is not None and not query.stale:
+                    self._cache[query.key] = (result, query.tables, time.monotonic())
+                    if len(self._cache) > self._cache_size:
+                        self._cache.popitem(last=False)
+            query.future.set_result(result)
+        self._done.emit(query)
+
+    def _deliver(self, query: _Query):
+        exc = query.future.exception()
+        if exc is not None:
+            log.error("Database error", exc_info=exc)
+            self.error_occurred.emit(f"⚠️  Database error: {exc}")
+            return
+        result = query.future.result()
+        for callback in query.callbacks:
+            callback(result)
+
+    def invalidate(self, tables: frozenset[str]) -> None:
+        """Drop cached results that read any of tables; queries already running won't be cached."""
+        with self._lock:
+            for key in [k for k, (_, read, _) in self._cache.items() if read & tables]:
+                del self._cache[key]
+            for key, query in list(self._in_flight.items()):
+                if query.tables is None or query.tables & tables:
+                    # Later reads start afresh instead of joining this one
+                    query.stale = True
+                    del self._in_flight[key]
+
+    def wait(self, timeout_ms: int = -1) -> bool:
+        """Block until queued reads and writes are done; True if they all finished."""
+        return self._writer.waitForDone(timeout_ms) and self._readers.waitForDone(timeout_ms)
+
+
+_executor: QueryExecutor | None = None
+
+
+def query_executor() -> QueryExecutor:
+    """The application's executor, created on first use (from the GUI thread)."""
+    global _executor
+    if _executor is None:
+        _executor = QueryExecutor()
+    return _executor
@@ -0,0 +1,164 @@
+"""Per-request API telemetry: cost estimates, percentiles and a daily export.
+
+TutorWorker fills an ApiCallMetrics for every call and appends it to the
+api_metrics table on the query executor's writer. Export a learner's
+per-day percentiles with:
+
+    python -m core.telemetry --profile NAME --days 30 [--format csv]
+
+or compare end-to-end chat latency with and without prewarming (core.prewarm):
+
+    python -m core.telemetry --profile NAME --days 30 --prewarm
+"""
+import argparse
+import csv
+import json
+import sys
+from collections import defaultdict
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timedelta
+
+# USD per million tokens: input, output, cache write, cache read
+PRICING = {
+    "claude-sonnet-4-20250514": (3.00, 15.00, 3.75, 0.30),
+}
+DEFAULT_PRICING = PRICING["claude-sonnet-4-20250514"]
+
+
+@dataclass
+class ApiCallMetrics:
+    kind: str
+    model: str
+    started_at: datetime = field(default_factory=datetime.utcnow)
+    queue_wait_ms: float = 0.0
+    ttft_ms: float | None = None
+    total_ms: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_creation_tokens: int = 0
+    cache_read_tokens: int = 0
+    retries: int = 0
+    stop_reason: str | None = None
+    parse_ok: bool | None = None
+    error: str | None = None
+    cost_usd: float = 0.0
+    prepare_ms: float | None = None  # Enter pressed -> worker created (chat calls)
+    prewarmed: bool | None = None
+
+    def record_usage(self, usage) -> None:
+        self.input_tokens = usage.input_tokens or 0
+        self.output_tokens = usage.output_tokens or 0
+        self.cache_creation_tokens = getattr(usage, "cache_creation_input_tokens", None) or 0
+        self.cache_read_tokens = getattr(usage, "cache_read_input_tokens", None) or 0
+        self.cost_usd = estimate_cost(
+            self.model, self.input_tokens, self.output_tokens,
+            self.cache_creation_tokens, self.cache_read_tokens,
+        )
+
+    def as_row(self) -> dict:
+        return asdict(self)
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int,
+                  cache_creation_tokens: int = 0, cache_read_tokens: int = 0) -> float:
+    price_in, price_out, price_cache_write, price_cache_read = PRICING.get(model, DEFAULT_PRICING)
+    return (
+        input_tokens * price_in
+        + output_tokens * price_out
+        + cache_creation_tokens * price_cache_write
+        + cache_read_tokens * price_cache_read
+    ) / 1_000_000
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    """Linear-interpolated percentile; None for an empty list."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * pct / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+def summarize(rows) -> dict:
+    """p50/p95 latencies plus token, error and cost totals for a set of api_metrics rows."""
+    ok = [r for r in rows if not r["error"]]
+    total = [r["total_ms"] for r in ok]
+    ttft = [r["ttft_ms"] for r in ok if r["ttft_ms"] is not None]
+    wait = [r["queue_wait_ms"] for r in rows]
+    # From Enter to the whole reply: only chat calls know when Enter was pressed
+    e2e = [r["prepare_ms"] + r["queue_wait_ms"] + r["total_ms"] for r in ok if r["prepare_ms"] is not None]
+    parsed = [r["parse_ok"] for r in ok if r["parse_ok"] is not None]
+    return {
+        "calls": len(rows),
+        "errors": len(rows) - len(ok),
+        "retries": sum(r["retries"] for r in rows),
+        "parse_failures": sum(1 for p in parsed if not p),
+        "total_ms_p50": percentile(total, 50),
+        "total_ms_p95": percentile(total, 95),
+        "ttft_ms_p50": percentile(ttft, 50),
+        "ttft_ms_p95": percentile(ttft, 95),
+        "queue_wait_ms_p50": percentile(wait, 50),
+        "queue_wait_ms_p95": percentile(wait, 95),
+        "e2e_ms_p50": percentile(e2e, 50),
+        "e2e_ms_p95": percentile(e2e, 95),
+        "input_tokens": sum(r["input_tokens"] for r in rows),
+        "output_tokens": sum(r["output_tokens"] for r in rows),
+        "cache_read_tokens": sum(r["cache_read_tokens"] for r in rows),
+        "cost_usd": round(sum(r["cost_usd"] for r in rows), 6),
+    }
+
+
+def daily_summary(days: int) -> list[dict]:
+    from db.database import get_api_metrics
+
+    by_day: dict[str, list] = defaultdict(list)
+    for row in get_api_metrics(datetime.utcnow() - timedelta(days=days)):
+        by_day[row["started_at"].date().isoformat()].append(row)
+    return [{"day": day, **summarize(rows)} for day, rows in sorted(by_day.items())]
+
+
+def prewarm_summary(days: int) -> dict:
+    """Chat-call summaries for turns sent with and without a prewarmed request."""
+    from db.database import get_api_metrics
+
+    chats = [r for r in get_api_metrics(datetime.utcnow() - timedelta(days=days)) if r["kind"] == "chat"]
+    return {
+        "prewarmed": summarize([r for r in chats if r["prewarmed"]]),
+        "cold": summarize([r for r in chats if not r["prewarmed"]]),
+    }
+
+
+def main() -> None:
+    from db.database import init_db
+
+    parser = argparse.ArgumentParser(description="Export per-day API latency percentiles.")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--format", choices=("json", "csv"), default="json")
+    parser.add_argument("--prewarm", action="store_true",
+                        help="compare chat latency with and without prewarming instead")
+    parser.add_argument("--profile", help="learner profile (default: the database from before profiles)")
+    args = parser.parse_args()
+    if args.profile:
+        from db.profiles import get_profile, use_profile
+
+        profile = get_profile(args.profile)
+        if profile is None:
+            parser.error(f"no profile named {args.profile!r}")
+        use_profile(profile)
+    init_db()
+    if args.prewarm:
+        print(json.dumps(prewarm_summary(args.days), indent=2))
+        return
+    summary = daily_summary(args.days)
+    if args.format == "json":
+        print(json.dumps(summary, indent=2))
+    elif summary:
+        writer = csv.DictWriter(sys.stdout, fieldnames=list(summary[0]))
+        writer.writeheader()
+        writer.writerows(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,30 @@
 import json
+import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
 from dotenv import load_dotenv
 from PyQt6.QtCore import QThread, pyqtSignal
 
+from core.profiling import profiled
+
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
+MODEL = "claude-sonnet-4-20250514"
+MAX_TOKENS = 1024
+REPLY_MAX_TOKENS = 400
+# Ask for the reply and the analysis in two concurrent calls, so the reply
+# isn't held back by the analysis tokens; 0 asks for both in one JSON reply
+SPLIT_TURNS = os.getenv("TUTOR_SPLIT_TURNS", "1") not in ("", "0")
+MAX_RETRIES = 2
+REQUEST_TIMEOUT_S = 60  # per attempt; a dead connection fails over to the outbox instead of hanging
+HISTORY_WINDOW = 20  # turns sent to the API per request
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
 SYSTEM_PROMPT = """Ești un profesor de engleză prietenos pentru vorbitori de română. Numele tău este Alex.
 
 REGULI:
@@ -28,16 +46,47 @@ Returnează MEREU un JSON valid cu această structură:
   "goals": ["obiectiv1", "obiectiv2", "obiectiv3"]
 }"""
 
+REPLY_PROMPT = """Ești un profesor de engleză prietenos pentru vorbitori de română. Numele tău este Alex.
+
+REGULI:
+1. Conversezi ÎNTOTDEAUNA în engleză cu utilizatorul
+2. Dacă utilizatorul scrie în română, răspunzi în engleză și îl încurajezi să continue în engleză
+3. Ești mereu încurajator și pozitiv
+4. Răspunzi scurt (2-4 propoziții) și continui conversația, de preferat cu o întrebare
+
+Returnează DOAR textul răspunsului tău, fără JSON. Corecturile gramaticale se fac separat, nu le include."""
+
+ANALYSIS_PROMPT = """Ești Alex, profesor de engleză pentru vorbitori de română. Nu răspunzi la conversație:
+analizezi ultimul mesaj al utilizatorului pentru greșeli gramaticale, de vocabular și de sintaxă,
+ținând cont de conversația de dinainte. Ești mereu încurajator și pozitiv.
+
+Returnează MEREU un JSON valid cu această structură:
+{
+  "feedback": {
+    "positive": "ce a făcut bine (în română, max 2 propoziții)",
+    "correction": "corecție dacă există greșeli (în română) sau null",
+    "tip": "sfat util de gramatică/vocabular (în română)"
+  },
+  "level": "beginner|elementary|intermediate|upper-intermediate|advanced",
+  "newWords": ["cuvinte englezești noi, utile pentru ce a vrut să spună"],
+  "goals": ["obiectiv1", "obiectiv2", "obiectiv3"]
+}"""
+
 
 def _parse_response(raw: str) -> dict[str, Any]:
     """Parse JSON from AI response; fall back to raw text reply on failure."""
+    return _parse_response_checked(raw)[0]
+
+
+def _parse_response_checked(raw: str) -> tuple[dict[str, Any], bool]:
+    """Like _parse_response, but also report whether the JSON parsed."""
     raw = raw.strip()
     # Strip markdown code fences if present
     if raw.startswith("```"):
         lines = raw.splitlines()
         raw = "\n".join(lines[1:-1] if lines[-1].strip() == "```" else lines[1:])
     try:
-        return json.loads(raw)
+        return json.loads(raw), True
     except json.JSONDecodeError:
         return {
             "reply": raw,
@@ -45,39 +94,166 @@ def _parse_response(raw: str) -> dict[str, Any]:
             "level": "beginner",
             "newWords": [],
             "goals": [],
-        }
+        }, False
+
+
+def _parse_analysis(raw: str) -> tuple[dict[str, Any] | None, bool]:
+    """Parse the analysis JSON; None when it isn't a JSON object."""
+    parsed, ok = _parse_response_checked(raw)
+    return (parsed, True) if ok and isinstance(parsed, dict) else (None, False)
+
+
+def _parse_reply(raw: str) -> tuple[str, None]:
+    return raw.strip(), None
+
+
+def _is_retryable(exc: Exception) -> bool:
+    import anthropic
+
+    if isinstance(exc, anthropic.APIConnectionError):
+        return True
+    return isinstance(exc, anthropic.APIStatusError) and exc.status_code in RETRY_STATUS
+
+
+def _record_metrics(metrics) -> None:
+    """Queue the telemetry row on the query executor's writer; a failed write is its to report, not the turn's."""
+    from core.queries import query_executor
+    from db.database import save_api_metrics
+
+    query_executor().write(save_api_metrics, metrics.as_row())
+
+
+def build_chat_request(history: list[dict], context: str = "",
+                       prompt: str = SYSTEM_PROMPT) -> tuple[list[dict], list[dict]]:
+    """System blocks and messages for a chat call, with prompt-cache breakpoints.
+
+    Per-learner context (e.g. recurring mistakes) changes from turn to turn,
+    so it travels with the last user message instead of the system prompt:
+    everything before that message is then byte-identical to the previous
+    call and cached up to the breakpoint on the turn before it. When a
+    message is edited, that turn is the fork point, so the regenerated reply
+    reads the shared prefix from the cache as well.
+    """
+    system = [{"type": "text", "text": prompt, "cache_control": {"type": "ephemeral"}}]
+    messages = [dict(m) for m in history]
+    if context and messages and messages[-1]["role"] == "user":
+        messages[-1]["content"] = [
+            {"type": "text", "text": f"CONTEXT DESPRE ELEV (nu face parte din mesaj):\n{context}"},
+            {"type": "text", "text": messages[-1]["content"]},
+        ]
+    if len(messages) >= 2:
+        messages[-2]["content"] = [
+            {"type": "text", "text": messages[-2]["content"], "cache_control": {"type": "ephemeral"}}
+        ]
+    return system, messages
 
 
 class TutorWorker(QThread):
-    """Background thread that calls the Anthropic API and emits results."""
+    """Background thread that calls the Anthropic API and emits results.
+
+    With split=True the reply (REPLY_PROMPT) and the analysis of the
+    learner's message (ANALYSIS_PROMPT) are requested concurrently.
+    reply_ready is emitted as soon as the reply is in, analysis_ready after
+    it, whichever call finished first, with None if the analysis failed. If
+    the reply fails, only error_occurred is emitted, or offline if the
+    failure was a connection or overload error worth trying again later.
+    With split=False response_ready carries both in one dict.
+    """
 
     response_ready = pyqtSignal(dict)
+    reply_ready = pyqtSignal(str)
+    analysis_ready = pyqtSignal(object)
     error_occurred = pyqtSignal(str)
+    offline = pyqtSignal(str)
 
-    def __init__(self, history: list[dict], parent=None):
+    def __init__(self, history: list[dict], parent=None, context: str = "",
+                 prepare_ms: float | None = None, prewarmed: bool = False, split: bool = SPLIT_TURNS):
         super().__init__(parent)
-        self._history = history[-20:]
+        self._history = history[-HISTORY_WINDOW:]
+        self._context = context
+        self._prepare_ms = prepare_ms
+        self._prewarmed = prewarmed
+        self._split = split
+        self._enqueued = time.perf_counter()
 
+    @profiled("tutor_worker_run")
     def run(self) -> None:
+        api_key = os.getenv("ANTHROPIC_API_KEY", "")
+        if not api_key or api_key.startswith("sk-ant-your"):
+            self.error_occurred.emit(
+                "⚠️  No valid ANTHROPIC_API_KEY found. Please set it in your .env file."
+            )
+            return
+        # The chat row carries the learner-facing latency, so it gets prepare_ms
+        chat = {"prepare_ms": self._prepare_ms, "prewarmed": self._prewarmed}
         try:
-            import anthropic  # imported here to allow offline startup
-
-            api_key = os.getenv("ANTHROPIC_API_KEY", "")
-            if not api_key or api_key.startswith("sk-ant-your"):
-                self.error_occurred.emit(
-                    "⚠️  No valid ANTHROPIC_API_KEY found. Please set it in your .env file."
+            if not self._split:
+                self.response_ready.emit(
+                    self._call(api_key, "chat", SYSTEM_PROMPT, MAX_TOKENS, _parse_response_checked, **chat)
                 )
                 return
-
-            client = anthropic.Anthropic(api_key=api_key)
-            message = client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=1024,
-                system=SYSTEM_PROMPT,
-                messages=self._history,
-            )
-            raw = message.content[0].text
-            parsed = _parse_response(raw)
-            self.response_ready.emit(parsed)
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                analysis = pool.submit(self._analyse, api_key)
+                reply = self._call(api_key, "chat", REPLY_PROMPT, REPLY_MAX_TOKENS, _parse_reply, **chat)
+                self.reply_ready.emit(reply)
+                self.analysis_ready.emit(analysis.result())
         except Exception as exc:  # noqa: BLE001
-            self.error_occurred.emit(f"⚠️  API error: {exc}")
+            if _is_retryable(exc):
+                self.offline.emit(f"{type(exc).__name__}: {exc}")
+            else:
+                self.error_occurred.emit(f"⚠️  API error: {exc}")
+
+    def _analyse(self, api_key: str) -> dict | None:
+        try:
+            return self._call(api_key, "analysis", ANALYSIS_PROMPT, MAX_TOKENS, _parse_analysis)
+        except Exception:  # noqa: BLE001
+            log.exception("Analysis error")
+            return None
+
+    def _call(self, api_key: str, kind: str, prompt: str, max_tokens: int, parse, **fields):
+        """One API call, recorded in api_metrics; returns parse(text)[0]."""
+        import anthropic  # imported here to allow offline startup
+        from core.telemetry import ApiCallMetrics
+
+        started = time.perf_counter()
+        metrics = ApiCallMetrics(
+            kind=kind, model=MODEL, queue_wait_ms=(started - self._enqueued) * 1000, **fields,
+        )
+        try:
+            # Retries are ours rather than the SDK's so they can be counted
+            client = anthropic.Anthropic(api_key=api_key, max_retries=0, timeout=REQUEST_TIMEOUT_S)
+            message = self._create_with_retries(client, metrics, started, prompt, max_tokens)
+            result, metrics.parse_ok = parse(message.content[0].text)
+            metrics.stop_reason = message.stop_reason
+            metrics.record_usage(message.usage)
+            return result
+        except Exception as exc:
+            metrics.error = type(exc).__name__
+            raise
+        finally:
+            metrics.total_ms = (time.perf_counter() - started) * 1000
+            _record_metrics(metrics)
+
+    def _create_with_retries(self, client, metrics, started: float, prompt: str, max_tokens: int):
+        while True:
+            first_token = None
+            try:
+                system, messages = build_chat_request(self._history, self._context, prompt)
+                with client.messages.stream(
+                    model=MODEL,
+                    max_tokens=max_tokens,
+                    system=system,
+                    messages=messages,
+                ) as stream:
+                    for _ in stream.text_stream:
+                        if first_token is None:
+                            first_token = time.perf_counter()
+                    message = stream.get_final_message()
+                if first_token is not None:
+                    metrics.ttft_ms = (first_token - started) * 1000
+                return message
+            except Exception as exc:  # noqa: BLE001
+                if metrics.retries >= MAX_RETRIES or not _is_retryable(exc):
+                    raise
+                metrics.retries += 1
+                time.sleep(2 ** (metrics.retries - 1))
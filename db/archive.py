@@ -0,0 +1,315 @@
+"""Cold-session archival and space reclamation for the tutor database.
+
+Sessions with no activity for a while are moved out of the hot `messages`
+and `feedback` tables into `archived_sessions`, one zlib blob per session
+compressed against a preset dictionary trained on the learner's own chat
+text. get_messages() reads them back transparently, and search finds
+them through archived_fts. Freed pages are handed
+back to the filesystem by incremental vacuum, driven by VacuumScheduler.
+
+Run by hand with:  python -m db.archive --days 90
+"""
+import argparse
+import json
+import logging
+import statistics
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+
+from db import database
+from db.database import (
+    get_connection, get_messages, get_cumulative_stats, load_archived_session,
+    to_epoch_ms,
+)
+
+log = logging.getLogger(__name__)
+
+DICT_SIZE = 32 * 1024  # zlib's maximum preset-dictionary window
+DICT_MAX_AGE_DAYS = 30
+DICT_SAMPLE_ROWS = 5000
+
+
+def train_dictionary(samples: list[str], size: int = DICT_SIZE) -> bytes:
+    """Build a zlib preset dictionary from the most frequent word n-grams.
+
+    zlib has no trainer like zstd's, but a dictionary is just text the
+    compressor may back-reference, so the phrases that recur across short
+    chat messages are what we want in it. Most frequent goes last, where
+    zlib's distance codes are cheapest.
+    """
+    counts: Counter[str] = Counter()
+    for text in samples:
+        words = text.split()
+        for n in (1, 2, 3):
+            for i in range(len(words) - n + 1):
+                counts[" ".join(words[i:i + n])] += 1
+    chosen: list[bytes] = []
+    used = 0
+    # Weight by bytes saved, not raw count
+    for phrase, count in sorted(counts.items(), key=lambda kv: kv[1] * len(kv[0]), reverse=True):
+        if count < 2:
+            break
+        chunk = phrase.encode() + b" "
+        if used + len(chunk) > size:
+            continue
+        chosen.append(chunk)
+        used += len(chunk)
+    return b"".join(reversed(chosen))
+
+
+def _current_dict_id(conn) -> int:
+    row = conn.execute(
+        "SELECT id, created_at FROM archive_dicts ORDER BY id DESC LIMIT 1"
+    ).fetchone()
+    cutoff = datetime.utcnow() - timedelta(days=DICT_MAX_AGE_DAYS)
+    if row is not None and row["created_at"] >= cutoff:
+        return row["id"]
+    samples = [
+        r["content"] for r in conn.execute(
+            "SELECT content FROM messages ORDER BY id DESC LIMIT ?", (DICT_SAMPLE_ROWS,)
+        )
+    ]
+    samples += [
+        r["text"] for r in conn.execute(
+            "SELECT COALESCE(correction, '') || ' ' || COALESCE(tip, '') AS text "
+            "FROM feedback ORDER BY id DESC LIMIT ?",
+            (DICT_SAMPLE_ROWS,),
+        )
+    ]
+    cur = conn.execute(
+        "INSERT INTO archive_dicts (data, created_at) VALUES (?, ?)",
+        (train_dictionary(samples), datetime.utcnow()),
+    )
+    return cur.lastrowid
+
+
+def _compress(payload: dict, zdict: bytes) -> tuple[bytes, int]:
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+    deflater = zlib.compressobj(level=9, zdict=zdict)
+    return deflater.compress(raw) + deflater.flush(), len(raw)
+
+
+def _cold_sessions(conn, older_than_days: int, exclude: int | None, limit: int) -> list[int]:
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    rows = conn.execute(
+        """SELECT session_id FROM messages
+           WHERE session_id != ?
+           GROUP BY session_id HAVING MAX(timestamp) < ?
+           ORDER BY session_id LIMIT ?""",
+        (exclude if exclude is not None else -1, cutoff, limit),
+    ).fetchall()
+    return [r["session_id"] for r in rows]
+
+
+def archive_session(conn, session_id: int) -> int:
+    """Move one session's hot rows into its compressed archive blob.
+
+    A session archived before and resumed later is merged with its existing
+    blob. Returns the number of messages moved.
+    """
+    messages = [dict(r) for r in conn.execute(
+        "SELECT id, session_id, role, content, timestamp, parent_id FROM messages "
+        "WHERE session_id = ? ORDER BY id",
+        (session_id,),
+    )]
+    if not messages:
+        return 0
+    feedback = [dict(r) for r in conn.execute(
+        """SELECT f.id, f.message_id, f.positive, f.correction, f.tip
+           FROM feedback f JOIN messages m ON m.id = f.message_id
+           WHERE m.session_id = ? ORDER BY f.id""",
+        (session_id,),
+    )]
+    # Searchable from the archive index once the rows are gone from messages_fts
+    if not database._archive_index_pending(conn, session_id):
+        database._index_archived(conn, session_id, messages, feedback)
+    previous = load_archived_session(conn, session_id)
+    if previous is not None:
+        messages = previous["messages"] + messages
+        feedback = previous["feedback"] + feedback
+
+    for message in messages:
+        message["timestamp"] = to_epoch_ms(message["timestamp"])
+
+    dict_id = _current_dict_id(conn)
+    zdict = conn.execute("SELECT data FROM archive_dicts WHERE id = ?", (dict_id,)).fetchone()["data"]
+    blob, raw_bytes = _compress({"messages": messages, "feedback": feedback}, zdict)
+    conn.execute(
+        """INSERT OR REPLACE INTO archived_sessions
+           (session_id, dict_id, payload, message_count, raw_bytes, archived_at)
+           VALUES (?, ?, ?, ?, ?, ?)""",
+        (session_id, dict_id, blob, len(messages), raw_bytes, datetime.utcnow()),
+    )
+    conn.execute(
+        "DELETE FROM feedback WHERE message_id IN (SELECT id FROM messages WHERE session_id = ?)",
+        (session_id,),
+    )
+    conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+    return len(messages)
+
+
+@database._writes("messages", "feedback", "archived_sessions", "archived_fts")
+def archive_next_session(older_than_days: int, exclude: int | None = None) -> bool:
+    """Archive one cold session; returns True when none are left.
+
+    Shaped as a MaintenanceWorker step so archival runs a session at a time
+    in the background.
+    """
+    with get_connection() as conn:
+        cold = _cold_sessions(conn, older_than_days, exclude, limit=1)
+        if not cold:
+            return True
+        archive_session(conn, cold[0])
+    return False
+
+
+def needs_incremental_vacuum() -> bool:
+    """True if the database predates auto_vacuum=INCREMENTAL and still has to be converted."""
+    with get_connection() as conn:
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2
+
+
+def enable_incremental_vacuum() -> None:
+    """Switch an existing database to auto_vacuum=INCREMENTAL.
+
+    Takes a full VACUUM, so it is one-off and slow on a large file; run it
+    where the other writes can queue behind it.
+    """
+    with get_connection() as conn:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+
+
+def incremental_vacuum(max_pages: int = 2000) -> int:
+    """Release up to max_pages free pages to the filesystem; returns pages freed."""
+    with get_connection() as conn:
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if before:
+            conn.execute(f"PRAGMA incremental_vacuum({int(max_pages)})").fetchall()
+        after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return before - after
+
+
+class VacuumScheduler(threading.Thread):
+    """Daemon thread that periodically trims the freelist in small steps.
+
+    The steps run on the query executor's writer, one at a time between
+    the app's own writes.
+    """
+
+    def __init__(self, interval_s: float = 300.0, min_free_pages: int = 256,
+                 pages_per_step: int = 2000):
+        from core.queries import query_executor
+
+        super().__init__(name="vacuum-scheduler", daemon=True)
+        self._queries = query_executor()
+        self._interval_s = interval_s
+        self._min_free_pages = min_free_pages
+        self._pages_per_step = pages_per_step
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wake.set()
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.wait(self._interval_s)
+            self._wake.clear()
+            try:
+                with get_connection() as conn:
+                    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                while free >= self._min_free_pages and not self._stopped.is_set():
+                    freed = self._queries.write(incremental_vacuum, self._pages_per_step).result()
+                    if freed <= 0:
+                        break
+                    free -= freed
+            except Exception:  # noqa: BLE001
+                log.exception("Vacuum error")
+
+
+def _timed_ms(fn, repeat: int = 5) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def _count_messages() -> int:
+    with get_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+
+def measure() -> dict:
+    """Database size and latency of the hot-path queries."""
+    with get_connection() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        hot = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        archived = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(raw_bytes), 0), COALESCE(SUM(LENGTH(payload)), 0) "
+            "FROM archived_sessions"
+        ).fetchone()
+        last = conn.execute("SELECT MAX(id) FROM sessions").fetchone()[0]
+    return {
+        "file_bytes": database.current_db_path().stat().st_size,
+        "used_bytes": (pages - free) * page_size,
+        "freelist_pages": free,
+        "hot_messages": hot,
+        "archived_sessions": archived[0],
+        "archive_raw_bytes": archived[1],
+        "archive_compressed_bytes": archived[2],
+        "latency_ms": {
+            "get_messages_latest": _timed_ms(lambda: get_messages(last or 0)),
+            "get_cumulative_stats": _timed_ms(get_cumulative_stats),
+            "count_messages": _timed_ms(_count_messages),
+        },
+    }
+
+
+def archive_old_sessions(older_than_days: int, exclude: int | None = None) -> dict:
+    """Archive every cold session, vacuum, and report before/after numbers."""
+    before = measure()
+    archived = 0
+    while not archive_next_session(older_than_days, exclude):
+        archived += 1
+    while incremental_vacuum() > 0:
+        pass
+    return {"sessions_archived": archived, "before": before, "after": measure()}
+
+
+def main() -> None:
+    from db.database import init_db
+
+    parser = argparse.ArgumentParser(description="Archive cold tutor sessions.")
+    parser.add_argument("--days", type=int, default=90,
+                        help="archive sessions with no messages for this many days")
+    parser.add_argument("--profile", help="learner profile (default: the database from before profiles)")
+    args = parser.parse_args()
+    if args.profile:
+        from db.profiles import get_profile, use_profile
+
+        profile = get_profile(args.profile)
+        if profile is None:
+            parser.error(f"no profile named {args.profile!r}")
+        use_profile(profile)
+    init_db()
+    if needs_incremental_vacuum():
+        enable_incremental_vacuum()
+    print(json.dumps(archive_old_sessions(args.days), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,157 @@
+import json
 import sqlite3
 import os
+import threading
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache, wraps
+from typing import Callable
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 
 
-DB_DIR = Path.home() / ".local" / "share" / "english-tutor"
+# Shared application data (profile registry, word index); each learner's
+# own database lives in DB_DIR, which db.profiles.use_profile() points at
+DATA_DIR = Path.home() / ".local" / "share" / "english-tutor"
+DB_DIR = DATA_DIR
 DB_PATH = DB_DIR / "tutor.db"
 
+# Overrides DB_PATH for the current thread (or task) inside shard()
+_shard_path: ContextVar[Path | None] = ContextVar("shard_path", default=None)
+# Inside read_only(): queries go through the thread's own read-only connection
+_read_only: ContextVar[bool] = ContextVar("read_only", default=False)
+_readers = threading.local()
+
+# Called with the tables a write touched, once it has committed
+_write_listeners: list[Callable[[frozenset[str]], None]] = []
+
+# Markers wrapped around matched terms in search snippets; the UI swaps them
+# for highlight markup after escaping the surrounding text.
+SNIPPET_OPEN = "\x02"
+SNIPPET_CLOSE = "\x03"
+
+# Timestamps are stored as integer epoch milliseconds (UTC) in columns declared
+# "EPOCHMS INTEGER": integer affinity for SQLite, and a decltype the converter
+# below keys on so rows still come back as (naive UTC) datetime objects.
+TIMESTAMP_COLUMNS = {
+    "sessions": "created_at",
+    "messages": "timestamp",
+    "vocabulary": "first_seen",
+    "goals": "created_at",
+    "archive_dicts": "created_at",
+    "archived_sessions": "archived_at",
+    "api_metrics": "started_at",
+    "exercises": "created_at",
+}
+MS_PER_DAY = 86_400_000
+
+
+def to_epoch_ms(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def from_epoch_ms(value: int) -> datetime:
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+
+sqlite3.register_adapter(datetime, to_epoch_ms)
+sqlite3.register_converter("EPOCHMS", lambda raw: from_epoch_ms(int(raw)))
+
+# Full-text indexes: name -> (source table, indexed columns)
+FTS_INDEXES = {
+    "messages": ("messages", ("content",)),
+    "feedback": ("feedback", ("correction", "tip")),
+}
+
+
+def current_db_path() -> Path:
+    return _shard_path.get() or DB_PATH
+
+
+@contextmanager
+def shard(path: Path):
+    """Run the queries in the block against the database at path instead of DB_PATH.
+
+    Scoped to the calling thread, so worker threads can each read a
+    different learner's database while the window keeps using its own.
+    """
+    token = _shard_path.set(Path(path))
+    try:
+        yield
+    finally:
+        _shard_path.reset(token)
+
+
+@contextmanager
+def read_only():
+    """Run the queries in the block on a read-only connection kept for the calling thread.
+
+    For reader threads: WAL lets them read while the window writes, and
+    each keeps one connection per database instead of opening one per query.
+    """
+    token = _read_only.set(True)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+def _reader(path: Path) -> sqlite3.Connection:
+    connections = getattr(_readers, "connections", None)
+    if connections is None:
+        connections = _readers.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True,
+                               detect_types=sqlite3.PARSE_DECLTYPES)
+        conn.row_factory = sqlite3.Row
+        connections[path] = conn
+    return conn
+
+
+def add_write_listener(listener: Callable[[frozenset[str]], None]) -> None:
+    """Have listener called with the tables each write touched (from the writing thread)."""
+    _write_listeners.append(listener)
+
+
+def _writes(*tables: str):
+    """Decorator: report tables to the write listeners after each successful call."""
+    touched = frozenset(tables)
+
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            result = fn(*args, **kwargs)
+            for listener in _write_listeners:
+                listener(touched)
+            return result
+        return wrapper
+    return decorate
+
+
+def _reads(*tables: str):
+    """Decorator: record the tables a query reads, so its results can be cached until they change."""
+    def decorate(fn):
+        fn.tables = frozenset(tables)
+        return fn
+    return decorate
+
 
 def get_connection() -> sqlite3.Connection:
-    DB_DIR.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(DB_PATH))
+    path = current_db_path()
+    if _read_only.get():
+        return _reader(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    new = not path.exists()
+    conn = sqlite3.connect(str(path), detect_types=sqlite3.PARSE_DECLTYPES)
     conn.row_factory = sqlite3.Row
+    if new:
+        # Only free before the first write (WAL's included); an existing file
+        # needs the full VACUUM of archive.enable_incremental_vacuum()
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA foreign_keys=ON")
     return conn
@@ -19,12 +159,16 @@ def get_connection() -> sqlite3.Connection:
 
 def init_db() -> None:
     with get_connection() as conn:
+        had_rollups = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_rollups'"
+        ).fetchone() is not None
         conn.executescript("""
             CREATE TABLE IF NOT EXISTS sessions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                created_at TEXT NOT NULL,
+                created_at EPOCHMS INTEGER NOT NULL,
                 level TEXT DEFAULT 'beginner',
-                total_messages INTEGER DEFAULT 0
+                total_messages INTEGER DEFAULT 0,
+                head_id INTEGER
             );
 
             CREATE TABLE IF NOT EXISTS messages (
@@ -32,7 +176,8 @@ def init_db() -> None:
                 session_id INTEGER NOT NULL,
                 role TEXT NOT NULL,
                 content TEXT NOT NULL,
-                timestamp TEXT NOT NULL,
+                timestamp EPOCHMS INTEGER NOT NULL,
+                parent_id INTEGER,
                 FOREIGN KEY (session_id) REFERENCES sessions(id)
             );
 
@@ -48,7 +193,7 @@ def init_db() -> None:
             CREATE TABLE IF NOT EXISTS vocabulary (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 word TEXT NOT NULL,
-                first_seen TEXT NOT NULL,
+                first_seen EPOCHMS INTEGER NOT NULL,
                 session_id INTEGER NOT NULL,
                 FOREIGN KEY (session_id) REFERENCES sessions(id)
             );
@@ -59,7 +204,7 @@ def init_db() -> None:
             CREATE TABLE IF NOT EXISTS goals (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 goal_text TEXT NOT NULL,
-                created_at TEXT NOT NULL,
+                created_at EPOCHMS INTEGER NOT NULL,
                 session_id INTEGER NOT NULL,
                 FOREIGN KEY (session_id) REFERENCES sessions(id)
             );
@@ -72,14 +217,452 @@ def init_db() -> None:
                 corrections_count INTEGER DEFAULT 0,
                 FOREIGN KEY (session_id) REFERENCES sessions(id)
             );
+
+            CREATE TABLE IF NOT EXISTS daily_rollups (
+                day INTEGER PRIMARY KEY,
+                user_messages INTEGER DEFAULT 0,
+                corrections INTEGER DEFAULT 0,
+                new_words INTEGER DEFAULT 0,
+                level TEXT,
+                level_changes INTEGER DEFAULT 0
+            );
+
+            CREATE TABLE IF NOT EXISTS feedback_tags (
+                feedback_id INTEGER NOT NULL,
+                category TEXT NOT NULL,
+                PRIMARY KEY (feedback_id, category),
+                FOREIGN KEY (feedback_id) REFERENCES feedback(id) ON DELETE CASCADE
+            ) WITHOUT ROWID;
+
+            CREATE INDEX IF NOT EXISTS idx_feedback_tags_category
+                ON feedback_tags (category, feedback_id);
+
+            CREATE TABLE IF NOT EXISTS daily_category_rollups (
+                day INTEGER NOT NULL,
+                category TEXT NOT NULL,
+                count INTEGER DEFAULT 0,
+                PRIMARY KEY (day, category)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS backfill_progress (
+                name TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                target INTEGER NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS api_metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at EPOCHMS INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                model TEXT NOT NULL,
+                queue_wait_ms REAL,
+                ttft_ms REAL,
+                total_ms REAL,
+                input_tokens INTEGER DEFAULT 0,
+                output_tokens INTEGER DEFAULT 0,
+                cache_creation_tokens INTEGER DEFAULT 0,
+                cache_read_tokens INTEGER DEFAULT 0,
+                retries INTEGER DEFAULT 0,
+                stop_reason TEXT,
+                parse_ok INTEGER,
+                error TEXT,
+                cost_usd REAL DEFAULT 0.0,
+                prepare_ms REAL,
+                prewarmed INTEGER
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_api_metrics_started
+                ON api_metrics (started_at);
+
+            CREATE TABLE IF NOT EXISTS exercises (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                hint TEXT,
+                created_at EPOCHMS INTEGER NOT NULL,
+                last_used EPOCHMS INTEGER,
+                served_count INTEGER DEFAULT 0,
+                correct_count INTEGER DEFAULT 0,
+                stale INTEGER DEFAULT 0,
+                FOREIGN KEY (session_id) REFERENCES sessions(id)
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_exercises_queue
+                ON exercises (session_id, stale, served_count, last_used);
+
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id INTEGER NOT NULL,
+                message_id INTEGER NOT NULL,
+                context TEXT NOT NULL DEFAULT '',
+                created_at EPOCHMS INTEGER NOT NULL,
+                attempts INTEGER DEFAULT 0,
+                last_error TEXT,
+                FOREIGN KEY (session_id) REFERENCES sessions(id),
+                FOREIGN KEY (message_id) REFERENCES messages(id)
+            );
+
+            CREATE TABLE IF NOT EXISTS archive_dicts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                data BLOB NOT NULL,
+                created_at EPOCHMS INTEGER NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS archived_sessions (
+                session_id INTEGER PRIMARY KEY,
+                dict_id INTEGER NOT NULL,
+                payload BLOB NOT NULL,
+                message_count INTEGER NOT NULL,
+                raw_bytes INTEGER NOT NULL,
+                archived_at EPOCHMS INTEGER NOT NULL,
+                FOREIGN KEY (session_id) REFERENCES sessions(id),
+                FOREIGN KEY (dict_id) REFERENCES archive_dicts(id)
+            );
         """)
+        _migrate_epoch_timestamps(conn)
+        _migrate_message_tree(conn)
+        _migrate_api_metrics(conn)
+        conn.executescript("""
+            CREATE INDEX IF NOT EXISTS idx_messages_session_ts
+                ON messages (session_id, timestamp);
+
+            CREATE INDEX IF NOT EXISTS idx_messages_ts
+                ON messages (timestamp);
+
+            CREATE INDEX IF NOT EXISTS idx_messages_parent
+                ON messages (parent_id, session_id);
+
+            CREATE INDEX IF NOT EXISTS idx_stats_session
+                ON stats (session_id);
+        """)
+        _init_search_index(conn)
+        conn.execute(
+            "INSERT OR IGNORE INTO backfill_progress (name, position, target) "
+            "SELECT 'feedback_tags', 0, COALESCE(MAX(id), 0) FROM feedback"
+        )
+        if not had_rollups:
+            _rebuild_daily_rollups(conn)
+
+
+def _migrate_epoch_timestamps(conn: sqlite3.Connection, chunk_size: int = 5000) -> None:
+    """Convert legacy ISO-8601 TEXT timestamps to epoch milliseconds.
+
+    Each table gets a new "<col>_ms" column filled in rowid chunks, one commit
+    per chunk, so an interrupted run just picks up where it stopped; the old
+    column is then dropped and the new one renamed into its place.
+    """
+    for table, col in TIMESTAMP_COLUMNS.items():
+        columns = {r["name"]: r["type"] for r in conn.execute(f"PRAGMA table_info({table})")}
+        if columns.get(col, "").upper().startswith("EPOCHMS"):
+            continue
+        tmp = f"{col}_ms"
+        if tmp not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {tmp} EPOCHMS INTEGER")
+        if col in columns:
+            start, end = conn.execute(
+                f"SELECT MIN(rowid), MAX(rowid) FROM {table} WHERE {tmp} IS NULL"
+            ).fetchone()
+            while start is not None and start <= end:
+                conn.execute(
+                    f"""UPDATE {table}
+                        SET {tmp} = COALESCE(CAST(ROUND((julianday({col}) - 2440587.5) * {MS_PER_DAY}) AS INTEGER), 0)
+                        WHERE rowid >= ? AND rowid < ? AND {tmp} IS NULL""",
+                    (start, start + chunk_size),
+                )
+                conn.commit()
+                start += chunk_size
+        conn.execute("BEGIN")
+        if col in columns:
+            conn.execute(f"ALTER TABLE {table} DROP COLUMN {col}")
+        conn.execute(f"ALTER TABLE {table} RENAME COLUMN {tmp} TO {col}")
+        conn.commit()
+
+
+def _migrate_message_tree(conn: sqlite3.Connection) -> None:
+    """Link existing messages into a chain per session and point each session at its last one.
+
+    Runs once, in one transaction, on databases from before conversation
+    branching; every message's parent becomes the previous one in its session.
+    Archived sessions keep their blobs as they are (load_archived_session
+    links them on the way out) and only need their head looked up.
+    """
+    if "parent_id" in {r["name"] for r in conn.execute("PRAGMA table_info(messages)")}:
+        return
+    conn.execute("BEGIN")
+    conn.execute("ALTER TABLE messages ADD COLUMN parent_id INTEGER")
+    conn.execute("ALTER TABLE sessions ADD COLUMN head_id INTEGER")
+    conn.execute("""
+        UPDATE messages SET parent_id = chain.prev
+        FROM (SELECT id, LAG(id) OVER (PARTITION BY session_id ORDER BY id) AS prev FROM messages) AS chain
+        WHERE chain.id = messages.id AND chain.prev IS NOT NULL
+    """)
+    conn.execute("UPDATE sessions SET head_id = (SELECT MAX(id) FROM messages WHERE session_id = sessions.id)")
+    for (session_id,) in conn.execute(
+        "SELECT id FROM sessions WHERE head_id IS NULL AND id IN (SELECT session_id FROM archived_sessions)"
+    ).fetchall():
+        archived = load_archived_session(conn, session_id)
+        conn.execute("UPDATE sessions SET head_id = ? WHERE id = ?",
+                     (max(m["id"] for m in archived["messages"]), session_id))
+    conn.commit()
+
+
+def _migrate_api_metrics(conn: sqlite3.Connection) -> None:
+    """Add the prewarming columns to api_metrics tables from before them."""
+    columns = {r["name"] for r in conn.execute("PRAGMA table_info(api_metrics)")}
+    for name, decl in (("prepare_ms", "REAL"), ("prewarmed", "INTEGER")):
+        if name not in columns:
+            conn.execute(f"ALTER TABLE api_metrics ADD COLUMN {name} {decl}")
 
 
+def _init_search_index(conn: sqlite3.Connection) -> None:
+    """Create the FTS5 tables and the triggers that keep them in sync.
+
+    Rows that existed before the index was created are indexed later in
+    chunks by backfill_search_index(); fts_backfill tracks how far that got,
+    and the delete/update triggers only touch rows already in the index.
+
+    Archived rows are gone from messages/feedback, so they are indexed in
+    archived_fts instead: contentless (the text stays in the compressed
+    blob), with archived_search saying which session and row each entry is.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS fts_backfill (
+            name TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            target INTEGER NOT NULL
+        )
+    """)
+    for name, (table, columns) in FTS_INDEXES.items():
+        fts = f"{name}_fts"
+        cols = ", ".join(columns)
+        new_cols = ", ".join(f"new.{c}" for c in columns)
+        old_cols = ", ".join(f"old.{c}" for c in columns)
+        indexed = (
+            f"(old.id > (SELECT target FROM fts_backfill WHERE name = '{name}') "
+            f"OR old.id <= (SELECT position FROM fts_backfill WHERE name = '{name}'))"
+        )
+        conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{cols}, content='{table}', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        conn.execute(
+            "INSERT OR IGNORE INTO fts_backfill (name, position, target) "
+            f"SELECT ?, 0, COALESCE(MAX(id), 0) FROM {table}",
+            (name,),
+        )
+        conn.executescript(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_cols});
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table}
+            WHEN {indexed} BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table}
+            WHEN {indexed} BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_cols});
+            END;
+        """)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS archived_search (
+            id INTEGER PRIMARY KEY,
+            session_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            source_id INTEGER NOT NULL
+        );
+
+        CREATE VIRTUAL TABLE IF NOT EXISTS archived_fts USING fts5(
+            text, content='', tokenize='unicode61 remove_diacritics 2'
+        );
+    """)
+    # Sessions archived before the archive index existed are indexed by the backfill
+    conn.execute(
+        "INSERT OR IGNORE INTO fts_backfill (name, position, target) "
+        "SELECT 'archived', 0, COALESCE(MAX(session_id), 0) FROM archived_sessions"
+    )
+
+
+def _feedback_text(feedback) -> str:
+    return " ".join(feedback[c] for c in FTS_INDEXES["feedback"][1] if feedback[c])
+
+
+def _index_archived(conn: sqlite3.Connection, session_id: int, messages, feedback) -> None:
+    """Add the archived session's messages and feedback to archived_fts."""
+    for kind, source_id, text in [("message", m["id"], m["content"]) for m in messages] + \
+                                 [("feedback", f["id"], _feedback_text(f)) for f in feedback]:
+        if not text:
+            continue
+        entry_id = conn.execute(
+            "INSERT INTO archived_search (session_id, kind, source_id) VALUES (?, ?, ?)",
+            (session_id, kind, source_id),
+        ).lastrowid
+        conn.execute("INSERT INTO archived_fts (rowid, text) VALUES (?, ?)", (entry_id, text))
+
+
+def _archive_index_pending(conn: sqlite3.Connection, session_id: int) -> bool:
+    """True if the backfill has still to index the session's archive (all of it)."""
+    state = conn.execute("SELECT position, target FROM fts_backfill WHERE name = 'archived'").fetchone()
+    return state is not None and state["position"] < session_id <= state["target"]
+
+
+@_writes("messages_fts", "feedback_fts", "archived_fts", "fts_backfill")
+def backfill_search_index(batch_size: int = 500) -> bool:
+    """Index one chunk of pre-existing rows per FTS table.
+
+    Returns True once every index is complete, so callers can loop on it
+    from a background thread without holding a long write transaction.
+    """
+    done = True
+    with get_connection() as conn:
+        for name, (table, columns) in FTS_INDEXES.items():
+            state = conn.execute(
+                "SELECT position, target FROM fts_backfill WHERE name = ?", (name,)
+            ).fetchone()
+            if state is None or state["position"] >= state["target"]:
+                continue
+            cols = ", ".join(columns)
+            rows = conn.execute(
+                f"SELECT id, {cols} FROM {table} WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                (state["position"], state["target"], batch_size),
+            ).fetchall()
+            placeholders = ", ".join("?" for _ in range(len(columns) + 1))
+            conn.executemany(
+                f"INSERT INTO {name}_fts (rowid, {cols}) VALUES ({placeholders})",
+                [tuple(r) for r in rows],
+            )
+            position = rows[-1]["id"] if len(rows) == batch_size else state["target"]
+            conn.execute(
+                "UPDATE fts_backfill SET position = ? WHERE name = ?", (position, name)
+            )
+            done = done and position >= state["target"]
+
+        state = conn.execute("SELECT position, target FROM fts_backfill WHERE name = 'archived'").fetchone()
+        if state is not None and state["position"] < state["target"]:
+            # One archived session per call: each is a single blob
+            row = conn.execute(
+                "SELECT session_id FROM archived_sessions WHERE session_id > ? AND session_id <= ? "
+                "ORDER BY session_id LIMIT 1",
+                (state["position"], state["target"]),
+            ).fetchone()
+            position = state["target"]
+            if row is not None:
+                archived = load_archived_session(conn, row["session_id"])
+                _index_archived(conn, row["session_id"], archived["messages"], archived["feedback"])
+                position = row["session_id"]
+            conn.execute("UPDATE fts_backfill SET position = ? WHERE name = 'archived'", (position,))
+            done = done and position >= state["target"]
+    return done
+
+
+def _fts_query(text: str) -> str:
+    """Turn free user input into a safe FTS5 query (all terms, last one as prefix)."""
+    terms = ['"' + t.replace('"', '""') + '"' for t in text.split()]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_history(query: str, limit: int = 20, offset: int = 0) -> list[dict]:
+    """Ranked search over all messages and feedback.
+
+    Each hit points at a message (for feedback, the assistant message it was
+    given with) and carries a snippet with matches wrapped in
+    SNIPPET_OPEN/SNIPPET_CLOSE.
+    """
+    match = _fts_query(query)
+    if not match:
+        return []
+    window = limit + offset
+    with get_connection() as conn:
+        hot = conn.execute(
+            """
+            SELECT * FROM (
+                SELECT * FROM (
+                    SELECT 'message' AS kind, m.id AS message_id, m.session_id, m.role,
+                           m.timestamp, snippet(messages_fts, -1, :open, :close, '…', 12) AS snippet,
+                           messages_fts.rank AS rank
+                    FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+                    WHERE messages_fts MATCH :match
+                    ORDER BY rank LIMIT :window
+                )
+                UNION ALL
+                SELECT * FROM (
+                    SELECT 'feedback' AS kind, m.id AS message_id, m.session_id, m.role,
+                           m.timestamp, snippet(feedback_fts, -1, :open, :close, '…', 12) AS snippet,
+                           feedback_fts.rank AS rank
+                    FROM feedback_fts
+                    JOIN feedback f ON f.id = feedback_fts.rowid
+                    JOIN messages m ON m.id = f.message_id
+                    WHERE feedback_fts MATCH :match
+                    ORDER BY rank LIMIT :window
+                )
+            )
+            ORDER BY rank LIMIT :window
+            """,
+            {
+                "open": SNIPPET_OPEN,
+                "close": SNIPPET_CLOSE,
+                "match": match,
+                "window": window,
+            },
+        ).fetchall()
+        archived = conn.execute(
+            """SELECT a.kind, a.session_id, a.source_id, archived_fts.rank AS rank
+               FROM archived_fts JOIN archived_search a ON a.id = archived_fts.rowid
+               WHERE archived_fts MATCH ? ORDER BY rank LIMIT ?""",
+            (match, window),
+        ).fetchall()
+        hits = sorted([dict(r) for r in hot] + [dict(r) for r in archived], key=lambda h: h["rank"])
+        hits = hits[offset:window]
+        if any("source_id" in h for h in hits):
+            _describe_archived_hits(conn, [h for h in hits if "source_id" in h], match)
+        return hits
+
+
+def _describe_archived_hits(conn: sqlite3.Connection, hits: list[dict], match: str) -> None:
+    """Fill in archived hits like the hot ones: message, role, timestamp and snippet.
+
+    Snippets come from a temp FTS table holding just these hits' text, so
+    they match the ones FTS5 makes for hot rows.
+    """
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp.archived_snippets USING fts5("
+                 "text, tokenize='unicode61 remove_diacritics 2')")
+    conn.execute("DELETE FROM temp.archived_snippets")
+    blobs = {}
+    for i, hit in enumerate(hits):
+        if hit["session_id"] not in blobs:
+            archived = load_archived_session(conn, hit["session_id"])
+            blobs[hit["session_id"]] = archived, {m["id"]: m for m in archived["messages"]}
+        archived, messages = blobs[hit["session_id"]]
+        if hit["kind"] == "message":
+            message, text = messages[hit["source_id"]], messages[hit["source_id"]]["content"]
+        else:
+            feedback = next(f for f in archived["feedback"] if f["id"] == hit["source_id"])
+            message, text = messages[feedback["message_id"]], _feedback_text(feedback)
+        hit.update(message_id=message["id"], role=message["role"], timestamp=message["timestamp"])
+        conn.execute("INSERT INTO temp.archived_snippets (rowid, text) VALUES (?, ?)", (i, text))
+    snippets = dict(conn.execute(
+        "SELECT rowid, snippet(archived_snippets, 0, ?, ?, '…', 12) FROM temp.archived_snippets "
+        "WHERE archived_snippets MATCH ?",
+        (SNIPPET_OPEN, SNIPPET_CLOSE, match),
+    ).fetchall())
+    for i, hit in enumerate(hits):
+        hit["snippet"] = snippets.get(i, "")
+        del hit["source_id"]
+
+
+@_writes("sessions", "stats")
 def create_session(level: str = "beginner") -> int:
     with get_connection() as conn:
         cur = conn.execute(
             "INSERT INTO sessions (created_at, level, total_messages) VALUES (?, ?, 0)",
-            (datetime.utcnow().isoformat(), level),
+            (datetime.utcnow(), level),
         )
         session_id = cur.lastrowid
         conn.execute(
@@ -89,6 +672,7 @@ def create_session(level: str = "beginner") -> int:
         return session_id
 
 
+@_reads("sessions")
 def get_last_session() -> sqlite3.Row | None:
     with get_connection() as conn:
         return conn.execute(
@@ -96,42 +680,277 @@ def get_last_session() -> sqlite3.Row | None:
         ).fetchone()
 
 
+def _insert_message(conn: sqlite3.Connection, session_id: int, role: str, content: str,
+                    parent_id: int | None) -> int:
+    message_id = conn.execute(
+        "INSERT INTO messages (session_id, role, content, timestamp, parent_id) VALUES (?, ?, ?, ?, ?)",
+        (session_id, role, content, datetime.utcnow(), parent_id),
+    ).lastrowid
+    conn.execute(
+        "UPDATE sessions SET total_messages = total_messages + 1, head_id = ? WHERE id = ?",
+        (message_id, session_id),
+    )
+    return message_id
+
+
+@_writes("messages", "sessions")
 def save_message(session_id: int, role: str, content: str) -> int:
+    """Append a message to the session's active branch."""
+    with get_connection() as conn:
+        head = conn.execute("SELECT head_id FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return _insert_message(conn, session_id, role, content, head["head_id"] if head else None)
+
+
+@_writes("messages", "sessions")
+def save_branch_message(session_id: int, role: str, content: str, parent_id: int | None) -> int:
+    """Start a new branch: a message under parent_id (None for a new first message), made the head."""
+    with get_connection() as conn:
+        return _insert_message(conn, session_id, role, content, parent_id)
+
+
+@_writes("feedback")
+def save_feedback(message_id: int, positive: str, correction: str | None, tip: str) -> int:
     with get_connection() as conn:
         cur = conn.execute(
-            "INSERT INTO messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
-            (session_id, role, content, datetime.utcnow().isoformat()),
-        )
-        conn.execute(
-            "UPDATE sessions SET total_messages = total_messages + 1 WHERE id = ?",
-            (session_id,),
+            "INSERT INTO feedback (message_id, positive, correction, tip) VALUES (?, ?, ?, ?)",
+            (message_id, positive, correction, tip),
         )
         return cur.lastrowid
 
 
-def save_feedback(message_id: int, positive: str, correction: str | None, tip: str) -> None:
+def _insert_feedback_tags(conn: sqlite3.Connection, tags: list[tuple[int, str]]) -> None:
+    """Insert (feedback_id, category) pairs and fold them into the daily category rollups."""
+    if not tags:
+        return
+    conn.executemany(
+        "INSERT OR IGNORE INTO feedback_tags (feedback_id, category) VALUES (?, ?)", tags
+    )
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS new_tags (feedback_id INTEGER, category TEXT)")
+    conn.execute("DELETE FROM temp.new_tags")
+    conn.executemany("INSERT INTO temp.new_tags VALUES (?, ?)", tags)
+    conn.execute(f"""
+        INSERT INTO daily_category_rollups (day, category, count)
+        SELECT m.timestamp / {MS_PER_DAY} AS d, t.category, COUNT(*)
+        FROM temp.new_tags t
+        JOIN feedback f ON f.id = t.feedback_id
+        JOIN messages m ON m.id = f.message_id
+        GROUP BY d, t.category
+        ON CONFLICT(day, category) DO UPDATE SET count = count + excluded.count
+    """)
+
+
+@_writes("feedback_tags", "daily_category_rollups")
+def tag_feedback(feedback_id: int, categories: list[str]) -> None:
+    with get_connection() as conn:
+        _insert_feedback_tags(conn, [(feedback_id, c) for c in categories])
+
+
+@_writes("feedback_tags", "daily_category_rollups", "backfill_progress")
+def backfill_feedback_tags(classify: Callable[[str | None], list[str]], batch_size: int = 5000) -> bool:
+    """Classify one chunk of feedback rows that predate tagging.
+
+    Returns True once the backlog is empty (MaintenanceWorker step).
+    """
     with get_connection() as conn:
+        state = conn.execute(
+            "SELECT position, target FROM backfill_progress WHERE name = 'feedback_tags'"
+        ).fetchone()
+        if state is None or state["position"] >= state["target"]:
+            return True
+        rows = conn.execute(
+            "SELECT id, correction FROM feedback WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+            (state["position"], state["target"], batch_size),
+        ).fetchall()
+        _insert_feedback_tags(
+            conn, [(r["id"], c) for r in rows for c in classify(r["correction"])]
+        )
+        position = rows[-1]["id"] if len(rows) == batch_size else state["target"]
         conn.execute(
-            "INSERT INTO feedback (message_id, positive, correction, tip) VALUES (?, ?, ?, ?)",
-            (message_id, positive, correction, tip),
+            "UPDATE backfill_progress SET position = ? WHERE name = 'feedback_tags'", (position,)
         )
+        return position >= state["target"]
+
 
+@_reads("daily_category_rollups")
+def get_error_profile(since: datetime | None = None, limit: int = 5) -> list[tuple[str, int]]:
+    """Most frequent mistake categories, from the daily category rollups."""
+    since_day = to_epoch_ms(since) // MS_PER_DAY if since else 0
+    with get_connection() as conn:
+        rows = conn.execute(
+            """SELECT category, SUM(count) AS n FROM daily_category_rollups
+               WHERE day >= ? GROUP BY category ORDER BY n DESC LIMIT ?""",
+            (since_day, limit),
+        ).fetchall()
+        return [(r["category"], r["n"]) for r in rows]
+
+
+_CORRECTION_COLUMNS = """
+    f.id, f.correction, f.tip, m.timestamp,
+    (SELECT u.content FROM messages u WHERE u.id = m.parent_id AND u.role = 'user') AS learner_text
+"""
 
-def save_vocabulary(words: list[str], session_id: int) -> None:
+
+def get_corrections(after_id: int = 0, limit: int = 500) -> list[sqlite3.Row]:
+    """Feedback rows with a correction, oldest first, each with the learner message it answered."""
+    with get_connection() as conn:
+        return conn.execute(
+            f"""SELECT {_CORRECTION_COLUMNS}
+                FROM feedback f JOIN messages m ON m.id = f.message_id
+                WHERE f.id > ? AND f.correction IS NOT NULL AND f.correction != ''
+                ORDER BY f.id LIMIT ?""",
+            (after_id, limit),
+        ).fetchall()
+
+
+def get_corrections_by_id(feedback_ids: list[int]) -> list[sqlite3.Row]:
+    if not feedback_ids:
+        return []
+    with get_connection() as conn:
+        return conn.execute(
+            f"""SELECT {_CORRECTION_COLUMNS}
+                FROM feedback f JOIN messages m ON m.id = f.message_id
+                WHERE f.id IN ({", ".join("?" for _ in feedback_ids)})""",
+            feedback_ids,
+        ).fetchall()
+
+
+def get_session_corrections(session_id: int, limit: int = 10) -> list[sqlite3.Row]:
+    """The session's latest corrections, newest first, each with the learner message it answered."""
+    with get_connection() as conn:
+        # Walk feedback from the newest row: the session's corrections are at the end
+        return conn.execute(
+            f"""SELECT {_CORRECTION_COLUMNS}
+                FROM feedback f CROSS JOIN messages m ON m.id = f.message_id
+                WHERE m.session_id = ? AND f.correction IS NOT NULL AND f.correction != ''
+                ORDER BY f.id DESC LIMIT ?""",
+            (session_id, limit),
+        ).fetchall()
+
+
+def get_daily_category_rollups(since_day: int = 0) -> list[sqlite3.Row]:
+    with get_connection() as conn:
+        return conn.execute(
+            "SELECT * FROM daily_category_rollups WHERE day >= ? ORDER BY day ASC",
+            (since_day,),
+        ).fetchall()
+
+
+@_writes("vocabulary")
+def save_vocabulary(words: list[str], session_id: int) -> int:
+    """Store new words; returns how many were not already in the session."""
     if not words:
-        return
-    now = datetime.utcnow().isoformat()
+        return 0
+    now = datetime.utcnow()
     with get_connection() as conn:
+        before = conn.total_changes
         conn.executemany(
             "INSERT OR IGNORE INTO vocabulary (word, first_seen, session_id) VALUES (?, ?, ?)",
             [(w, now, session_id) for w in words],
         )
+        return conn.total_changes - before
+
+
+@_writes("exercises")
+def save_exercises(session_id: int, exercises: list[dict], vocab_size: int) -> int:
+    """Queue a generated batch; returns how many were stored.
+
+    vocab_size is the session's vocabulary size the batch was built from.
+    If words were added since, the batch goes in already stale; otherwise
+    it replaces the session's stale exercises that were never served.
+    """
+    rows = [
+        (session_id, e["kind"], e["prompt"], e["answer"], e.get("hint"), datetime.utcnow())
+        for e in exercises
+    ]
+    with get_connection() as conn:
+        current = conn.execute(
+            "SELECT COUNT(*) FROM vocabulary WHERE session_id = ?", (session_id,)
+        ).fetchone()[0]
+        stale = int(current != vocab_size)
+        if not stale:
+            conn.execute(
+                "DELETE FROM exercises WHERE session_id = ? AND stale = 1 AND served_count = 0",
+                (session_id,),
+            )
+        conn.executemany(
+            "INSERT INTO exercises (session_id, kind, prompt, answer, hint, created_at, stale) "
+            f"VALUES (?, ?, ?, ?, ?, ?, {stale})",
+            rows,
+        )
+    return len(rows)
+
+
+@_writes("exercises")
+def next_exercise(session_id: int, ttl_days: float = 7) -> sqlite3.Row | None:
+    """Take the next exercise for the session and mark it used.
+
+    Fresh exercises come before stale ones, and unserved ones before
+    repeats; repeats go least recently used first.
+    """
+    now = datetime.utcnow()
+    with get_connection() as conn:
+        row = conn.execute(
+            """SELECT * FROM exercises
+               WHERE session_id = ? AND created_at >= ?
+               ORDER BY stale, served_count > 0, last_used, id LIMIT 1""",
+            (session_id, to_epoch_ms(now) - int(ttl_days * MS_PER_DAY)),
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE exercises SET served_count = served_count + 1, last_used = ? WHERE id = ?",
+                (now, row["id"]),
+            )
+        return row
+
+
+@_writes("exercises")
+def record_exercise_result(exercise_id: int, correct: bool) -> None:
+    with get_connection() as conn:
+        conn.execute(
+            "UPDATE exercises SET correct_count = correct_count + ? WHERE id = ?",
+            (int(correct), exercise_id),
+        )
+
+
+def count_pending_exercises(session_id: int) -> int:
+    """Fresh exercises of the session that have not been served yet."""
+    with get_connection() as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM exercises WHERE session_id = ? AND stale = 0 AND served_count = 0",
+            (session_id,),
+        ).fetchone()[0]
+
+
+@_writes("exercises")
+def invalidate_exercises(session_id: int) -> int:
+    """Mark the session's exercises stale after its vocabulary changed."""
+    with get_connection() as conn:
+        return conn.execute(
+            "UPDATE exercises SET stale = 1 WHERE session_id = ? AND stale = 0", (session_id,)
+        ).rowcount
+
+
+@_writes("exercises")
+def evict_exercises(ttl_days: float = 7, max_rows: int = 500) -> int:
+    """Drop exercises older than ttl_days, then the least recently used beyond max_rows."""
+    cutoff = to_epoch_ms(datetime.utcnow()) - int(ttl_days * MS_PER_DAY)
+    with get_connection() as conn:
+        removed = conn.execute("DELETE FROM exercises WHERE created_at < ?", (cutoff,)).rowcount
+        removed += conn.execute(
+            """DELETE FROM exercises WHERE id IN (
+                   SELECT id FROM exercises
+                   ORDER BY COALESCE(last_used, created_at) DESC, id DESC
+                   LIMIT -1 OFFSET ?)""",
+            (max_rows,),
+        ).rowcount
+        return removed
 
 
+@_writes("goals")
 def save_goals(goals: list[str], session_id: int) -> None:
     if not goals:
         return
-    now = datetime.utcnow().isoformat()
+    now = datetime.utcnow()
     with get_connection() as conn:
         conn.execute("DELETE FROM goals WHERE session_id = ?", (session_id,))
         conn.executemany(
@@ -140,6 +959,7 @@ def save_goals(goals: list[str], session_id: int) -> None:
         )
 
 
+@_reads("goals")
 def get_goals(session_id: int) -> list[str]:
     with get_connection() as conn:
         rows = conn.execute(
@@ -148,14 +968,16 @@ def get_goals(session_id: int) -> list[str]:
         return [r["goal_text"] for r in rows]
 
 
+@_writes("goals")
 def add_goal(goal_text: str, session_id: int) -> None:
     with get_connection() as conn:
         conn.execute(
             "INSERT INTO goals (goal_text, created_at, session_id) VALUES (?, ?, ?)",
-            (goal_text, datetime.utcnow().isoformat(), session_id),
+            (goal_text, datetime.utcnow(), session_id),
         )
 
 
+@_writes("goals")
 def delete_goal(goal_text: str, session_id: int) -> None:
     with get_connection() as conn:
         conn.execute(
@@ -164,14 +986,290 @@ def delete_goal(goal_text: str, session_id: int) -> None:
         )
 
 
-def get_messages(session_id: int) -> list[sqlite3.Row]:
+@_writes("outbox")
+def enqueue_turn(session_id: int, message_id: int, context: str = "") -> int:
+    """Queue a learner message for a reply; context is the learner context to send with it."""
     with get_connection() as conn:
         return conn.execute(
-            "SELECT * FROM messages WHERE session_id = ? ORDER BY id ASC",
-            (session_id,),
+            "INSERT INTO outbox (session_id, message_id, context, created_at) VALUES (?, ?, ?, ?)",
+            (session_id, message_id, context, datetime.utcnow()),
+        ).lastrowid
+
+
+def get_outbox() -> list[sqlite3.Row]:
+    """Messages still waiting for a reply, oldest first, each with its parent_id (message_exists 0 if gone)."""
+    with get_connection() as conn:
+        return conn.execute(
+            """SELECT o.*, m.parent_id, m.id IS NOT NULL AS message_exists
+               FROM outbox o LEFT JOIN messages m ON m.id = o.message_id
+               ORDER BY o.id"""
         ).fetchall()
 
 
+@_writes("outbox")
+def defer_turns(outbox_ids: list[int], error: str) -> None:
+    """Record a failed attempt; the turns stay queued."""
+    with get_connection() as conn:
+        conn.executemany(
+            "UPDATE outbox SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+            [(error, i) for i in outbox_ids],
+        )
+
+
+@_writes("outbox")
+def drop_turns(outbox_ids: list[int]) -> None:
+    with get_connection() as conn:
+        conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in outbox_ids])
+
+
+@_writes("messages", "sessions", "outbox")
+def attach_reply(message_id: int, content: str, outbox_ids: list[int]) -> int | None:
+    """Store content as the reply to message_id and take outbox_ids off the queue, in one transaction.
+
+    Returns None, changing nothing, if message_id has had a message put
+    under it in the meantime: the reply no longer answers the end of the
+    conversation. The session head moves to the reply only if it was on
+    message_id, so a learner who switched branches stays where they are.
+    """
+    with get_connection() as conn:
+        if conn.execute("SELECT 1 FROM messages WHERE parent_id = ? LIMIT 1", (message_id,)).fetchone():
+            return None
+        session_id = conn.execute("SELECT session_id FROM messages WHERE id = ?", (message_id,)).fetchone()[0]
+        reply_id = conn.execute(
+            "INSERT INTO messages (session_id, role, content, timestamp, parent_id) "
+            "VALUES (?, 'assistant', ?, ?, ?)",
+            (session_id, content, datetime.utcnow(), message_id),
+        ).lastrowid
+        conn.execute(
+            """UPDATE sessions SET total_messages = total_messages + 1,
+                   head_id = CASE WHEN head_id = ? THEN ? ELSE head_id END
+               WHERE id = ?""",
+            (message_id, reply_id, session_id),
+        )
+        conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in outbox_ids])
+        return reply_id
+
+
+# Message rows carry their position among alternatives (edits of the same
+# turn), so the chat can show a branch switcher on them
+_MESSAGE_COLUMNS = """
+    m.*,
+    (SELECT COUNT(*) FROM messages s
+     WHERE s.parent_id IS m.parent_id AND s.session_id = m.session_id) AS siblings,
+    (SELECT COUNT(*) FROM messages s
+     WHERE s.parent_id IS m.parent_id AND s.session_id = m.session_id AND s.id < m.id) AS sibling_index
+"""
+
+# Walks parent links up from :start for at most :limit messages. A child's
+# id is always above its parent's, so ORDER BY id is path order.
+_WALK_UP = f"""
+    WITH RECURSIVE up(id, n) AS (
+        SELECT :start, 1
+        UNION ALL
+        SELECT p.parent_id, up.n + 1 FROM messages p JOIN up ON p.id = up.id
+        WHERE p.parent_id IS NOT NULL AND p.id > :stop AND (up.n < :limit OR :limit < 0)
+    )
+    SELECT {_MESSAGE_COLUMNS} FROM up JOIN messages m ON m.id = up.id
+    WHERE m.id > :stop ORDER BY m.id
+"""
+
+
+def _session_path(rows: list, head_id: int | None) -> list[dict]:
+    """The branch of rows (a whole session, any order) ending at head_id, oldest first."""
+    by_id = {r["id"]: dict(r) for r in rows}
+    if not by_id:
+        return []
+    siblings: dict[int | None, list[int]] = {}
+    for message_id in sorted(by_id):
+        siblings.setdefault(by_id[message_id]["parent_id"], []).append(message_id)
+    path = []
+    message = by_id.get(head_id if head_id in by_id else max(by_id))
+    while message is not None:
+        group = siblings[message["parent_id"]]
+        message["siblings"], message["sibling_index"] = len(group), group.index(message["id"])
+        path.append(message)
+        message = by_id.get(message["parent_id"])
+    return path[::-1]
+
+
+def _archived_rows(conn: sqlite3.Connection, session_id: int) -> list | None:
+    """Every message of an archived session, plus any added since it was resumed."""
+    archived = load_archived_session(conn, session_id)
+    if archived is None:
+        return None
+    hot = conn.execute("SELECT * FROM messages WHERE session_id = ?", (session_id,)).fetchall()
+    return archived["messages"] + hot
+
+
+def _archived_path(conn: sqlite3.Connection, session_id: int) -> list[dict] | None:
+    """Active branch of an archived session."""
+    rows = _archived_rows(conn, session_id)
+    if rows is None:
+        return None
+    return _session_path(rows, get_session_head(session_id, conn))
+
+
+def get_session_head(session_id: int, conn: sqlite3.Connection | None = None) -> int | None:
+    """Last message of the session's active branch."""
+    if conn is None:
+        with get_connection() as conn:
+            return get_session_head(session_id, conn)
+    row = conn.execute("SELECT head_id FROM sessions WHERE id = ?", (session_id,)).fetchone()
+    return row["head_id"] if row else None
+
+
+@_writes("sessions")
+def set_session_head(session_id: int, message_id: int) -> None:
+    with get_connection() as conn:
+        conn.execute("UPDATE sessions SET head_id = ? WHERE id = ?", (message_id, session_id))
+
+
+def get_messages(session_id: int) -> list[sqlite3.Row | dict]:
+    """The session's active branch, oldest first, including any archived messages."""
+    with get_connection() as conn:
+        archived = _archived_path(conn, session_id)
+        if archived is not None:
+            return archived
+        head = get_session_head(session_id, conn)
+        if head is None:
+            return []
+        return conn.execute(_WALK_UP, {"start": head, "stop": 0, "limit": -1}).fetchall()
+
+
+def get_branch_path(message_id: int, limit: int = 50) -> list[sqlite3.Row]:
+    """message_id and up to limit - 1 messages before it on its own branch, oldest first."""
+    with get_connection() as conn:
+        return conn.execute(_WALK_UP, {"start": message_id, "stop": 0, "limit": limit}).fetchall()
+
+
+def get_messages_page(session_id: int, before_id: int | None = None,
+                      after_id: int | None = None, limit: int = 50) -> list[sqlite3.Row | dict]:
+    """Up to `limit` messages of the active branch next to before_id/after_id, oldest first.
+
+    With neither bound this is the newest page. Pages before a message walk
+    up its parent links, one primary-key lookup per row; pages after one
+    walk up from the head until they reach it. Archived sessions are paged
+    in memory.
+    """
+    with get_connection() as conn:
+        archived = _archived_path(conn, session_id)
+        if archived is not None:
+            if after_id is not None:
+                return [r for r in archived if r["id"] > after_id][:limit]
+            if before_id is not None:
+                archived = [r for r in archived if r["id"] < before_id]
+            return archived[-limit:]
+        head = get_session_head(session_id, conn)
+        if head is None:
+            return []
+        if after_id is not None:
+            rows = conn.execute(_WALK_UP, {"start": head, "stop": after_id, "limit": -1}).fetchall()
+            return rows[:limit]
+        if before_id is not None:
+            parent = conn.execute("SELECT parent_id FROM messages WHERE id = ?", (before_id,)).fetchone()
+            if parent is None or parent["parent_id"] is None:
+                return []
+            head = parent["parent_id"]
+        return conn.execute(_WALK_UP, {"start": head, "stop": 0, "limit": limit}).fetchall()
+
+
+def get_siblings(session_id: int, message_id: int) -> list[int]:
+    """Ids of the alternatives to a message (itself included), oldest first."""
+    with get_connection() as conn:
+        rows = _archived_rows(conn, session_id)
+        if rows is not None:
+            parent = next(r["parent_id"] for r in rows if r["id"] == message_id)
+            return sorted(r["id"] for r in rows if r["parent_id"] == parent)
+        return [r["id"] for r in conn.execute(
+            """SELECT s.id FROM messages m JOIN messages s
+                   ON s.parent_id IS m.parent_id AND s.session_id = m.session_id
+               WHERE m.id = ? ORDER BY s.id""",
+            (message_id,),
+        )]
+
+
+def get_branch_leaf(session_id: int, message_id: int) -> int:
+    """The most recently written message at or below message_id.
+
+    Children always have higher ids than their parents, so the newest
+    message of a subtree is one of its leaves: the end of the branch the
+    learner was last on.
+    """
+    with get_connection() as conn:
+        rows = _archived_rows(conn, session_id)
+        if rows is not None:
+            subtree = {message_id}
+            for r in sorted(rows, key=lambda r: r["id"]):
+                if r["parent_id"] in subtree:
+                    subtree.add(r["id"])
+            return max(subtree)
+        return conn.execute(
+            """WITH RECURSIVE down(id) AS (
+                   SELECT ? UNION ALL
+                   SELECT c.id FROM messages c JOIN down ON c.parent_id = down.id
+               )
+               SELECT MAX(id) FROM down""",
+            (message_id,),
+        ).fetchone()[0]
+
+
+def is_on_active_branch(session_id: int, message_id: int) -> bool:
+    with get_connection() as conn:
+        archived = _archived_path(conn, session_id)
+        if archived is not None:
+            return any(r["id"] == message_id for r in archived)
+        head = get_session_head(session_id, conn)
+        if head is None:
+            return False
+        return conn.execute(
+            f"SELECT 1 FROM ({_WALK_UP}) WHERE id = :target",
+            {"start": head, "stop": message_id - 1, "limit": -1, "target": message_id},
+        ).fetchone() is not None
+
+
+@_reads("messages", "archived_sessions")
+def count_messages(session_id: int, role: str | None = None) -> int:
+    with get_connection() as conn:
+        count = conn.execute(
+            "SELECT COUNT(*) FROM messages WHERE session_id = ? AND (? IS NULL OR role = ?)",
+            (session_id, role, role),
+        ).fetchone()[0]
+        archived = load_archived_session(conn, session_id)
+        if archived is not None:
+            count += sum(1 for m in archived["messages"] if role is None or m["role"] == role)
+        return count
+
+
+@lru_cache(maxsize=8)
+def _archive_dict(dict_id: int, db_path: str) -> bytes:
+    with get_connection() as conn:
+        return conn.execute(
+            "SELECT data FROM archive_dicts WHERE id = ?", (dict_id,)
+        ).fetchone()["data"]
+
+
+def load_archived_session(conn: sqlite3.Connection, session_id: int) -> dict | None:
+    """Decompress an archived session into {"messages": [...], "feedback": [...]}."""
+    row = conn.execute(
+        "SELECT dict_id, payload FROM archived_sessions WHERE session_id = ?",
+        (session_id,),
+    ).fetchone()
+    if row is None:
+        return None
+    inflater = zlib.decompressobj(zdict=_archive_dict(row["dict_id"], str(current_db_path())))
+    archived = json.loads(inflater.decompress(row["payload"]) + inflater.flush())
+    previous = None
+    for message in archived["messages"]:
+        # Blobs written before branching have no parent links: they are one chain
+        message.setdefault("parent_id", previous)
+        previous = message["id"]
+        ts = message["timestamp"]
+        # Blobs written before the epoch-ms migration hold ISO strings
+        message["timestamp"] = from_epoch_ms(ts) if isinstance(ts, int) else datetime.fromisoformat(ts)
+    return archived
+
+
+@_writes("stats")
 def update_stats(session_id: int, accuracy_pct: float, words_learned: int, corrections_count: int) -> None:
     with get_connection() as conn:
         conn.execute(
@@ -181,6 +1279,7 @@ def update_stats(session_id: int, accuracy_pct: float, words_learned: int, corre
         )
 
 
+@_reads("stats")
 def get_stats(session_id: int) -> sqlite3.Row | None:
     with get_connection() as conn:
         return conn.execute(
@@ -188,6 +1287,7 @@ def get_stats(session_id: int) -> sqlite3.Row | None:
         ).fetchone()
 
 
+@_reads("stats", "sessions")
 def get_cumulative_stats() -> dict:
     with get_connection() as conn:
         row = conn.execute(
@@ -202,6 +1302,108 @@ def get_cumulative_stats() -> dict:
         }
 
 
+def get_activity(start: datetime, end: datetime, bucket: str = "day") -> list[dict]:
+    """User-message counts per day or ISO week in [start, end).
+
+    The range predicate runs on idx_messages_ts; buckets are epoch days, and
+    weeks are shifted so they start on Monday (epoch day 0 was a Thursday).
+    """
+    width, shift = {"day": (1, 0), "week": (7, 3)}[bucket]
+    with get_connection() as conn:
+        rows = conn.execute(
+            f"""SELECT (timestamp / {MS_PER_DAY} + {shift}) / {width} AS bucket,
+                       COUNT(*) AS messages
+                FROM messages
+                WHERE timestamp >= ? AND timestamp < ? AND role = 'user'
+                GROUP BY bucket ORDER BY bucket""",
+            (start, end),
+        ).fetchall()
+        return [
+            {"start": from_epoch_ms((r["bucket"] * width - shift) * MS_PER_DAY), "messages": r["messages"]}
+            for r in rows
+        ]
+
+
+def _rebuild_daily_rollups(conn: sqlite3.Connection) -> None:
+    """Seed daily_rollups from existing history (one-off, set-based).
+
+    Past level changes were never recorded, so each day just takes the level
+    of the latest session active that day.
+    """
+    day = f"timestamp / {MS_PER_DAY}"
+    conn.execute("DELETE FROM daily_rollups")
+    conn.execute(f"""
+        INSERT INTO daily_rollups (day, user_messages, level)
+        SELECT d, n, (SELECT level FROM sessions WHERE id = last_session)
+        FROM (
+            SELECT {day} AS d, COUNT(*) AS n, MAX(session_id) AS last_session
+            FROM messages WHERE role = 'user' GROUP BY d
+        )
+    """)
+    conn.execute(f"""
+        INSERT INTO daily_rollups (day, corrections)
+        SELECT m.{day} AS d, COUNT(*) FROM feedback f JOIN messages m ON m.id = f.message_id
+        WHERE f.correction IS NOT NULL AND f.correction != '' GROUP BY d
+        ON CONFLICT(day) DO UPDATE SET corrections = excluded.corrections
+    """)
+    conn.execute(f"""
+        INSERT INTO daily_rollups (day, new_words)
+        SELECT first_seen / {MS_PER_DAY} AS d, COUNT(*) FROM vocabulary GROUP BY d
+        ON CONFLICT(day) DO UPDATE SET new_words = excluded.new_words
+    """)
+
+
+@_writes("daily_rollups")
+def record_daily_rollup(level: str, corrected: bool, new_words: int, when: datetime | None = None) -> None:
+    """Fold one tutor turn into today's rollup row."""
+    day = to_epoch_ms(when or datetime.utcnow()) // MS_PER_DAY
+    with get_connection() as conn:
+        conn.execute(
+            """INSERT INTO daily_rollups (day, user_messages, corrections, new_words, level, level_changes)
+               VALUES (:day, 1, :corrected, :new_words, :level,
+                       COALESCE((SELECT level FROM daily_rollups WHERE day < :day
+                                 AND level IS NOT NULL ORDER BY day DESC LIMIT 1), :level) != :level)
+               ON CONFLICT(day) DO UPDATE SET
+                   user_messages = user_messages + 1,
+                   corrections = corrections + excluded.corrections,
+                   new_words = new_words + excluded.new_words,
+                   level_changes = level_changes + (COALESCE(level, excluded.level) != excluded.level),
+                   level = excluded.level""",
+            {"day": day, "corrected": int(corrected), "new_words": new_words, "level": level},
+        )
+
+
+def get_daily_rollups(since_day: int = 0) -> list[sqlite3.Row]:
+    with get_connection() as conn:
+        return conn.execute(
+            "SELECT * FROM daily_rollups WHERE day >= ? ORDER BY day ASC", (since_day,)
+        ).fetchall()
+
+
+@_writes("api_metrics")
+def save_api_metrics(metrics: dict) -> None:
+    """Append one API call record (the table is never updated in place)."""
+    columns = ", ".join(metrics)
+    placeholders = ", ".join(f":{k}" for k in metrics)
+    with get_connection() as conn:
+        conn.execute(f"INSERT INTO api_metrics ({columns}) VALUES ({placeholders})", metrics)
+
+
+def get_api_metrics(since: datetime) -> list[sqlite3.Row]:
+    with get_connection() as conn:
+        return conn.execute(
+            "SELECT * FROM api_metrics WHERE started_at >= ? ORDER BY started_at ASC", (since,)
+        ).fetchall()
+
+
+def get_recent_api_metrics(limit: int = 100) -> list[sqlite3.Row]:
+    with get_connection() as conn:
+        return conn.execute(
+            "SELECT * FROM api_metrics ORDER BY id DESC LIMIT ?", (limit,)
+        ).fetchall()
+
+
+@_writes("sessions")
 def update_session_level(session_id: int, level: str) -> None:
     with get_connection() as conn:
         conn.execute(
@@ -210,6 +1412,7 @@ def update_session_level(session_id: int, level: str) -> None:
         )
 
 
+@_reads("sessions")
 def get_session_level(session_id: int) -> str:
     with get_connection() as conn:
         row = conn.execute(
@@ -218,10 +1421,11 @@ def get_session_level(session_id: int) -> str:
         return row["level"] if row else "beginner"
 
 
+@_reads("vocabulary")
 def get_vocabulary(session_id: int) -> list[str]:
     with get_connection() as conn:
         rows = conn.execute(
-            "SELECT word FROM vocabulary WHERE session_id = ?", (session_id,)
+            "SELECT word FROM vocabulary WHERE session_id = ? ORDER BY id", (session_id,)
         ).fetchall()
         return [r["word"] for r in rows]
 
@@ -0,0 +1,153 @@
+"""Learner profiles: one SQLite database (shard) per learner.
+
+Lab machines are shared, so every learner gets their own tutor.db (and
+mistake memory) under learners/<id>/ in DATA_DIR. A small registry,
+profiles.db, maps profile names to shard directories. use_profile()
+points db.database at a learner's shard, so sessions, "resume last
+session" and cumulative stats only ever see that learner's rows, and
+per-learner queries cost the same however many students use the machine.
+A database from before profiles stays where it is and is registered as
+the first profile.
+
+teacher_report() reads every shard in a thread pool; SQLite releases the
+GIL while a query runs, so the shards are scanned in parallel. The full
+per-learner HTML reports are db.report's.
+
+    python -m db.profiles list
+    python -m db.profiles add "Ana Pop"
+    python -m db.profiles report [--html reports/]
+"""
+import argparse
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from db import database
+
+REGISTRY_NAME = "profiles.db"
+SHARDS_DIR = "learners"
+LEGACY_PROFILE = "Implicit"
+REPORT_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def _registry() -> sqlite3.Connection:
+    database.DATA_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(database.DATA_DIR / REGISTRY_NAME), detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.row_factory = sqlite3.Row
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS profiles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+            shard TEXT NOT NULL,
+            created_at EPOCHMS INTEGER NOT NULL,
+            last_used EPOCHMS INTEGER
+        )
+    """)
+    if conn.execute("SELECT 1 FROM profiles LIMIT 1").fetchone() is None \
+            and (database.DATA_DIR / "tutor.db").exists():
+        # The pre-profiles database, shard "" being DATA_DIR itself
+        conn.execute(
+            "INSERT INTO profiles (name, shard, created_at) VALUES (?, '', ?)",
+            (LEGACY_PROFILE, datetime.utcnow()),
+        )
+        conn.commit()
+    return conn
+
+
+def list_profiles() -> list[sqlite3.Row]:
+    """All profiles, most recently used first."""
+    with _registry() as conn:
+        return conn.execute(
+            "SELECT * FROM profiles ORDER BY last_used IS NULL, last_used DESC, name"
+        ).fetchall()
+
+
+def get_profile(name: str) -> sqlite3.Row | None:
+    with _registry() as conn:
+        return conn.execute("SELECT * FROM profiles WHERE name = ?", (name.strip(),)).fetchone()
+
+
+def create_profile(name: str) -> sqlite3.Row:
+    name = name.strip()
+    if not name:
+        raise ValueError("profile name is empty")
+    with _registry() as conn:
+        try:
+            profile_id = conn.execute(
+                "INSERT INTO profiles (name, shard, created_at) VALUES (?, '', ?)",
+                (name, datetime.utcnow()),
+            ).lastrowid
+        except sqlite3.IntegrityError:
+            raise ValueError(f"profile {name!r} already exists") from None
+        conn.execute("UPDATE profiles SET shard = ? WHERE id = ?", (f"{SHARDS_DIR}/{profile_id}", profile_id))
+        return conn.execute("SELECT * FROM profiles WHERE id = ?", (profile_id,)).fetchone()
+
+
+def shard_path(profile) -> Path:
+    return database.DATA_DIR / profile["shard"] / "tutor.db"
+
+
+def use_profile(profile) -> None:
+    """Make profile's shard the database for the rest of the process (created if new)."""
+    path = shard_path(profile)
+    database.DB_DIR = path.parent
+    database.DB_PATH = path
+    database.init_db()
+    with _registry() as conn:
+        conn.execute("UPDATE profiles SET last_used = ? WHERE id = ?", (datetime.utcnow(), profile["id"]))
+
+
+def _profile_summary(profile) -> dict:
+    summary = {"profile": profile["name"], "last_used": profile["last_used"]}
+    path = shard_path(profile)
+    if not path.exists():
+        return summary | {"total_sessions": 0}
+    try:
+        with database.shard(path):
+            summary |= database.get_cumulative_stats()
+            summary["top_errors"] = database.get_error_profile(limit=3)
+            last = database.get_last_session()
+            summary["level"] = last["level"] if last else None
+    except sqlite3.Error as exc:  # e.g. a shard last opened by an older version
+        summary["error"] = str(exc)
+    return summary
+
+
+def teacher_report(profiles=None, workers: int = REPORT_WORKERS) -> list[dict]:
+    """Progress summary of every learner (or of profiles), in list_profiles() order."""
+    profiles = list_profiles() if profiles is None else profiles
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(_profile_summary, profiles))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage learner profiles.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="list profiles")
+    add = sub.add_parser("add", help="create a profile")
+    add.add_argument("name")
+    report = sub.add_parser("report", help="progress summary of every learner")
+    report.add_argument("--workers", type=int, default=REPORT_WORKERS)
+    report.add_argument("--html", type=Path, metavar="DIR",
+                        help="also write every learner's full history as an HTML page into DIR")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for profile in list_profiles():
+            print(f"{profile['name']}\t{shard_path(profile)}")
+    elif args.command == "add":
+        print(shard_path(create_profile(args.name)))
+    elif args.html:
+        from db.report import render_reports
+
+        summaries = render_reports(args.html, workers=args.workers)
+        print(json.dumps(summaries, indent=2, default=str, ensure_ascii=False))
+    else:
+        print(json.dumps(teacher_report(workers=args.workers), indent=2, default=str, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""Teacher reports: one HTML page per learner, streamed to disk.
+
+A report lists the learner's sessions with their accuracy (the trend),
+every correction with the sentence it corrected, and the words learned.
+Each section is a generator over a cursor that is written to the file row
+by row, so nothing but the current row is held in memory and a multi-year
+history renders in the same memory as a week's. Archived sessions are
+decompressed one at a time and merged into the stream in session order.
+
+render_reports() renders the learners in a process pool: escaping and
+formatting the rows is Python work that threads would serialise on the
+GIL. Every process reads its own shards.
+
+    python -m db.profiles report --html reports/
+"""
+import heapq
+import sqlite3
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from html import escape
+from pathlib import Path
+
+from db import database
+from db.database import _CORRECTION_COLUMNS, from_epoch_ms, load_archived_session
+
+STYLE = """
+body { font-family: "Noto Serif", Georgia, serif; margin: 2em auto; max-width: 60em; color: #1e1e2e; }
+h1, h2 { color: #4c3a80; }
+table { border-collapse: collapse; width: 100%; margin-bottom: 2em; }
+th, td { border-bottom: 1px solid #ddd; padding: 4px 8px; text-align: left; vertical-align: top; }
+th { background: #f3f0fa; }
+.bar { display: inline-block; height: 0.8em; background: #7c5cbf; }
+.said { color: #b91c1c; }
+.muted { color: #888; }
+"""
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True,
+                           detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def iter_sessions(conn: sqlite3.Connection) -> Iterator[sqlite3.Row]:
+    """Every session with its stats, oldest first."""
+    yield from conn.execute(
+        """SELECT s.id, s.created_at, s.level, s.total_messages,
+                  st.accuracy_pct, st.words_learned, st.corrections_count
+           FROM sessions s LEFT JOIN stats st ON st.session_id = s.id
+           ORDER BY s.id"""
+    )
+
+
+def _archived_corrections(conn: sqlite3.Connection) -> Iterator[dict]:
+    for (session_id,) in conn.execute("SELECT session_id FROM archived_sessions ORDER BY session_id"):
+        archived = load_archived_session(conn, session_id)
+        messages = {m["id"]: m for m in archived["messages"]}
+        for f in archived["feedback"]:
+            if not f["correction"]:
+                continue
+            reply = messages.get(f["message_id"], {})
+            said = messages.get(reply.get("parent_id"), {})
+            yield {"session_id": session_id, "id": f["id"], "correction": f["correction"], "tip": f["tip"],
+                   "timestamp": reply.get("timestamp"),
+                   "learner_text": said.get("content") if said.get("role") == "user" else None}
+
+
+def iter_corrections(conn: sqlite3.Connection) -> Iterator[sqlite3.Row | dict]:
+    """Every correction with the learner message it answered, by session, oldest first."""
+    hot = conn.execute(
+        f"""SELECT m.session_id, {_CORRECTION_COLUMNS}
+            FROM feedback f JOIN messages m ON m.id = f.message_id
+            WHERE f.correction IS NOT NULL AND f.correction != ''
+            ORDER BY m.session_id, f.id"""
+    )
+    # Both cursors step side by side; each side is already in (session, id) order
+    yield from heapq.merge(hot, _archived_corrections(conn), key=lambda r: (r["session_id"], r["id"]))
+
+
+def iter_vocabulary(conn: sqlite3.Connection) -> Iterator[tuple[str, datetime]]:
+    """Every word learned, alphabetically, with the day it was first seen."""
+    # Grouped on idx_vocab_word_session, so the rows stream without a sort
+    for row in conn.execute("SELECT word, MIN(first_seen) AS first_seen FROM vocabulary GROUP BY word"):
+        yield row["word"], from_epoch_ms(row["first_seen"])
+
+
+def _day(value: datetime | None) -> str:
+    return value.strftime("%Y-%m-%d") if value else ""
+
+
+def _session_rows(sessions: Iterator[sqlite3.Row], counts: dict) -> Iterator[str]:
+    for s in sessions:
+        counts["sessions"] += 1
+        accuracy = s["accuracy_pct"] or 0.0
+        yield (f"<tr><td>#{s['id']}</td><td>{_day(s['created_at'])}</td><td>{escape(s['level'] or '')}</td>"
+               f"<td>{s['total_messages']}</td><td>{s['corrections_count'] or 0}</td>"
+               f"<td>{s['words_learned'] or 0}</td>"
+               f"<td><span class=\"bar\" style=\"width:{accuracy:.0f}px\"></span> {accuracy:.0f}%</td></tr>\n")
+
+
+def _correction_rows(corrections: Iterator, counts: dict) -> Iterator[str]:
+    for c in corrections:
+        counts["corrections"] += 1
+        said = escape(c["learner_text"]) if c["learner_text"] else '<span class="muted">—</span>'
+        yield (f"<tr><td>#{c['session_id']}</td><td>{_day(c['timestamp'])}</td>"
+               f"<td class=\"said\">{said}</td><td>{escape(c['correction'])}</td>"
+               f"<td>{escape(c['tip'] or '')}</td></tr>\n")
+
+
+def _word_rows(words: Iterator[tuple[str, datetime]], counts: dict) -> Iterator[str]:
+    for word, first_seen in words:
+        counts["words"] += 1
+        yield f"<tr><td>{escape(word)}</td><td>{_day(first_seen)}</td></tr>\n"
+
+
+def write_report(summary: dict, db_path: Path, out: Path) -> dict:
+    """Stream the learner at db_path's report to out; returns the rows written per section."""
+    from core.mistakes import LABELS
+
+    counts = {"sessions": 0, "corrections": 0, "words": 0}
+    conn = _connect(db_path)
+    try:
+        with database.shard(db_path), open(out, "w", encoding="utf-8") as f:
+            name = escape(summary["profile"])
+            f.write(f"<!DOCTYPE html>\n<html lang=\"ro\"><head><meta charset=\"utf-8\">"
+                    f"<title>{name} — raport</title><style>{STYLE}</style></head><body>\n")
+            f.write(f"<h1>{name}</h1>\n<p>Nivel: <b>{escape(summary.get('level') or '—')}</b> · "
+                    f"acuratețe medie {summary.get('avg_accuracy', 0):.0f}% · "
+                    f"generat {datetime.now():%Y-%m-%d %H:%M}</p>\n")
+            if summary.get("top_errors"):
+                errors = ", ".join(f"{escape(LABELS.get(c, c))} ({n})" for c, n in summary["top_errors"])
+                f.write(f"<p>Greșeli frecvente: {errors}</p>\n")
+
+            f.write("<h2>Sesiuni</h2>\n<table><tr><th>Sesiune</th><th>Data</th><th>Nivel</th><th>Mesaje</th>"
+                    "<th>Corecturi</th><th>Cuvinte</th><th>Acuratețe</th></tr>\n")
+            f.writelines(_session_rows(iter_sessions(conn), counts))
+            f.write("</table>\n<h2>Corecturi</h2>\n<table><tr><th>Sesiune</th><th>Data</th><th>A scris</th>"
+                    "<th>Corectură</th><th>Sfat</th></tr>\n")
+            f.writelines(_correction_rows(iter_corrections(conn), counts))
+            f.write("</table>\n<h2>Vocabular</h2>\n<table><tr><th>Cuvânt</th><th>Prima dată</th></tr>\n")
+            f.writelines(_word_rows(iter_vocabulary(conn), counts))
+            f.write("</table>\n</body></html>\n")
+    finally:
+        conn.close()
+    return counts
+
+
+def _render_learner(profile: dict, out_dir: Path) -> dict:
+    from db.profiles import _profile_summary, shard_path
+
+    summary = _profile_summary(profile)
+    path = shard_path(profile)
+    if not path.exists() or "error" in summary:
+        return summary
+    out = out_dir / f"learner-{profile['id']}.html"
+    try:
+        summary["written"] = write_report(summary, path, out)
+    except sqlite3.Error as exc:  # e.g. a shard last opened by an older version
+        summary["error"] = str(exc)
+        return summary
+    summary["report"] = out.name
+    return summary
+
+
+def _write_index(out_dir: Path, summaries: list[dict]) -> None:
+    with open(out_dir / "index.html", "w", encoding="utf-8") as f:
+        f.write(f"<!DOCTYPE html>\n<html lang=\"ro\"><head><meta charset=\"utf-8\"><title>Rapoarte</title>"
+                f"<style>{STYLE}</style></head><body>\n<h1>Rapoarte</h1>\n<table><tr><th>Elev</th>"
+                "<th>Sesiuni</th><th>Corecturi</th><th>Cuvinte</th><th>Acuratețe medie</th></tr>\n")
+        for s in summaries:
+            name = escape(s["profile"])
+            link = f"<a href=\"{s['report']}\">{name}</a>" if "report" in s else name
+            f.write(f"<tr><td>{link}</td><td>{s.get('total_sessions', 0)}</td>"
+                    f"<td>{s.get('total_corrections', 0)}</td><td>{s.get('total_words', 0)}</td>"
+                    f"<td>{s.get('avg_accuracy', 0):.0f}%</td></tr>\n")
+        f.write("</table>\n</body></html>\n")
+
+
+def render_reports(out_dir: Path, profiles=None, workers: int | None = None) -> list[dict]:
+    """Write every learner's (or profiles') report and an index.html into out_dir; returns their summaries."""
+    from db.profiles import REPORT_WORKERS, list_profiles
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # Rows don't pickle; the worker processes get plain dicts
+    profiles = [dict(p) for p in (list_profiles() if profiles is None else profiles)]
+    with ProcessPoolExecutor(max_workers=max(1, workers or REPORT_WORKERS)) as pool:
+        summaries = list(pool.map(_render_learner, profiles, [out_dir] * len(profiles)))
+    _write_index(out_dir, summaries)
+    return summaries
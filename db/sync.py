@@ -0,0 +1,374 @@
+"""Change-data capture and incremental sync of learner progress to a central server.
+
+Once sync is enabled, triggers on the synced tables append every insert,
+update and delete to `changelog`, with the row as JSON, under a sequence
+number that only ever grows (AUTOINCREMENT: never reused, even after
+pruning). SyncAgent sends the entries logged since the last acknowledged
+one to an HTTP endpoint as gzip-compressed batches, and deletes them once
+the server acknowledges them, so a sync reads and sends only what changed
+however large the database is. Databases where sync was never enabled
+have no triggers and no log.
+
+Deletes made by archival aren't logged: the rows still exist, compressed in
+archived_sessions, and the server keeps its copy.
+
+Protocol: POST <url>, Content-Encoding: gzip, body
+{"source": id, "learner": name, "changes": [[seq, table, op, id, row], ...]}
+with op "I"/"U" (row: the whole row) or "D" (row: null). The server replies
+{"acked": seq}. After a crash a batch may be sent again, so the server
+skips sequence numbers it has already applied; `serve` is a stand-in that
+does so.
+
+    python -m db.sync enable [--learner NAME]
+    python -m db.sync seed                  # log the existing rows, for a first full sync
+    python -m db.sync push http://127.0.0.1:8765/sync
+    python -m db.sync status
+    python -m db.sync serve --port 8765 --db central.db
+"""
+import argparse
+import gzip
+import json
+import logging
+import sqlite3
+import threading
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable
+
+from db import database
+from db.database import get_connection
+
+SYNCED_TABLES = ("sessions", "messages", "feedback", "vocabulary", "goals", "stats")
+BATCH_SIZE = 2000  # changelog entries per request
+TIMEOUT_S = 30
+SYNC_INTERVAL_S = 60.0
+MAX_BACKOFF_S = 900.0
+
+log = logging.getLogger(__name__)
+
+# Archival deletes a session's feedback, then its messages, after writing
+# its archived_sessions row
+_ARCHIVED = {
+    "messages": "EXISTS (SELECT 1 FROM archived_sessions WHERE session_id = old.session_id)",
+    "feedback": "EXISTS (SELECT 1 FROM messages m JOIN archived_sessions a ON a.session_id = m.session_id "
+                "WHERE m.id = old.message_id)",
+}
+
+
+def _row_json(conn: sqlite3.Connection, table: str, ref: str) -> str:
+    columns = [row["name"] for row in conn.execute(f"PRAGMA table_info({table})")]
+    return "json_object(" + ", ".join(f"'{c}', {ref}.{c}" for c in columns) + ")"
+
+
+def is_enabled(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sync_state'"
+    ).fetchone() is not None
+
+
+def enable(learner: str | None = None) -> str:
+    """Start logging changes (or refresh the triggers after a schema change); returns the source id."""
+    with get_connection() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS changelog (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                tbl TEXT NOT NULL,
+                op TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                data TEXT
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                source TEXT NOT NULL,
+                learner TEXT,
+                acked_seq INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute("INSERT OR IGNORE INTO sync_state (id, source) VALUES (1, ?)", (uuid.uuid4().hex,))
+        if learner is not None:
+            conn.execute("UPDATE sync_state SET learner = ?", (learner,))
+        # Recreated every time, so columns added since are captured too
+        for table in SYNCED_TABLES:
+            for suffix in ("ai", "au", "ad"):
+                conn.execute(f"DROP TRIGGER IF EXISTS changelog_{table}_{suffix}")
+            for suffix, event, op in (("ai", "INSERT", "I"), ("au", "UPDATE", "U")):
+                conn.execute(f"""
+                    CREATE TRIGGER changelog_{table}_{suffix} AFTER {event} ON {table} BEGIN
+                        INSERT INTO changelog (tbl, op, row_id, data)
+                        VALUES ('{table}', '{op}', new.id, {_row_json(conn, table, 'new')});
+                    END
+                """)
+            when = f"WHEN NOT {_ARCHIVED[table]}" if table in _ARCHIVED else ""
+            conn.execute(f"""
+                CREATE TRIGGER changelog_{table}_ad AFTER DELETE ON {table} {when} BEGIN
+                    INSERT INTO changelog (tbl, op, row_id) VALUES ('{table}', 'D', old.id);
+                END
+            """)
+        return conn.execute("SELECT source FROM sync_state").fetchone()["source"]
+
+
+def disable() -> None:
+    """Stop logging changes and drop the unsent log."""
+    with get_connection() as conn:
+        for table in SYNCED_TABLES:
+            for suffix in ("ai", "au", "ad"):
+                conn.execute(f"DROP TRIGGER IF EXISTS changelog_{table}_{suffix}")
+        conn.execute("DROP TABLE IF EXISTS changelog")
+        conn.execute("DROP TABLE IF EXISTS sync_state")
+
+
+def seed() -> int:
+    """Log every existing row of the synced tables once; returns the entries added."""
+    with get_connection() as conn:
+        if not is_enabled(conn):
+            raise RuntimeError("sync is not enabled")
+        before = conn.total_changes
+        for table in SYNCED_TABLES:
+            conn.execute(
+                f"INSERT INTO changelog (tbl, op, row_id, data) "
+                f"SELECT '{table}', 'I', id, {_row_json(conn, table, table)} FROM {table} ORDER BY id"
+            )
+        return conn.total_changes - before
+
+
+def pending_batch(conn: sqlite3.Connection, limit: int = BATCH_SIZE) -> tuple[list[list], int]:
+    """The oldest unsent changes, one per row (its latest), and the last sequence number they cover."""
+    rows = conn.execute(
+        "SELECT seq, tbl, op, row_id, data FROM changelog ORDER BY seq LIMIT ?", (limit,)
+    ).fetchall()
+    if not rows:
+        return [], 0
+    latest = {}
+    for row in rows:
+        latest.pop((row["tbl"], row["row_id"]), None)
+        latest[(row["tbl"], row["row_id"])] = row
+    changes = [
+        [r["seq"], r["tbl"], r["op"], r["row_id"], None if r["data"] is None else json.loads(r["data"])]
+        for r in latest.values()
+    ]
+    return changes, rows[-1]["seq"]
+
+
+def _post(url: str, payload: dict, timeout: float = TIMEOUT_S) -> dict:
+    request = urllib.request.Request(
+        url,
+        data=gzip.compress(json.dumps(payload, separators=(",", ":")).encode(), compresslevel=6),
+        headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def _prune(acked: int) -> int:
+    """Drop the entries up to acked, which the server has; returns how many."""
+    with get_connection() as conn:
+        pruned = conn.execute("DELETE FROM changelog WHERE seq <= ?", (acked,)).rowcount
+        conn.execute("UPDATE sync_state SET acked_seq = MAX(acked_seq, ?)", (acked,))
+        return pruned
+
+
+def push(url: str, batch_size: int = BATCH_SIZE, max_batches: int | None = None,
+         prune: Callable[[int], int] = _prune) -> int:
+    """Send the log to url a batch at a time, pruning what is acknowledged; returns entries acknowledged.
+
+    prune(acked) makes the write; SyncAgent has it queued on the app's writer.
+    """
+    sent = 0
+    while max_batches is None or max_batches > 0:
+        with get_connection() as conn:
+            if not is_enabled(conn):
+                return sent
+            state = conn.execute("SELECT source, learner FROM sync_state").fetchone()
+            changes, last_seq = pending_batch(conn, batch_size)
+        if not changes:
+            return sent
+        acked = int(_post(url, {"source": state["source"], "learner": state["learner"], "changes": changes})["acked"])
+        sent += prune(acked)
+        if acked < last_seq:
+            return sent  # the server took part of the batch; the rest goes next time
+        if max_batches is not None:
+            max_batches -= 1
+    return sent
+
+
+def status() -> dict:
+    with get_connection() as conn:
+        if not is_enabled(conn):
+            return {"enabled": False}
+        state = conn.execute("SELECT * FROM sync_state").fetchone()
+        pending = conn.execute("SELECT COUNT(*), MIN(seq), MAX(seq) FROM changelog").fetchone()
+        return {
+            "enabled": True,
+            "source": state["source"],
+            "learner": state["learner"],
+            "acked_seq": state["acked_seq"],
+            "pending": pending[0],
+            "pending_seqs": [pending[1], pending[2]],
+        }
+
+
+class SyncAgent(threading.Thread):
+    """Daemon thread that pushes the change log every interval_s, backing off while the server is unreachable.
+
+    Acknowledged entries are pruned on the query executor's writer, between the app's own writes.
+    """
+
+    def __init__(self, url: str, interval_s: float = SYNC_INTERVAL_S):
+        from core.queries import query_executor
+
+        super().__init__(name="sync-agent", daemon=True)
+        self._queries = query_executor()
+        self._url = url
+        self._interval_s = interval_s
+        self._db_path = database.current_db_path()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wake.set()
+
+    def _prune(self, acked: int) -> int:
+        return self._queries.write(_prune, acked).result()
+
+    def run(self) -> None:
+        delay = self._interval_s
+        while not self._stopped.is_set():
+            self._wake.wait(delay)
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                with database.shard(self._db_path):
+                    push(self._url, prune=self._prune)
+                delay = self._interval_s
+            except Exception as exc:  # noqa: BLE001
+                delay = min(delay * 2, MAX_BACKOFF_S)
+                log.warning("Sync error (next try in %.0fs): %s", delay, exc)
+
+
+class _CentralStore:
+    """The stand-in server's database: the latest copy of every row, per source."""
+
+    def __init__(self, path: Path):
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS sources (
+                source TEXT PRIMARY KEY,
+                learner TEXT,
+                last_seq INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS rows (
+                source TEXT NOT NULL,
+                tbl TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (source, tbl, row_id)
+            );
+        """)
+
+    def apply(self, batch: dict) -> int:
+        source = batch["source"]
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sources (source, learner) VALUES (?, ?) "
+                "ON CONFLICT(source) DO UPDATE SET learner = COALESCE(excluded.learner, learner)",
+                (source, batch.get("learner")),
+            )
+            last_seq = self._conn.execute("SELECT last_seq FROM sources WHERE source = ?", (source,)).fetchone()[0]
+            for seq, table, op, row_id, row in sorted(batch["changes"]):
+                if seq <= last_seq:
+                    continue  # a resent batch
+                if op == "D":
+                    self._conn.execute("DELETE FROM rows WHERE source = ? AND tbl = ? AND row_id = ?",
+                                       (source, table, row_id))
+                else:
+                    self._conn.execute("INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?)",
+                                       (source, table, row_id, json.dumps(row)))
+                last_seq = seq
+            self._conn.execute("UPDATE sources SET last_seq = ? WHERE source = ?", (last_seq, source))
+        return last_seq
+
+
+def make_server(db_path: Path, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """A stand-in for the central endpoint, storing what it receives in db_path (port 0: any free port)."""
+    store = _CentralStore(db_path)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            try:
+                acked = store.apply(json.loads(body))
+            except (ValueError, KeyError, TypeError) as exc:
+                self.send_error(400, str(exc))
+                return
+            reply = json.dumps({"acked": acked}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(reply)))
+            self.end_headers()
+            self.wfile.write(reply)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sync learner progress to a central server.")
+    parser.add_argument("--profile", help="learner profile (default: the database from before profiles)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    enable_cmd = sub.add_parser("enable", help="start logging changes")
+    enable_cmd.add_argument("--learner", help="name the server shows for this database")
+    sub.add_parser("disable", help="stop logging changes and drop the unsent log")
+    sub.add_parser("seed", help="log every existing row, for a first full sync")
+    push_cmd = sub.add_parser("push", help="send the log now")
+    push_cmd.add_argument("url")
+    sub.add_parser("status", help="show the source id and the unsent log")
+    serve = sub.add_parser("serve", help="run a local stand-in server")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--db", type=Path, default=Path("central.db"))
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = make_server(args.db, args.host, args.port)
+        print(f"listening on http://{args.host}:{server.server_port}/sync, storing into {args.db}")
+        server.serve_forever()
+        return
+    if args.profile:
+        from db.profiles import get_profile, use_profile
+
+        profile = get_profile(args.profile)
+        if profile is None:
+            parser.error(f"no profile named {args.profile!r}")
+        use_profile(profile)
+    else:
+        database.init_db()
+    if args.command == "enable":
+        print(enable(args.learner))
+    elif args.command == "disable":
+        disable()
+    elif args.command == "seed":
+        print(seed())
+    elif args.command == "push":
+        print(push(args.url))
+    else:
+        print(json.dumps(status(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""Streaming export and import of learner histories.
+
+Sessions travel with their messages, feedback (and mistake tags),
+vocabulary, goals and stats, in one of two formats:
+
+- jsonl:   a header line, then one JSON object per row with a "table" key;
+           a .gz suffix compresses it
+- columns: a compact binary file of zlib-compressed column blocks, one
+           block per batch of rows from a single table
+
+Both directions are generators over cursors and file lines, so memory
+stays flat however long the history is. Import runs in one transaction
+with executemany batches, and shifts every id past the destination's
+current maximum so histories merge into an existing database.
+
+    python -m db.transfer export history.jsonl.gz [--session 12 --session 14]
+    python -m db.transfer export history.tcol --format columns
+    python -m db.transfer import history.tcol
+"""
+import argparse
+import gzip
+import json
+import sqlite3
+import struct
+import time
+import zlib
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from itertools import groupby
+from pathlib import Path
+
+from db import database
+from db.database import FTS_INDEXES, MS_PER_DAY, get_connection, load_archived_session, to_epoch_ms
+
+FORMAT = "english-tutor-history"
+VERSION = 2  # 2: message trees (messages.parent_id, sessions.head_id)
+COLUMNS_MAGIC = b"TUTORCOL"
+BATCH_SIZE = 20_000
+COMPRESS_LEVEL = 1  # chat text still shrinks ~20x; higher levels mostly cost time
+
+# Exported columns per table, in import (foreign-key) order
+TABLES = {
+    "sessions": ("id", "created_at", "level", "total_messages", "head_id"),
+    "messages": ("id", "session_id", "role", "content", "timestamp", "parent_id"),
+    "feedback": ("id", "message_id", "positive", "correction", "tip"),
+    "feedback_tags": ("feedback_id", "category"),
+    "vocabulary": ("word", "first_seen", "session_id"),
+    "goals": ("goal_text", "created_at", "session_id"),
+    "stats": ("session_id", "accuracy_pct", "words_learned", "corrections_count"),
+}
+# Id columns and the table whose ids they hold; shifted on import
+ID_COLUMNS = {"session_id": "sessions", "message_id": "messages", "feedback_id": "feedback",
+              "parent_id": "messages", "head_id": "messages"}
+REMAPPED = ("sessions", "messages", "feedback")
+
+_SESSION_FILTER = {
+    "sessions": "id IN (SELECT id FROM temp.export_sessions)",
+    "messages": "session_id IN (SELECT id FROM temp.export_sessions)",
+    "feedback": "message_id IN (SELECT id FROM messages WHERE session_id IN "
+                "(SELECT id FROM temp.export_sessions))",
+    "feedback_tags": "feedback_id IN (SELECT f.id FROM feedback f JOIN messages m ON m.id = f.message_id "
+                     "WHERE m.session_id IN (SELECT id FROM temp.export_sessions))",
+    "vocabulary": "session_id IN (SELECT id FROM temp.export_sessions)",
+    "goals": "session_id IN (SELECT id FROM temp.export_sessions)",
+    "stats": "session_id IN (SELECT id FROM temp.export_sessions)",
+}
+
+
+def _raw_connection() -> sqlite3.Connection:
+    # No declared-type converters: timestamps stay epoch-ms integers on the way out
+    return sqlite3.connect(str(database.current_db_path()))
+
+
+def iter_batches(conn: sqlite3.Connection, session_ids: Iterable[int] | None = None,
+                 size: int = BATCH_SIZE) -> Iterator[tuple[str, list[tuple]]]:
+    """Yield (table, rows) batches of every exported row, table by table in TABLES order.
+
+    Archived sessions are decompressed one at a time and their messages and
+    feedback emitted after the hot rows; their feedback tags were dropped
+    when they were archived, so they are re-derived here.
+    """
+    from core.mistakes import classify
+
+    if session_ids is not None:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS export_sessions (id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.export_sessions")
+        conn.executemany("INSERT OR IGNORE INTO temp.export_sessions VALUES (?)", ((i,) for i in session_ids))
+    archived_where = "" if session_ids is None else "WHERE session_id IN (SELECT id FROM temp.export_sessions)"
+    archived_ids = [r[0] for r in conn.execute(f"SELECT session_id FROM archived_sessions {archived_where}")]
+
+    def archived_rows(table: str) -> Iterator[tuple]:
+        conn.row_factory = sqlite3.Row
+        try:
+            for sid in archived_ids:
+                blob = load_archived_session(conn, sid)
+                if table == "messages":
+                    for m in blob["messages"]:
+                        yield (m["id"], m["session_id"], m["role"], m["content"], to_epoch_ms(m["timestamp"]),
+                               m["parent_id"])
+                elif table == "feedback":
+                    for f in blob["feedback"]:
+                        yield f["id"], f["message_id"], f["positive"], f["correction"], f["tip"]
+                elif table == "feedback_tags":
+                    for f in blob["feedback"]:
+                        for category in classify(f["correction"]):
+                            yield f["id"], category
+        finally:
+            conn.row_factory = None
+
+    for table, columns in TABLES.items():
+        where = "" if session_ids is None else f"WHERE {_SESSION_FILTER[table]}"
+        cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {table} {where}")
+        while batch := cursor.fetchmany(size):
+            yield table, batch
+        if archived_ids and table in ("messages", "feedback", "feedback_tags"):
+            yield from _batches(((table, row) for row in archived_rows(table)), size)
+
+
+def _batches(rows: Iterator[tuple[str, tuple]], size: int = BATCH_SIZE) -> Iterator[tuple[str, list[tuple]]]:
+    for table, group in groupby(rows, key=lambda item: item[0]):
+        batch = []
+        for _, row in group:
+            batch.append(row)
+            if len(batch) >= size:
+                yield table, batch
+                batch = []
+        if batch:
+            yield table, batch
+
+
+def _header() -> dict:
+    return {
+        "format": FORMAT,
+        "version": VERSION,
+        "exported_at": to_epoch_ms(datetime.utcnow()),
+        "tables": {table: list(columns) for table, columns in TABLES.items()},
+    }
+
+
+def _open_text(path: Path, mode: str):
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=COMPRESS_LEVEL)
+    return open(path, mode, encoding="utf-8")
+
+
+def _write_jsonl(path: Path, batches: Iterator[tuple[str, list[tuple]]]) -> dict[str, int]:
+    counts = dict.fromkeys(TABLES, 0)
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    with _open_text(path, "w") as f:
+        f.write(dumps(_header()) + "\n")
+        for table, batch in batches:
+            columns = TABLES[table]
+            f.writelines(
+                dumps({"table": table, **dict(zip(columns, row))}) + "\n" for row in batch
+            )
+            counts[table] += len(batch)
+    return counts
+
+
+def _write_frame(f, payload: dict) -> None:
+    data = zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode(), COMPRESS_LEVEL)
+    f.write(struct.pack("<I", len(data)))
+    f.write(data)
+
+
+def _write_columns(path: Path, batches: Iterator[tuple[str, list[tuple]]]) -> dict[str, int]:
+    counts = dict.fromkeys(TABLES, 0)
+    with open(path, "wb") as f:
+        f.write(COLUMNS_MAGIC + struct.pack("<H", VERSION))
+        _write_frame(f, _header())
+        for table, batch in batches:
+            _write_frame(f, {"table": table, "columns": [list(col) for col in zip(*batch)]})
+            counts[table] += len(batch)
+    return counts
+
+
+def export_history(path: Path, fmt: str = "jsonl", session_ids: Iterable[int] | None = None) -> dict[str, int]:
+    """Stream the history (or just session_ids) to path; returns rows written per table."""
+    writer = {"jsonl": _write_jsonl, "columns": _write_columns}[fmt]
+    conn = _raw_connection()
+    try:
+        return writer(Path(path), iter_batches(conn, session_ids))
+    finally:
+        conn.close()
+
+
+def _check_header(header: dict) -> None:
+    if header.get("format") != FORMAT:
+        raise ValueError("not an English Tutor history export")
+    if header.get("version", 0) > VERSION:
+        raise ValueError(f"export version {header['version']} is newer than this app supports")
+
+
+def _read_jsonl(path: Path) -> Iterator[tuple[str, list[tuple]]]:
+    with _open_text(path, "r") as f:
+        _check_header(json.loads(next(f, "{}")))
+        rows = ((obj["table"], obj) for obj in map(json.loads, f))
+        for table, batch in _batches(rows):
+            if table not in TABLES:
+                raise ValueError(f"unknown table in export: {table}")
+            columns = TABLES[table]
+            yield table, [tuple(obj.get(c) for c in columns) for obj in batch]
+
+
+def _read_columns(path: Path) -> Iterator[tuple[str, list[tuple]]]:
+    def frames(f):
+        while prefix := f.read(4):
+            (size,) = struct.unpack("<I", prefix)
+            yield json.loads(zlib.decompress(f.read(size)))
+
+    with open(path, "rb") as f:
+        if f.read(len(COLUMNS_MAGIC)) != COLUMNS_MAGIC:
+            raise ValueError("not an English Tutor history export")
+        f.read(2)
+        blocks = frames(f)
+        header = next(blocks, {})
+        _check_header(header)
+        for block in blocks:
+            table = block["table"]
+            if table not in TABLES:
+                raise ValueError(f"unknown table in export: {table}")
+            # Older exports lack columns added since; those come back as None
+            present = dict(zip(header["tables"][table], block["columns"]))
+            missing = [None] * len(block["columns"][0]) if block["columns"] else []
+            yield table, list(zip(*(present.get(c, missing) for c in TABLES[table])))
+
+
+def read_history(path: Path) -> Iterator[tuple[str, list[tuple]]]:
+    """Yield (table, rows) batches from an export file of either format."""
+    path = Path(path)
+    with open(path, "rb") as f:
+        is_columns = f.read(len(COLUMNS_MAGIC)) == COLUMNS_MAGIC
+    return _read_columns(path) if is_columns else _read_jsonl(path)
+
+
+def _shifter(table: str, offsets: dict[str, int]):
+    """Row transform adding the id offsets to every id column of table."""
+    shifts = [
+        (i, offsets[table] if column == "id" else offsets[ID_COLUMNS[column]])
+        for i, column in enumerate(TABLES[table])
+        if (column == "id" and table in REMAPPED) or column in ID_COLUMNS
+    ]
+    if not any(offset for _, offset in shifts):
+        return None
+
+    def shift(row: tuple) -> tuple:
+        row = list(row)
+        for i, offset in shifts:
+            if row[i] is not None:
+                row[i] += offset
+        return tuple(row)
+    return shift
+
+
+def _link_legacy_sessions(conn: sqlite3.Connection, offsets: dict[str, int]) -> None:
+    """Chain the messages of imported sessions that came without a head (version 1 exports)."""
+    legacy = "SELECT id FROM sessions WHERE id > ? AND head_id IS NULL"
+    conn.execute(f"""
+        UPDATE messages SET parent_id = chain.prev
+        FROM (
+            SELECT id, LAG(id) OVER (PARTITION BY session_id ORDER BY id) AS prev FROM messages
+            WHERE id > ? AND parent_id IS NULL AND session_id IN ({legacy})
+        ) AS chain
+        WHERE chain.id = messages.id AND chain.prev IS NOT NULL
+    """, (offsets["messages"], offsets["sessions"]))
+    conn.execute(f"""
+        UPDATE sessions SET head_id = (SELECT MAX(id) FROM messages WHERE session_id = sessions.id)
+        WHERE id IN ({legacy})
+    """, (offsets["sessions"],))
+
+
+def _merge_rollups(conn: sqlite3.Connection, offsets: dict[str, int]) -> None:
+    """Add the imported rows to daily_rollups (category rollups follow the tags)."""
+    day = f"timestamp / {MS_PER_DAY}"
+    conn.execute(f"""
+        INSERT INTO daily_rollups (day, user_messages, level)
+        SELECT d, n, (SELECT level FROM sessions WHERE id = last_session)
+        FROM (
+            SELECT {day} AS d, COUNT(*) AS n, MAX(session_id) AS last_session
+            FROM messages WHERE role = 'user' AND id > ? GROUP BY d
+        ) WHERE true
+        ON CONFLICT(day) DO UPDATE SET
+            user_messages = user_messages + excluded.user_messages,
+            level = COALESCE(level, excluded.level)
+    """, (offsets["messages"],))
+    conn.execute(f"""
+        INSERT INTO daily_rollups (day, corrections)
+        SELECT m.{day} AS d, COUNT(*) FROM feedback f JOIN messages m ON m.id = f.message_id
+        WHERE f.id > ? AND f.correction IS NOT NULL AND f.correction != '' GROUP BY d
+        ON CONFLICT(day) DO UPDATE SET corrections = corrections + excluded.corrections
+    """, (offsets["feedback"],))
+    conn.execute(f"""
+        INSERT INTO daily_rollups (day, new_words)
+        SELECT first_seen / {MS_PER_DAY} AS d, COUNT(*) FROM vocabulary
+        WHERE session_id > ? GROUP BY d
+        ON CONFLICT(day) DO UPDATE SET new_words = new_words + excluded.new_words
+    """, (offsets["sessions"],))
+
+
+@database._writes(*TABLES, "daily_rollups", "daily_category_rollups")
+def import_history(path: Path) -> dict[str, int]:
+    """Merge an export into the current database; returns rows inserted per table.
+
+    Imported ids are shifted past the highest id sessions, messages and
+    feedback have ever given out (sqlite_sequence), which also covers the
+    rows of archived sessions, so nothing collides and no id map has to be
+    held in memory. Everything happens in one transaction: a bad file leaves the
+    database untouched.
+
+    The per-row search-index triggers are dropped for the duration and the
+    imported range indexed in one statement at the end, which is several
+    times faster than indexing row by row.
+    """
+    counts = dict.fromkeys(TABLES, 0)
+    with get_connection() as conn:
+        # Explicit, so the trigger DDL below rolls back with the rest on failure
+        conn.execute("BEGIN IMMEDIATE")
+        offsets = {
+            table: conn.execute(
+                f"""SELECT MAX((SELECT COALESCE(MAX(id), 0) FROM {table}),
+                               (SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = ?))""",
+                (table,),
+            ).fetchone()[0]
+            for table in REMAPPED
+        }
+        triggers = [row[0] for row in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name IN ({})".format(
+                ", ".join(f"'{name}_fts_ai'" for name in FTS_INDEXES)
+            )
+        )]
+        for name in FTS_INDEXES:
+            conn.execute(f"DROP TRIGGER IF EXISTS {name}_fts_ai")
+
+        for table, rows in read_history(path):
+            shift = _shifter(table, offsets)
+            if shift is not None:
+                rows = [shift(row) for row in rows]
+            if table == "feedback_tags":
+                database._insert_feedback_tags(conn, rows)
+            else:
+                columns = TABLES[table]
+                verb = "INSERT OR IGNORE" if table == "vocabulary" else "INSERT"
+                conn.executemany(
+                    f"{verb} INTO {table} ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' for _ in columns)})",
+                    rows,
+                )
+            counts[table] += len(rows)
+
+        for name, (table, columns) in FTS_INDEXES.items():
+            cols = ", ".join(columns)
+            conn.execute(
+                f"INSERT INTO {name}_fts (rowid, {cols}) SELECT id, {cols} FROM {table} WHERE id > ?",
+                (offsets[table],),
+            )
+        for sql in triggers:
+            conn.execute(sql)
+        _link_legacy_sessions(conn, offsets)
+        _merge_rollups(conn, offsets)
+    return counts
+
+
+def main() -> None:
+    from db.database import init_db
+
+    parser = argparse.ArgumentParser(description="Export or import tutor history.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="write the history to a file")
+    export.add_argument("path", type=Path)
+    export.add_argument("--format", choices=("jsonl", "columns"), default="jsonl")
+    export.add_argument("--session", type=int, action="append", dest="sessions",
+                        help="only this session (repeatable)")
+    imp = sub.add_parser("import", help="merge an exported history into this database")
+    imp.add_argument("path", type=Path)
+    parser.add_argument("--profile", help="learner profile (default: the database from before profiles)")
+    args = parser.parse_args()
+    if args.profile:
+        from db.profiles import get_profile, use_profile
+
+        profile = get_profile(args.profile)
+        if profile is None:
+            parser.error(f"no profile named {args.profile!r}")
+        use_profile(profile)
+
+    init_db()
+    started = time.perf_counter()
+    if args.command == "export":
+        counts = export_history(args.path, args.format, args.sessions)
+    else:
+        counts = import_history(args.path)
+    print(json.dumps({"rows": counts, "seconds": round(time.perf_counter() - started, 2)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,18 @@
+import logging
+import os
 import sys
-from PyQt6.QtWidgets import QApplication, QMessageBox
+from logging.handlers import RotatingFileHandler
+from PyQt6.QtWidgets import QApplication, QMessageBox, QInputDialog
 from PyQt6.QtGui import QFont
 from PyQt6.QtCore import Qt
 
-from db.database import init_db, create_session, get_last_session
+from db import database
+from db.database import create_session, get_last_session
+from db.profiles import create_profile, get_profile, list_profiles, use_profile
+from db.archive import VacuumScheduler
+from db.sync import SyncAgent, enable as enable_sync
+from core.queries import query_executor
+from core.profiling import start_watchdog
 from ui.main_window import MainWindow
 
 APP_STYLE = """
@@ -42,6 +51,13 @@ QInputDialog QLineEdit {
     border-radius: 6px;
     padding: 6px;
 }
+QInputDialog QComboBox {
+    background: #1e1e2e;
+    color: #e8e8f0;
+    border: 1px solid #3a3a5a;
+    border-radius: 6px;
+    padding: 6px;
+}
 QInputDialog QPushButton {
     background: #7c5cbf;
     color: white;
@@ -51,6 +67,51 @@ QInputDialog QPushButton {
 """
 
 
+NEW_PROFILE = "➕ Profil nou…"
+LOG_NAME = "tutor.log"
+
+
+def setup_logging() -> None:
+    """Send background errors to stderr and to tutor.log in the data directory."""
+    database.DATA_DIR.mkdir(parents=True, exist_ok=True)
+    log_file = RotatingFileHandler(database.DATA_DIR / LOG_NAME, maxBytes=1_000_000, backupCount=2,
+                                   encoding="utf-8")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+                        handlers=[logging.StreamHandler(), log_file])
+
+
+def choose_profile():
+    """Ask who is learning; returns the profile, or None if the dialog was cancelled.
+
+    TUTOR_LEARNER skips the question (created if it doesn't exist yet).
+    """
+    preset = os.getenv("TUTOR_LEARNER", "").strip()
+    if preset:
+        return get_profile(preset) or create_profile(preset)
+
+    names = [p["name"] for p in list_profiles()]
+    while True:
+        if names:
+            choice, ok = QInputDialog.getItem(
+                None, "English Tutor — Alex", "Cine învață azi?", names + [NEW_PROFILE], 0, False
+            )
+            if not ok:
+                return None
+            if choice != NEW_PROFILE:
+                return get_profile(choice)
+        name, ok = QInputDialog.getText(None, "English Tutor — Alex", "Numele tău:")
+        if not ok:
+            if names:
+                continue
+            return None
+        try:
+            return create_profile(name)
+        except ValueError:
+            existing = get_profile(name)
+            if existing is not None:
+                return existing
+
+
 def ask_resume(last_session) -> bool:
     """Ask user whether to resume the last session."""
     if last_session is None:
@@ -81,20 +142,33 @@ def ask_resume(last_session) -> bool:
 
 
 def main():
+    setup_logging()
     app = QApplication(sys.argv)
     app.setApplicationName("English Tutor")
     app.setOrganizationName("EnglishTutor")
     app.setStyleSheet(APP_STYLE)
+    watchdog = start_watchdog(app)
 
     # Prefer Noto Serif if available
     font = QFont("Noto Serif", 11)
     font.setStyleHint(QFont.StyleHint.Serif)
     app.setFont(font)
 
-    # Initialize database
-    init_db()
+    # Open (and initialize) this learner's database
+    profile = choose_profile()
+    if profile is None:
+        sys.exit(0)
+    use_profile(profile)
+    queries = query_executor()
+    last_session = queries.read(get_last_session)
+    vacuum = VacuumScheduler()
+    sync_url = os.getenv("TUTOR_SYNC_URL", "").strip()
+    sync = None
+    if sync_url:
+        enable_sync(profile["name"])
+        sync = SyncAgent(sync_url)
 
-    last_session = get_last_session()
+    last_session = last_session.result()
     resume = ask_resume(last_session)
 
     if resume and last_session:
@@ -102,10 +176,22 @@ def main():
     else:
         session_id = create_session()
 
-    window = MainWindow(session_id=session_id, resume=resume)
+    window = MainWindow(session_id=session_id)
+    window.setWindowTitle(f"{window.windowTitle()} — {profile['name']}")
+    # They write on their own connections, so not while an old database is converted
+    window.database_ready.connect(vacuum.start)
+    if sync is not None:
+        window.database_ready.connect(sync.start)
     window.show()
 
-    sys.exit(app.exec())
+    exit_code = app.exec()
+    queries.wait()
+    vacuum.stop()
+    if sync is not None:
+        sync.stop()
+    if watchdog is not None:
+        watchdog.stop()
+    sys.exit(exit_code)
 
 
 if __name__ == "__main__":
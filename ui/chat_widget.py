@@ -1,10 +1,14 @@
+from collections import deque
+
 from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6.QtGui import QFont, QColor
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QScrollArea, QLabel,
-    QTextEdit, QPushButton, QSizePolicy, QFrame,
+    QTextEdit, QPushButton, QFrame,
 )
 
+from ui.rich_text import RichText
+
 ACCENT = "#7c5cbf"
 BG = "#0f0f13"
 USER_BUBBLE = "#3b2d5e"
@@ -12,6 +16,12 @@ ASSISTANT_BUBBLE = "#1e1e2e"
 TEXT_COLOR = "#e8e8f0"
 TYPING_COLOR = "#888"
 
+BRANCH_BUTTON_STYLE = f"""
+    QPushButton {{ background: transparent; color: {TYPING_COLOR}; border: none; padding: 0 4px; }}
+    QPushButton:hover {{ color: {ACCENT}; }}
+    QPushButton:disabled {{ color: #444; }}
+"""
+
 
 class MessageBubble(QFrame):
     def __init__(self, text: str, role: str, parent=None):
@@ -30,23 +40,45 @@ class MessageBubble(QFrame):
             }}
         """)
 
-        label = QLabel(text)
-        label.setWordWrap(True)
-        label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
-        label.setStyleSheet(f"color: {TEXT_COLOR}; padding: 8px 14px; background: transparent;")
-        label.setFont(QFont("Noto Serif", 11))
-        label.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
+        # Alex writes Markdown; the learner's text is shown as typed
+        self.body = RichText(text, TEXT_COLOR, QFont("Noto Serif", 11), markdown=not is_user)
 
         layout = QVBoxLayout(self)
-        layout.setContentsMargins(0, 0, 0, 0)
-        layout.addWidget(label)
+        layout.setContentsMargins(14, 8, 14, 8)
+        layout.addWidget(self.body)
 
 
 class ChatWidget(QWidget):
+    """Chat transcript plus input box.
+
+    With max_bubbles > 0 at most that many rows stay alive: the far end is
+    evicted as rows are added, and older_requested / newer_requested ask
+    the owner for the adjacent page (by message id) when the user scrolls
+    to an edge that has evicted neighbours.
+
+    Learner messages can be edited from their context menu (edit_submitted),
+    and messages with alternatives show a ‹ i/n › switcher
+    (branch_requested with -1/+1); the owner answers with replace_suffix().
+
+    draft_changed reports the input's text as it is typed.
+    """
+
     message_submitted = pyqtSignal(str)
+    draft_changed = pyqtSignal(str)
+    older_requested = pyqtSignal(int)
+    newer_requested = pyqtSignal(int)
+    edit_submitted = pyqtSignal(int, str)
+    branch_requested = pyqtSignal(int, int)
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, max_bubbles: int = 0):
         super().__init__(parent)
+        self._max_bubbles = max_bubbles
+        self._rows: dict[int, QWidget] = {}
+        self._order: deque[tuple[int | None, QWidget]] = deque()
+        self._has_older = False
+        self._has_newer = False
+        self._loading = False
+        self._pinned: tuple[QWidget, int] | None = None
         self._setup_ui()
 
     def _setup_ui(self):
@@ -69,6 +101,8 @@ class ChatWidget(QWidget):
         self._messages_layout.addStretch()
 
         self._scroll.setWidget(self._messages_container)
+        self._scroll.verticalScrollBar().valueChanged.connect(self._on_scrolled)
+        self._scroll.verticalScrollBar().rangeChanged.connect(self._apply_pin)
         layout.addWidget(self._scroll)
 
         # Typing indicator
@@ -99,6 +133,7 @@ class ChatWidget(QWidget):
             }}
         """)
         self._input.installEventFilter(self)
+        self._input.textChanged.connect(lambda: self.draft_changed.emit(self._input.toPlainText()))
 
         send_btn = QPushButton("Send")
         send_btn.setFixedSize(80, 44)
@@ -136,9 +171,8 @@ class ChatWidget(QWidget):
             self._input.clear()
             self.message_submitted.emit(text)
 
-    def add_message(self, text: str, role: str):
-        is_user = role == "user"
-
+    def _make_row(self, text: str, role: str, message_id: int | None = None,
+                  branch: tuple[int, int] = (0, 1)) -> QWidget:
         row = QWidget()
         row.setStyleSheet("background: transparent;")
         row_layout = QHBoxLayout(row)
@@ -146,27 +180,226 @@ class ChatWidget(QWidget):
 
         bubble = MessageBubble(text, role)
         bubble.setMaximumWidth(680)
+        column = QVBoxLayout()
+        column.setSpacing(2)
+        column.addWidget(bubble)
+        if message_id is not None and branch[1] > 1:
+            column.addLayout(self._make_switcher(message_id, *branch))
+        if message_id is not None and role == "user":
+            bubble.body.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+            bubble.body.customContextMenuRequested.connect(
+                lambda pos: self._show_message_menu(bubble.body, pos, message_id, text)
+            )
 
-        if is_user:
+        if role == "user":
             row_layout.addStretch()
-            row_layout.addWidget(bubble)
+            row_layout.addLayout(column)
         else:
-            row_layout.addWidget(bubble)
+            row_layout.addLayout(column)
             row_layout.addStretch()
+        return row
+
+    def _make_switcher(self, message_id: int, index: int, count: int) -> QHBoxLayout:
+        strip = QHBoxLayout()
+        strip.setSpacing(0)
+        strip.addStretch()
+        for label, step in (("‹", -1), (None, 0), ("›", 1)):
+            if label is None:
+                position = QLabel(f"{index + 1}/{count}")
+                position.setStyleSheet(f"color: {TYPING_COLOR}; background: transparent;")
+                position.setFont(QFont("Noto Serif", 9))
+                strip.addWidget(position)
+                continue
+            btn = QPushButton(label)
+            btn.setFont(QFont("Noto Serif", 10))
+            btn.setStyleSheet(BRANCH_BUTTON_STYLE)
+            btn.setEnabled(0 <= index + step < count)
+            btn.clicked.connect(lambda _, s=step: self.branch_requested.emit(message_id, s))
+            strip.addWidget(btn)
+        return strip
+
+    def _show_message_menu(self, body: RichText, pos, message_id: int, text: str):
+        from PyQt6.QtWidgets import QInputDialog
 
-        # Insert before the final stretch
-        count = self._messages_layout.count()
-        self._messages_layout.insertWidget(count - 1, row)
+        menu = body.context_menu()
+        edit = menu.addAction("✏️ Editează și regenerează")
+        edit.setEnabled(self._input.isEnabled())  # not while a reply is pending
+        if menu.exec(body.mapToGlobal(pos)) is not edit:
+            return
+        new_text, ok = QInputDialog.getMultiLineText(
+            self, "Editează mesajul", "Rescrie mesajul; Alex va răspunde din nou:", text
+        )
+        new_text = new_text.strip()
+        if ok and new_text and new_text != text and self._input.isEnabled():
+            self.edit_submitted.emit(message_id, new_text)
+
+    def _insert_row(self, text: str, role: str, message_id: int | None, at_top: bool,
+                    branch: tuple[int, int] = (0, 1)) -> None:
+        row = self._make_row(text, role, message_id, branch)
+        if at_top:
+            self._messages_layout.insertWidget(0, row)
+            self._order.appendleft((message_id, row))
+        else:
+            # Insert before the final stretch
+            self._messages_layout.insertWidget(self._messages_layout.count() - 1, row)
+            self._order.append((message_id, row))
+        if message_id is not None:
+            self._rows[message_id] = row
+
+    def _evict(self, from_top: bool) -> None:
+        while self._max_bubbles and len(self._order) > self._max_bubbles:
+            message_id, row = self._order.popleft() if from_top else self._order.pop()
+            if message_id is not None:
+                self._rows.pop(message_id, None)
+                if from_top:
+                    self._has_older = True
+                else:
+                    self._has_newer = True
+            self._messages_layout.removeWidget(row)
+            row.deleteLater()
+
+    def add_message(self, text: str, role: str, message_id: int | None = None):
+        if self._has_newer:
+            # Scrolled back into history: a live message jumps to the tail
+            self._reset_rows()
+            self._has_older = True
+        self._insert_row(text, role, message_id, at_top=False)
+        self._evict(from_top=True)
         self._scroll_to_bottom()
 
+    def load_page(self, rows, has_older: bool = False, has_newer: bool = False):
+        """Replace the transcript with rows (oldest first) from the database."""
+        self.clear_messages()
+        for row in rows:
+            self._insert_row(row["content"], row["role"], row["id"], at_top=False, branch=_branch(row))
+        self._evict(from_top=True)
+        self._has_older = self._has_older or has_older
+        self._has_newer = has_newer
+        if not has_newer:
+            self._scroll_to_bottom()
+
+    def prepend_page(self, rows):
+        """Rehydrate an older page (oldest first) above the current rows."""
+        self._loading = False
+        if not rows:
+            self._has_older = False
+            return
+        self._pin(self._order[0][1] if self._order else None)
+        for row in reversed(rows):
+            self._insert_row(row["content"], row["role"], row["id"], at_top=True, branch=_branch(row))
+        self._has_older = True
+        self._evict(from_top=False)
+
+    def append_page(self, rows):
+        """Rehydrate a newer page (oldest first) below the current rows."""
+        self._loading = False
+        if not rows:
+            self._has_newer = False
+            return
+        self._pin(self._order[-1][1] if self._order else None)
+        for row in rows:
+            self._insert_row(row["content"], row["role"], row["id"], at_top=False, branch=_branch(row))
+        self._evict(from_top=True)
+
+    def replace_suffix(self, fork_id: int | None, rows, has_newer: bool = False) -> bool:
+        """Show another branch: drop the rows after fork_id and append rows (oldest first).
+
+        The shared prefix up to fork_id stays as it is. fork_id None replaces
+        everything. Returns False if fork_id is not on screen, in which case
+        nothing changed and the caller should load_page() instead.
+        """
+        if fork_id is None:
+            self._reset_rows()
+            self._has_older = False
+        elif fork_id not in self._rows:
+            return False
+        while self._order and self._order[-1][0] != fork_id:
+            message_id, row = self._order.pop()
+            self._rows.pop(message_id, None)
+            self._messages_layout.removeWidget(row)
+            row.deleteLater()
+        for row in rows:
+            self._insert_row(row["content"], row["role"], row["id"], at_top=False, branch=_branch(row))
+        self._evict(from_top=True)
+        self._loading = False
+        self._has_newer = has_newer
+        if not has_newer:
+            self._scroll_to_bottom()
+        return True
+
+    def has_message(self, message_id: int) -> bool:
+        return message_id in self._rows
+
+    def _pin(self, row: QWidget | None):
+        """Keep row where it is on screen while a rehydrated page lays out."""
+        from PyQt6.QtCore import QTimer
+        if row is None:
+            return
+        self._pinned = (row, row.y() - self._scroll.verticalScrollBar().value())
+        self._loading = True
+        # Parented to the row so it dies with it if the chat is cleared first
+        unpin = QTimer(row)
+        unpin.setSingleShot(True)
+        unpin.timeout.connect(self._unpin)
+        unpin.start(100)
+
+    def _apply_pin(self, *_):
+        if self._pinned is not None:
+            row, offset = self._pinned
+            self._scroll.verticalScrollBar().setValue(row.y() - offset)
+
+    def _unpin(self):
+        self._apply_pin()
+        self._pinned = None
+        self._loading = False
+
+    def _on_scrolled(self, value: int):
+        if self._loading or not self._order:
+            return
+        bar = self._scroll.verticalScrollBar()
+        if value == bar.minimum() and self._has_older:
+            first = next((mid for mid, _ in self._order if mid is not None), None)
+            if first is not None:
+                self._loading = True
+                self.older_requested.emit(first)
+        elif value == bar.maximum() and self._has_newer:
+            last = next((mid for mid, _ in reversed(self._order) if mid is not None), None)
+            if last is not None:
+                self._loading = True
+                self.newer_requested.emit(last)
+
+    def scroll_to_message(self, message_id: int):
+        from PyQt6.QtCore import QTimer
+        row = self._rows.get(message_id)
+        if row is None:
+            return
+        row.setStyleSheet("background: #24243a; border-radius: 14px;")
+        # Timers are parented to the row so they die with it if the chat is cleared
+        jump = QTimer(row)
+        jump.setSingleShot(True)
+        jump.timeout.connect(lambda: self._scroll.ensureWidgetVisible(row, 0, 80))
+        jump.start(100)  # after any pending scroll-to-bottom
+        unflash = QTimer(row)
+        unflash.setSingleShot(True)
+        unflash.timeout.connect(lambda: row.setStyleSheet("background: transparent;"))
+        unflash.start(1500)
+
     def _scroll_to_bottom(self):
         from PyQt6.QtCore import QTimer
-        QTimer.singleShot(50, lambda: self._scroll.verticalScrollBar().setValue(
-            self._scroll.verticalScrollBar().maximum()
-        ))
+        # A bound method, so it's dropped if the widget is deleted meanwhile
+        QTimer.singleShot(50, self._scroll_to_end)
+
+    def _scroll_to_end(self):
+        bar = self._scroll.verticalScrollBar()
+        bar.setValue(bar.maximum())
 
     def set_typing(self, visible: bool):
-        if visible:
+        self.set_status("Alex is typing..." if visible else None)
+
+    def set_status(self, text: str | None):
+        """Show text under the transcript in place of the typing indicator; None hides it."""
+        if text:
+            self._typing_label.setText(text)
             self._typing_label.show()
         else:
             self._typing_label.hide()
@@ -175,8 +408,22 @@ class ChatWidget(QWidget):
         self._input.setEnabled(enabled)
 
     def clear_messages(self):
+        self._reset_rows()
+        self._has_older = False
+
+    def _reset_rows(self):
+        self._rows.clear()
+        self._order.clear()
+        self._has_newer = False
+        self._loading = False
+        self._pinned = None
         # Remove all widgets except the final stretch
         while self._messages_layout.count() > 1:
             item = self._messages_layout.takeAt(0)
             if item.widget():
                 item.widget().deleteLater()
+
+
+def _branch(row) -> tuple[int, int]:
+    """(position, count) of a message among the alternatives to it."""
+    return row["sibling_index"], row["siblings"]
@@ -0,0 +1,187 @@
+from datetime import date, timedelta
+
+import numpy as np
+from PyQt6 import sip
+from PyQt6.QtCore import Qt, QPointF, QRectF
+from PyQt6.QtGui import QFont, QColor, QPainter, QPen, QPolygonF
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QSizePolicy
+
+from core.analytics import (
+    LEVELS, Rollups, load_rollups, accuracy_trend, weekly_totals, level_transitions, category_rates,
+)
+
+SIDEBAR_BG = "#13131c"
+ACCENT = "#7c5cbf"
+TEXT = "#e8e8f0"
+GREEN = "#3dba6f"
+BLUE = "#4a9edd"
+ORANGE = "#e08040"
+MUTED = "#888"
+
+EPOCH = date(1970, 1, 1)
+CATEGORY_WINDOW = 30  # days compared with the window before them
+
+
+def _read_dashboard(window: int) -> tuple[Rollups, list]:
+    """The daily rollups and the category rollups of the last two windows, on a reader thread."""
+    from db.database import get_daily_category_rollups
+
+    r = load_rollups()
+    since = max(r.first_day, r.first_day + len(r.user_messages) - 2 * window)
+    return r, get_daily_category_rollups(since)
+
+
+def _downsample(values: np.ndarray, width: int) -> np.ndarray:
+    """Average values into at most `width` buckets (one per pixel), ignoring NaN."""
+    if len(values) <= width:
+        return values.astype(np.float64)
+    edges = np.linspace(0, len(values), width + 1).astype(np.int64)[:-1]
+    finite = np.isfinite(values)
+    sums = np.add.reduceat(np.where(finite, values, 0.0), edges)
+    counts = np.add.reduceat(finite.astype(np.int64), edges)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+class TrendChart(QWidget):
+    """Minimal painter-based chart: a line (NaN breaks it) or bars."""
+
+    def __init__(self, color: str, bars: bool = False, parent=None):
+        super().__init__(parent)
+        self._color = QColor(color)
+        self._bars = bars
+        self._values = np.zeros(0)
+        self._y_max = 1.0
+        self.setMinimumHeight(70)
+        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
+
+    def set_series(self, values: np.ndarray, y_max: float | None = None):
+        self._values = np.asarray(values, dtype=np.float64)
+        finite = self._values[np.isfinite(self._values)]
+        self._y_max = y_max or (float(finite.max()) if len(finite) and finite.max() > 0 else 1.0)
+        self.update()
+
+    def paintEvent(self, event):
+        p = QPainter(self)
+        p.setRenderHint(QPainter.RenderHint.Antialiasing)
+        rect = QRectF(self.rect()).adjusted(2, 4, -2, -4)
+        p.fillRect(self.rect(), QColor("#1a1a2a"))
+        values = _downsample(self._values, max(1, int(rect.width())))
+        if len(values) == 0:
+            p.setPen(QColor(MUTED))
+            p.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, "—")
+            return
+
+        step = rect.width() / max(len(values) - (0 if self._bars else 1), 1)
+        ys = rect.bottom() - values / self._y_max * rect.height()
+        if self._bars:
+            p.setPen(Qt.PenStyle.NoPen)
+            p.setBrush(self._color)
+            bar_w = max(step - 1, 1)
+            for i, y in enumerate(ys):
+                if np.isfinite(y) and y < rect.bottom():
+                    p.drawRect(QRectF(rect.left() + i * step, y, bar_w, rect.bottom() - y))
+            return
+
+        p.setPen(QPen(self._color, 1.5))
+        xs = rect.left() + np.arange(len(values)) * step
+        # Split the polyline wherever there is no data
+        finite = np.isfinite(ys)
+        breaks = np.flatnonzero(np.diff(finite.astype(np.int8)) != 0) + 1
+        for seg in np.split(np.arange(len(values)), breaks):
+            if len(seg) and finite[seg[0]]:
+                p.drawPolyline(QPolygonF([QPointF(x, y) for x, y in zip(xs[seg], ys[seg])]))
+
+
+class DashboardTab(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setStyleSheet(f"background: {SIDEBAR_BG};")
+        self._dirty = True
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(12, 12, 12, 12)
+        layout.setSpacing(8)
+
+        self._accuracy_chart = TrendChart(GREEN)
+        self._words_chart = TrendChart(BLUE, bars=True)
+        self._level_chart = TrendChart(ACCENT)
+
+        layout.addWidget(self._make_label("Acuratețe (medie pe 7 zile)"))
+        layout.addWidget(self._accuracy_chart)
+        layout.addWidget(self._make_label("Cuvinte noi pe săptămână"))
+        layout.addWidget(self._words_chart)
+        layout.addWidget(self._make_label("Nivel"))
+        layout.addWidget(self._level_chart)
+
+        layout.addWidget(self._make_label("Corecții la 100 de mesaje (ultimele 30 de zile)"))
+        self._categories = QLabel("—")
+        self._categories.setWordWrap(True)
+        self._categories.setTextFormat(Qt.TextFormat.RichText)
+        self._categories.setFont(QFont("Noto Serif", 10))
+        self._categories.setStyleSheet(f"color: {TEXT};")
+        layout.addWidget(self._categories)
+
+        self._summary = QLabel("")
+        self._summary.setWordWrap(True)
+        self._summary.setFont(QFont("Noto Serif", 10))
+        self._summary.setStyleSheet(f"color: {MUTED};")
+        layout.addWidget(self._summary)
+        layout.addStretch()
+
+    def _make_label(self, text: str) -> QLabel:
+        lbl = QLabel(text)
+        lbl.setFont(QFont("Noto Serif", 10))
+        lbl.setStyleSheet(f"color: {TEXT};")
+        return lbl
+
+    def mark_dirty(self):
+        """Data changed; reload the next time the tab is shown."""
+        self._dirty = True
+        if self.isVisible():
+            self.refresh()
+
+    def showEvent(self, event):
+        if self._dirty:
+            self.refresh()
+        super().showEvent(event)
+
+    def refresh(self):
+        from core.queries import query_executor
+
+        self._dirty = False
+        query_executor().read(_read_dashboard, CATEGORY_WINDOW, callback=self._show)
+
+    def _show(self, data: tuple[Rollups, list]):
+        from core.mistakes import LABELS
+
+        if sip.isdeleted(self):
+            return  # its tab was unloaded while the rollups were read
+        r, category_rows = data
+        self._accuracy_chart.set_series(accuracy_trend(r), y_max=100.0)
+        _, words = weekly_totals(r, r.new_words)
+        self._words_chart.set_series(words)
+        self._level_chart.set_series(np.where(r.level >= 0, r.level + 1, np.nan), y_max=len(LEVELS))
+
+        rates = category_rates(r, category_rows, CATEGORY_WINDOW)
+        rows = []
+        for cat, (now, before) in sorted(rates.items(), key=lambda kv: -kv[1][0]):
+            if now == 0 and before == 0:
+                continue
+            delta = now - before
+            color = GREEN if delta < 0 else ORANGE if delta > 0 else MUTED
+            arrow = "↓" if delta < 0 else "↑" if delta > 0 else "="
+            rows.append(
+                f"{LABELS.get(cat, cat)}: {now:.1f} "
+                f"<span style='color: {color};'>{arrow} {abs(delta):.1f}</span>"
+            )
+        self._categories.setText("<br>".join(rows) or "—")
+
+        changes = level_transitions(r)
+        lines = [f"Zile active: {int(np.count_nonzero(r.user_messages))}"]
+        if len(changes):
+            last = EPOCH + timedelta(days=int(changes[-1]))
+            lines.append(f"Schimbări de nivel: {len(changes)} (ultima: {last:%d.%m.%Y})")
+        if len(r.level) and r.level[-1] >= 0:
+            lines.append(f"Nivel curent: {LEVELS[r.level[-1]]}")
+        self._summary.setText("\n".join(lines))
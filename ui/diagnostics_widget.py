@@ -0,0 +1,99 @@
+from PyQt6 import sip
+from PyQt6.QtCore import QTimer
+from PyQt6.QtGui import QFont
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QLabel, QGridLayout
+
+from core.queries import query_executor
+
+ACCENT = "#7c5cbf"
+TEXT = "#e8e8f0"
+MUTED = "#888"
+WINDOW = 100  # calls in the rolling window
+
+
+def _ms(value: float | None) -> str:
+    return "—" if value is None else f"{value:,.0f} ms"
+
+
+class DiagnosticsDialog(QDialog):
+    """Rolling API latency/token/cost figures over the last WINDOW calls."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Diagnostic — API")
+        self.resize(380, 320)
+        self.setStyleSheet(f"background: #16161f; color: {TEXT};")
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(16, 16, 16, 16)
+
+        title = QLabel(f"Ultimele {WINDOW} apeluri")
+        title.setFont(QFont("Noto Serif", 11, QFont.Weight.Bold))
+        title.setStyleSheet(f"color: {ACCENT};")
+        layout.addWidget(title)
+
+        self._grid = QGridLayout()
+        self._grid.setHorizontalSpacing(16)
+        layout.addLayout(self._grid)
+        layout.addStretch()
+
+        self._values: dict[str, QLabel] = {}
+        rows = [
+            ("calls", "Apeluri"),
+            ("total", "Latență totală p50 / p95"),
+            ("ttft", "Primul token p50 / p95"),
+            ("wait", "Așteptare în coadă p50 / p95"),
+            ("e2e", "Enter → răspuns p50, pregătit / nu"),
+            ("tokens", "Tokeni intrare / ieșire"),
+            ("cache", "Tokeni din cache"),
+            ("errors", "Erori / reîncercări"),
+            ("parse", "Răspunsuri JSON invalide"),
+            ("cost", "Cost estimat"),
+        ]
+        for i, (key, text) in enumerate(rows):
+            name = QLabel(text)
+            name.setFont(QFont("Noto Serif", 10))
+            name.setStyleSheet(f"color: {MUTED};")
+            value = QLabel("—")
+            value.setFont(QFont("Noto Serif", 10))
+            self._grid.addWidget(name, i, 0)
+            self._grid.addWidget(value, i, 1)
+            self._values[key] = value
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(5000)
+        self._timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        self.refresh()
+        self._timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self._timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        from db.database import get_recent_api_metrics
+
+        query_executor().read(get_recent_api_metrics, WINDOW, callback=self._show)
+
+    def _show(self, rows: list):
+        from core.telemetry import summarize
+
+        if sip.isdeleted(self):
+            return
+        s = summarize(rows)
+        chats = [r for r in rows if r["kind"] == "chat"]
+        warm = summarize([r for r in chats if r["prewarmed"]])
+        cold = summarize([r for r in chats if not r["prewarmed"]])
+        self._values["calls"].setText(str(s["calls"]))
+        self._values["total"].setText(f"{_ms(s['total_ms_p50'])} / {_ms(s['total_ms_p95'])}")
+        self._values["ttft"].setText(f"{_ms(s['ttft_ms_p50'])} / {_ms(s['ttft_ms_p95'])}")
+        self._values["wait"].setText(f"{_ms(s['queue_wait_ms_p50'])} / {_ms(s['queue_wait_ms_p95'])}")
+        self._values["e2e"].setText(f"{_ms(warm['e2e_ms_p50'])} / {_ms(cold['e2e_ms_p50'])}")
+        self._values["tokens"].setText(f"{s['input_tokens']:,} / {s['output_tokens']:,}")
+        self._values["cache"].setText(f"{s['cache_read_tokens']:,}")
+        self._values["errors"].setText(f"{s['errors']} / {s['retries']}")
+        self._values["parse"].setText(str(s["parse_failures"]))
+        self._values["cost"].setText(f"${s['cost_usd']:.4f}")
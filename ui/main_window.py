@@ -1,17 +1,32 @@
-from PyQt6.QtCore import Qt, QSize
-from PyQt6.QtGui import QFont, QIcon, QPixmap, QColor, QPainter
+import logging
+import os
+import sqlite3
+import time
+from functools import partial
+
+from PyQt6.QtCore import Qt, QSize, pyqtSignal
+from PyQt6.QtGui import QFont, QIcon, QPixmap, QColor, QPainter, QShortcut, QKeySequence
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QHBoxLayout, QVBoxLayout,
-    QLabel, QSplitter, QSystemTrayIcon, QMenu,
+    QLabel, QSystemTrayIcon, QMenu, QPushButton, QTabWidget,
 )
 
-from ui.chat_widget import ChatWidget
-from ui.sidebar_widget import SidebarWidget
+from core.exercises import ExercisePrefetcher
+from core.outbox import OutboxDispatcher
+from core.queries import query_executor
+from ui.diagnostics_widget import DiagnosticsDialog
+from ui.quiz_widget import QuizDialog
+from ui.search_widget import SearchDialog
+from ui.session_tab import SessionTab, store_analysis
 
 BG = "#0f0f13"
 ACCENT = "#7c5cbf"
 TEXT = "#e8e8f0"
 
+# Tabs kept built in memory; the least recently shown of the others are unloaded
+MAX_LOADED_TABS = max(int(os.getenv("TUTOR_LOADED_TABS", "3")), 1)
+DB_ERROR_MS = 15000  # how long a database error stays in the status bar
+
 LEVEL_COLORS = {
     "beginner": "#f59e0b",
     "elementary": "#3b82f6",
@@ -20,6 +35,8 @@ LEVEL_COLORS = {
     "advanced": "#ef4444",
 }
 
+log = logging.getLogger(__name__)
+
 
 def _make_tray_icon() -> QPixmap:
     px = QPixmap(32, 32)
@@ -35,30 +52,49 @@ def _make_tray_icon() -> QPixmap:
     return px
 
 
+def _enable_incremental_vacuum() -> bool:
+    """Convert the database to incremental vacuum; False (and logged) if it failed."""
+    from db.archive import enable_incremental_vacuum
+
+    try:
+        enable_incremental_vacuum()
+    except sqlite3.Error:
+        log.exception("Vacuum conversion error")
+        return False
+    return True
+
+
 class MainWindow(QMainWindow):
-    def __init__(self, session_id: int, resume: bool = False):
+    # The database is ready for background writers (any one-off conversion is done)
+    database_ready = pyqtSignal()
+
+    def __init__(self, session_id: int):
         super().__init__()
-        self._session_id = session_id
-        self._messages: list[dict] = []
-        self._corrections_count = 0
-        self._words_learned: set[str] = set()
-        self._current_level = "beginner"
+        self._first_session_id = session_id
+        self._tabs_by_session: dict[int, SessionTab] = {}
+        self._offline_status: str | None = None
+        self._search_dialog = None
+        self._diagnostics_dialog = None
+        self._quiz_dialog = None
+        self._maintenance = None
+        self._prefetcher = ExercisePrefetcher(self)
+        self._outbox = OutboxDispatcher(self)
+        self._outbox.started.connect(self._on_started)
+        self._outbox.reply_ready.connect(self._on_reply)
+        self._outbox.analysis_ready.connect(self._on_analysis)
+        self._outbox.failed.connect(self._on_error)
+        self._outbox.offline.connect(self._on_offline)
+        self._outbox.online.connect(lambda: self._set_offline_status(None))
+        query_executor().error_occurred.connect(self._on_db_error)
 
         self._setup_window()
         self._setup_tray()
         self._setup_ui()
+        self._start_maintenance()
 
-        if resume:
-            self._load_history()
-        else:
-            self._sidebar._feedback_tab.reset()
-            self._chat.add_message(
-                "Hello! I'm Alex, your English tutor. How are you today? "
-                "Feel free to write in English — I'm here to help you practice!",
-                "assistant",
-            )
-
-        self._refresh_stats()
+        # Messages left waiting for a reply by an earlier run go out once
+        # the transcript they belong to is on screen
+        self._open_tab(session_id).load(then=self._outbox.dispatch)
 
     def _setup_window(self):
         self.setWindowTitle("English Tutor — Alex")
@@ -72,6 +108,7 @@ class MainWindow(QMainWindow):
         tray.setToolTip("English Tutor")
         menu = QMenu()
         menu.addAction("Show", self.show)
+        menu.addAction("Diagnostics", self._open_diagnostics)
         menu.addAction("Quit", self.close)
         tray.setContextMenu(menu)
         tray.show()
@@ -90,22 +127,80 @@ class MainWindow(QMainWindow):
         top_bar = self._build_top_bar()
         root_layout.addWidget(top_bar)
 
-        # Main split
-        self._splitter = QSplitter(Qt.Orientation.Horizontal)
-        self._splitter.setStyleSheet("QSplitter::handle { background: #2a2a3a; width: 1px; }")
-        self._splitter.setHandleWidth(1)
-
-        self._chat = ChatWidget()
-        self._sidebar = SidebarWidget(self._session_id)
-
-        self._splitter.addWidget(self._chat)
-        self._splitter.addWidget(self._sidebar)
-        self._splitter.setStretchFactor(0, 7)
-        self._splitter.setStretchFactor(1, 3)
-
-        root_layout.addWidget(self._splitter)
-
-        self._chat.message_submitted.connect(self._on_user_message)
+        # One tab per open conversation
+        self._tabs = QTabWidget()
+        self._tabs.setTabsClosable(True)
+        self._tabs.setMovable(True)
+        self._tabs.setDocumentMode(True)
+        self._tabs.setStyleSheet(f"""
+            QTabBar::tab {{
+                background: #16161f;
+                color: #9090a8;
+                padding: 6px 14px;
+                border: none;
+            }}
+            QTabBar::tab:selected {{ background: {BG}; color: {TEXT}; }}
+        """)
+        new_tab_btn = QPushButton("＋")
+        new_tab_btn.setToolTip("Conversație nouă (Ctrl+T)")
+        new_tab_btn.setStyleSheet(f"""
+            QPushButton {{ background: transparent; color: {TEXT}; border: none; padding: 4px 10px; }}
+            QPushButton:hover {{ background: {ACCENT}; }}
+        """)
+        new_tab_btn.clicked.connect(self._new_session)
+        self._tabs.setCornerWidget(new_tab_btn, Qt.Corner.TopRightCorner)
+        self._tabs.currentChanged.connect(self._on_tab_changed)
+        self._tabs.tabCloseRequested.connect(self._close_tab)
+        root_layout.addWidget(self._tabs)
+
+        QShortcut(QKeySequence.StandardKey.Find, self, activated=self._open_search)
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, activated=self._open_diagnostics)
+        QShortcut(QKeySequence("Ctrl+E"), self, activated=self._open_quiz)
+        QShortcut(QKeySequence("Ctrl+T"), self, activated=self._new_session)
+
+    def _start_maintenance(self):
+        """Convert an old database first if it needs it, then start the background jobs.
+
+        The conversion is a full VACUUM holding the write lock for as long
+        as it takes, longer than other connections wait for it.
+        """
+        from db.archive import needs_incremental_vacuum
+
+        query_executor().read(needs_incremental_vacuum, callback=self._convert_vacuum_mode)
+
+    def _convert_vacuum_mode(self, needed: bool):
+        """Run the one-off VACUUM of a database from before incremental vacuum, saying so meanwhile."""
+        if not needed:
+            self._start_background_jobs()
+            return
+        self.statusBar().showMessage("Se optimizează baza de date (o singură dată)… "
+                                     "Mesajele se salvează imediat după.")
+        query_executor().write(_enable_incremental_vacuum, callback=self._on_vacuum_mode_converted)
+
+    def _on_vacuum_mode_converted(self, ok: bool):
+        if ok:
+            self.statusBar().clearMessage()
+        else:
+            self._on_db_error("⚠️  Baza de date nu a putut fi optimizată; se încearcă din nou la următoarea pornire.")
+        self._start_background_jobs()
+
+    def _start_background_jobs(self):
+        from db.database import backfill_search_index, backfill_feedback_tags
+        from db.archive import archive_next_session
+        from core.maintenance import MaintenanceWorker
+        from core.memory import sync_memory
+        from core.mistakes import classify
+
+        steps = [backfill_search_index, partial(backfill_feedback_tags, classify), sync_memory]
+        archive_days = int(os.getenv("TUTOR_ARCHIVE_DAYS", "90"))
+        if archive_days > 0:
+            steps.append(partial(archive_next_session, archive_days, exclude=self._first_session_id))
+        self._maintenance = MaintenanceWorker(steps, parent=self)
+        self._maintenance.start()
+        self.database_ready.emit()
+
+    def _on_db_error(self, error: str):
+        self.statusBar().showMessage(error, DB_ERROR_MS)
 
     def _build_top_bar(self) -> QWidget:
         bar = QWidget()
@@ -122,6 +217,24 @@ class MainWindow(QMainWindow):
         layout.addWidget(title)
         layout.addStretch()
 
+        quiz_btn = QPushButton("📝 Exerciții")
+        search_btn = QPushButton("🔍 Caută")
+        for btn in (quiz_btn, search_btn):
+            btn.setFont(QFont("Noto Serif", 10))
+            btn.setStyleSheet(f"""
+                QPushButton {{
+                    background: #2a2a3a;
+                    color: {TEXT};
+                    border-radius: 6px;
+                    padding: 4px 12px;
+                    border: none;
+                }}
+                QPushButton:hover {{ background: {ACCENT}; }}
+            """)
+            layout.addWidget(btn)
+        quiz_btn.clicked.connect(self._open_quiz)
+        search_btn.clicked.connect(self._open_search)
+
         self._level_badge = QLabel("beginner")
         self._level_badge.setFont(QFont("Noto Serif", 10, QFont.Weight.Bold))
         self._level_badge.setStyleSheet(
@@ -133,7 +246,6 @@ class MainWindow(QMainWindow):
         return bar
 
     def _update_level_badge(self, level: str):
-        self._current_level = level
         color = LEVEL_COLORS.get(level, ACCENT)
         self._level_badge.setText(level)
         self._level_badge.setStyleSheet(
@@ -141,142 +253,133 @@ class MainWindow(QMainWindow):
             "border-radius: 10px; padding: 3px 10px;"
         )
 
-    def _on_user_message(self, text: str):
-        from db.database import save_message
-        from core.tutor import TutorWorker
-
-        # Display in chat
-        self._chat.add_message(text, "user")
-        self._chat.set_input_enabled(False)
-        self._chat.set_typing(True)
-
-        # Persist
-        save_message(self._session_id, "user", text)
-
-        # Build history for API
-        self._messages.append({"role": "user", "content": text})
-
-        # Start worker
-        self._worker = TutorWorker(list(self._messages), self)
-        self._worker.response_ready.connect(self._on_response)
-        self._worker.error_occurred.connect(self._on_error)
-        self._worker.start()
-
-    def _on_response(self, data: dict):
-        from db.database import (
-            save_message, save_feedback, save_vocabulary,
-            save_goals, update_stats, update_session_level,
+    def current_tab(self) -> SessionTab:
+        return self._tabs.currentWidget()
+
+    def _open_tab(self, session_id: int) -> SessionTab:
+        """The session's tab, added (not loaded yet) if it isn't open; it becomes the current tab."""
+        tab = self._tabs_by_session.get(session_id)
+        if tab is None:
+            tab = SessionTab(session_id, self._outbox, self._prefetcher)
+            tab.level_changed.connect(partial(self._on_level_changed, tab))
+            tab.set_offline(self._offline_status)
+            self._tabs_by_session[session_id] = tab
+            self._tabs.addTab(tab, f"Conversația #{session_id}")
+        self._tabs.setCurrentWidget(tab)
+        return tab
+
+    def _new_session(self):
+        from db.database import create_session
+
+        query_executor().write(create_session, callback=self._open_tab)
+
+    def _on_tab_changed(self, index: int):
+        tab = self._tabs.widget(index)
+        if tab is None:
+            return
+        tab.load()
+        tab.last_used = time.monotonic()
+        self._update_level_badge(tab.level)
+        if self._quiz_dialog is not None:
+            self._quiz_dialog.set_session(tab.session_id)
+        self._unload_idle()
+
+    def _unload_idle(self):
+        """Unload the least recently shown tabs beyond MAX_LOADED_TABS."""
+        current = self.current_tab()
+        loaded = sorted((t for t in self._tabs_by_session.values() if t.is_loaded and t is not current),
+                        key=lambda t: t.last_used)
+        for tab in loaded[:max(len(loaded) - (MAX_LOADED_TABS - 1), 0)]:
+            tab.unload()
+
+    def _close_tab(self, index: int):
+        if self._tabs.count() == 1:
+            return  # there is always a conversation open
+        tab = self._tabs.widget(index)
+        self._tabs.removeTab(index)
+        del self._tabs_by_session[tab.session_id]
+        # Its queued messages still get their replies; they are in the
+        # transcript when the session is opened again
+        tab.unload()
+        tab.deleteLater()
+
+    def _on_level_changed(self, tab: SessionTab, level: str):
+        if tab is self.current_tab():
+            self._update_level_badge(level)
+
+    def _on_started(self, session_id: int):
+        tab = self._tabs_by_session.get(session_id)
+        if tab is not None:
+            tab.on_started()
+
+    def _on_reply(self, turn: dict, reply: str):
+        tab = self._tabs_by_session.get(turn["session_id"])
+        if tab is not None:
+            tab.on_reply(turn, reply)
+
+    def _on_analysis(self, turn: dict, data: dict | None):
+        tab = self._tabs_by_session.get(turn["session_id"])
+        if tab is not None:
+            tab.on_analysis(turn, data)
+        elif data is not None:
+            query_executor().write(store_analysis, turn["session_id"], turn["reply_id"], data)
+
+    def _on_error(self, turn: dict, error_msg: str):
+        tab = self._tabs_by_session.get(turn["session_id"])
+        if tab is not None:
+            tab.on_error(turn, error_msg)
+
+    def _on_offline(self, queued: int, retry_in_s: float):
+        self._set_offline_status(
+            f"Fără conexiune · {queued} {'mesaj' if queued == 1 else 'mesaje'} în așteptare, "
+            f"se trimit automat (următoarea încercare în {retry_in_s:.0f}s)"
         )
 
-        self._chat.set_typing(False)
-        self._chat.set_input_enabled(True)
-
-        reply = data.get("reply", "")
-        feedback = data.get("feedback", {})
-        level = data.get("level", self._current_level)
-        new_words = data.get("newWords", [])
-        goals = data.get("goals", [])
-
-        # Display reply
-        self._chat.add_message(reply, "assistant")
-
-        # Persist assistant message
-        msg_id = save_message(self._session_id, "assistant", reply)
-
-        # Persist feedback
-        save_feedback(
-            msg_id,
-            feedback.get("positive", ""),
-            feedback.get("correction"),
-            feedback.get("tip", ""),
-        )
-
-        # Persist vocabulary
-        save_vocabulary(new_words, self._session_id)
-        for w in new_words:
-            self._words_learned.add(w)
-
-        # Persist goals
-        if goals:
-            save_goals(goals, self._session_id)
-            self._sidebar.set_goals(goals)
-
-        # Track corrections
-        if feedback.get("correction"):
-            self._corrections_count += 1
-
-        # Update level
-        self._update_level_badge(level)
-        update_session_level(self._session_id, level)
-
-        # Compute accuracy
-        total_user = sum(1 for m in self._messages if m["role"] == "user")
-        accuracy = max(0.0, 100.0 - (self._corrections_count / max(total_user, 1)) * 100)
-        update_stats(self._session_id, accuracy, len(self._words_learned), self._corrections_count)
-
-        # Update sidebar
-        self._sidebar.update_feedback(
-            feedback.get("positive", ""),
-            feedback.get("correction"),
-            feedback.get("tip", ""),
-        )
-        self._refresh_stats()
-
-        # Append to history
-        self._messages.append({"role": "assistant", "content": reply})
-
-    def _on_error(self, error_msg: str):
-        self._chat.set_typing(False)
-        self._chat.set_input_enabled(True)
-        self._chat.add_message(error_msg, "assistant")
-
-    def _load_history(self):
-        from db.database import get_messages, get_goals, get_stats, get_vocabulary, get_session_level
-
-        rows = get_messages(self._session_id)
-        for row in rows:
-            self._chat.add_message(row["content"], row["role"])
-            self._messages.append({"role": row["role"], "content": row["content"]})
-
-        goals = get_goals(self._session_id)
-        if goals:
-            self._sidebar.set_goals(goals)
-
-        stats = get_stats(self._session_id)
-        if stats:
-            self._corrections_count = stats["corrections_count"]
-
-        words = get_vocabulary(self._session_id)
-        self._words_learned = set(words)
-
-        level = get_session_level(self._session_id)
-        self._update_level_badge(level)
-
-    def _refresh_stats(self):
-        from db.database import get_stats, get_cumulative_stats
-
-        stats = get_stats(self._session_id)
-        if stats:
-            total_user = sum(1 for m in self._messages if m["role"] == "user")
-            self._sidebar.update_session_stats(
-                total_user,
-                stats["corrections_count"],
-                stats["words_learned"],
-                stats["accuracy_pct"],
+    def _set_offline_status(self, status: str | None):
+        self._offline_status = status
+        for tab in self._tabs_by_session.values():
+            tab.set_offline(status)
+
+    def _open_search(self):
+        if self._search_dialog is None:
+            self._search_dialog = SearchDialog(self)
+            self._search_dialog.result_activated.connect(self._jump_to_message)
+        self._search_dialog.show()
+        self._search_dialog.raise_()
+        self._search_dialog.activateWindow()
+
+    def _open_quiz(self):
+        if self._quiz_dialog is None:
+            self._quiz_dialog = QuizDialog(self.current_tab().session_id, self)
+            self._quiz_dialog.refill_requested.connect(
+                lambda: self._prefetcher.maybe_refill(self.current_tab().session_id, self.current_tab().level,
+                                                      force=True)
             )
-
-        cum = get_cumulative_stats()
-        self._sidebar.update_cumulative_stats(
-            cum["total_sessions"],
-            cum["total_words"],
-            cum["total_corrections"],
-            cum["avg_accuracy"],
-        )
+            self._prefetcher.batch_ready.connect(self._quiz_dialog.on_batch_ready)
+            self._prefetcher.error_occurred.connect(self._quiz_dialog.on_error)
+        self._quiz_dialog.set_session(self.current_tab().session_id)
+        self._quiz_dialog.show()
+        self._quiz_dialog.raise_()
+        self._quiz_dialog.activateWindow()
+
+    def _open_diagnostics(self):
+        if self._diagnostics_dialog is None:
+            self._diagnostics_dialog = DiagnosticsDialog(self)
+        self._diagnostics_dialog.show()
+        self._diagnostics_dialog.raise_()
+
+    def _jump_to_message(self, session_id: int, message_id: int):
+        tab = self._open_tab(session_id)
+        tab.load(then=partial(tab.show_message, message_id))
 
     def closeEvent(self, event):
-        from db.database import update_stats
-        total_user = sum(1 for m in self._messages if m["role"] == "user")
-        accuracy = max(0.0, 100.0 - (self._corrections_count / max(total_user, 1)) * 100)
-        update_stats(self._session_id, accuracy, len(self._words_learned), self._corrections_count)
+        for tab in self._tabs_by_session.values():
+            tab.unload()
+        query_executor().wait()
+        if self._maintenance is not None:
+            self._maintenance.requestInterruption()
+            self._maintenance.wait()
+        self._prefetcher.stop()
+        self._outbox.stop()
         self._tray.hide()
         super().closeEvent(event)
@@ -0,0 +1,176 @@
+from functools import partial
+
+from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtGui import QFont
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton
+
+ACCENT = "#7c5cbf"
+TEXT = "#e8e8f0"
+MUTED = "#888"
+GREEN = "#3dba6f"
+ORANGE = "#e08040"
+
+BUTTON_STYLE = f"""
+    QPushButton {{
+        background: #2a2a3a;
+        color: {TEXT};
+        border-radius: 6px;
+        padding: 6px 12px;
+        border: none;
+    }}
+    QPushButton:hover {{ background: {ACCENT}; }}
+    QPushButton:disabled {{ color: #555; }}
+"""
+
+
+class QuizDialog(QDialog):
+    """Quiz mode: one prefetched exercise at a time, answered and checked locally."""
+
+    refill_requested = pyqtSignal()
+
+    def __init__(self, session_id: int, parent=None):
+        super().__init__(parent)
+        self._session_id = session_id
+        self._exercise: dict | None = None
+        self._answered = 0
+        self._correct = 0
+        self.setWindowTitle("Exerciții")
+        self.resize(520, 320)
+        self.setStyleSheet(f"background: #16161f; color: {TEXT};")
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(16, 16, 16, 16)
+        layout.setSpacing(10)
+
+        self._kind = QLabel()
+        self._kind.setFont(QFont("Noto Serif", 10, QFont.Weight.Bold))
+        self._kind.setStyleSheet(f"color: {ACCENT};")
+        layout.addWidget(self._kind)
+
+        self._prompt = QLabel()
+        self._prompt.setWordWrap(True)
+        self._prompt.setFont(QFont("Noto Serif", 13))
+        layout.addWidget(self._prompt)
+
+        self._input = QLineEdit()
+        self._input.setFont(QFont("Noto Serif", 11))
+        self._input.setPlaceholderText("Răspunsul tău...")
+        self._input.setStyleSheet(f"""
+            QLineEdit {{
+                background: #1e1e2e;
+                color: {TEXT};
+                border: 1px solid #3a3a5a;
+                border-radius: 6px;
+                padding: 6px;
+            }}
+        """)
+        self._input.returnPressed.connect(self._check)
+        layout.addWidget(self._input)
+
+        self._result = QLabel()
+        self._result.setWordWrap(True)
+        self._result.setFont(QFont("Noto Serif", 10))
+        layout.addWidget(self._result)
+        layout.addStretch()
+
+        row = QHBoxLayout()
+        self._score = QLabel()
+        self._score.setStyleSheet(f"color: {MUTED};")
+        row.addWidget(self._score)
+        row.addStretch()
+        self._check_btn = QPushButton("Verifică")
+        self._next_btn = QPushButton("Următorul →")
+        for btn in (self._check_btn, self._next_btn):
+            btn.setFont(QFont("Noto Serif", 10))
+            btn.setStyleSheet(BUTTON_STYLE)
+            row.addWidget(btn)
+        self._check_btn.clicked.connect(self._check)
+        self._next_btn.clicked.connect(self.next_exercise)
+        layout.addLayout(row)
+
+    def set_session(self, session_id: int):
+        if session_id != self._session_id:
+            self._session_id = session_id
+            self._exercise = None
+            self._answered = self._correct = 0
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self._exercise is None:
+            self.next_exercise()
+
+    def next_exercise(self):
+        """Take the session's next exercise (marking it used, hence on the writer thread) and show it."""
+        from core.queries import query_executor
+        from db.database import next_exercise
+
+        self._next_btn.setEnabled(False)
+        query_executor().write(next_exercise, self._session_id,
+                               callback=partial(self._show_exercise, self._session_id))
+
+    def _show_exercise(self, session_id: int, row):
+        from core.exercises import exercise_payload
+
+        self._next_btn.setEnabled(True)
+        if session_id != self._session_id:
+            return  # the tab changed while it was read
+        self._exercise = exercise_payload(row) if row else None
+        self._input.clear()
+        self._result.clear()
+        self._update_score()
+        if self._exercise is None:
+            self._kind.setText("")
+            self._prompt.setText("Exercițiile se pregătesc pe baza conversației… revino în câteva momente.")
+            self._input.setEnabled(False)
+            self._check_btn.setEnabled(False)
+            self.refill_requested.emit()
+            return
+        label = self._exercise["label"] + (" · recapitulare" if self._exercise["repeat"] else "")
+        self._kind.setText(label)
+        self._prompt.setText(self._exercise["prompt"])
+        self._input.setEnabled(True)
+        self._check_btn.setEnabled(True)
+        self._input.setFocus()
+
+    def on_batch_ready(self, session_id: int, count: int):
+        """A background batch landed; show it if the dialog was waiting for one."""
+        if session_id != self._session_id or self._exercise is not None or not self.isVisible():
+            return
+        if count:
+            self.next_exercise()
+        else:
+            self._prompt.setText("Încă nu am din ce face exerciții: scrie câteva mesaje în conversație "
+                                 "și apasă „Următorul →”.")
+
+    def on_error(self, session_id: int, message: str):
+        """Generating the batch the dialog was waiting for failed."""
+        if session_id != self._session_id or self._exercise is not None or not self.isVisible():
+            return
+        self._prompt.setText(f"Exercițiile nu au putut fi pregătite.\n{message}\n"
+                             "Apasă „Următorul →” ca să încerci din nou.")
+
+    def _check(self):
+        from core.exercises import check_answer
+        from core.queries import query_executor
+        from db.database import record_exercise_result
+
+        if self._exercise is None or not self._check_btn.isEnabled():
+            return
+        correct = check_answer(self._exercise["answer"], self._input.text())
+        query_executor().write(record_exercise_result, self._exercise["id"], correct)
+        self._answered += 1
+        self._correct += int(correct)
+        expected = self._exercise["answer"].split("|")[0]
+        if correct:
+            self._result.setStyleSheet(f"color: {GREEN};")
+            self._result.setText("✅ Corect!")
+        else:
+            self._result.setStyleSheet(f"color: {ORANGE};")
+            hint = f"\n💡 {self._exercise['hint']}" if self._exercise["hint"] else ""
+            self._result.setText(f"✏️ Răspuns corect: {expected}{hint}")
+        self._check_btn.setEnabled(False)
+        self._update_score()
+        self._next_btn.setFocus()
+
+    def _update_score(self):
+        self._score.setText(f"Corecte: {self._correct} / {self._answered}" if self._answered else "")
@@ -0,0 +1,191 @@
+"""Markdown rendering for chat bubbles and feedback, with parse and layout caches.
+
+Text is split into top-level Markdown blocks (paragraphs, lists, fenced
+or indented code) and each block is parsed by Qt once per distinct content: the parsed fragments
+are cached, so re-rendering a reply that grew at the end only parses its
+last block and the new ones.
+
+Laid-out documents are cached by (content, font, width bucket). Widths are
+rounded down to WIDTH_BUCKET pixels, so dragging the splitter lays a
+bubble out again only when it crosses into a new bucket, and adding a
+message to the transcript doesn't lay out the bubbles already there: their
+heights come from the cache.
+"""
+import math
+import re
+from collections import OrderedDict
+from functools import lru_cache
+
+from PyQt6.QtCore import QSize
+from PyQt6.QtGui import (
+    QAbstractTextDocumentLayout, QColor, QFont, QPainter, QPalette,
+    QTextBlockFormat, QTextCharFormat, QTextCursor, QTextDocument, QTextDocumentFragment,
+)
+from PyQt6.QtWidgets import QApplication, QMenu, QSizePolicy, QWidget
+
+WIDTH_BUCKET = 16
+PARSE_CACHE_SIZE = 4096  # blocks
+LAYOUT_CACHE_SIZE = 1024  # laid-out documents
+
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_LIST_ITEM = re.compile(r"^\s*([-*+]|\d+[.)])\s")
+
+_layouts: OrderedDict[tuple, QTextDocument] = OrderedDict()
+
+
+def _continues(block: list[str], line: str) -> bool:
+    """Whether line, after a blank line, still belongs to block.
+
+    Indented lines do (a list item's next paragraph, indented code), and so
+    does the next item of a list, which would otherwise be numbered afresh.
+    """
+    return line[0] in " \t" or bool(_LIST_ITEM.match(line) and _LIST_ITEM.match(block[0]))
+
+
+def split_blocks(text: str) -> list[str]:
+    """Top-level Markdown blocks of text, split at the blank lines that end one; fenced code kept whole."""
+    blocks, current, fenced, blanks = [], [], False, 0
+    for line in text.splitlines():
+        if not line.strip() and not fenced:
+            blanks += bool(current)
+            continue
+        if blanks:
+            if _continues(current, line):
+                current.extend([""] * blanks)
+            else:
+                blocks.append("\n".join(current))
+                current = []
+            blanks = 0
+        if _FENCE.match(line):
+            fenced = not fenced
+        current.append(line)
+    if current:
+        blocks.append("\n".join(current))
+    return blocks
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _fragment(block: str, markdown: bool) -> tuple[QTextDocumentFragment, QTextBlockFormat]:
+    """The parsed block, and the format of its first block (a fragment inserted into a block loses it)."""
+    if not markdown:
+        return QTextDocumentFragment.fromPlainText(block), QTextBlockFormat()
+    doc = QTextDocument()
+    doc.setMarkdown(block, QTextDocument.MarkdownFeature.MarkdownDialectGitHub)
+    first = doc.begin().blockFormat()
+    first.setObjectIndex(-1)  # a list of this document, not of the one it goes into
+    return QTextDocumentFragment(doc), first
+
+
+def build_document(text: str, font: QFont, markdown: bool = True) -> QTextDocument:
+    """A fresh document for text, assembled from the cached block fragments."""
+    doc = QTextDocument()
+    doc.setDefaultFont(font)
+    doc.setDocumentMargin(0)
+    cursor = QTextCursor(doc)
+    blocks = split_blocks(text) if markdown else [text]
+    for i, block in enumerate(blocks):
+        fragment, first = _fragment(block, markdown)
+        if i:
+            # A fresh format, or the block would join the previous one's list or quote
+            cursor.insertBlock(first, QTextCharFormat())
+        else:
+            cursor.setBlockFormat(first)
+        cursor.insertFragment(fragment)
+    return doc
+
+
+def bucket(width: int) -> int:
+    return max(WIDTH_BUCKET, width - width % WIDTH_BUCKET)
+
+
+def layout(text: str, font: QFont, width: int | None, markdown: bool = True,
+           font_key: str | None = None) -> QTextDocument:
+    """text laid out at width rounded down to its bucket (None: unwrapped), from the cache if possible."""
+    width = None if width is None else bucket(width)
+    key = (text, font_key or font.key(), width, markdown)
+    doc = _layouts.get(key)
+    if doc is not None:
+        _layouts.move_to_end(key)
+        return doc
+    doc = build_document(text, font, markdown)
+    doc.setTextWidth(-1 if width is None else width)
+    doc.size()  # lay it out now, while it is being cached
+    _layouts[key] = doc
+    if len(_layouts) > LAYOUT_CACHE_SIZE:
+        _layouts.popitem(last=False)
+    return doc
+
+
+class RichText(QWidget):
+    """Read-only text (Markdown or plain) drawn from the layout cache.
+
+    Stands in for a word-wrapped QLabel: height-for-width, and a context
+    menu to copy the text instead of mouse selection.
+    """
+
+    def __init__(self, text: str, color: str, font: QFont, markdown: bool = True, parent=None):
+        super().__init__(parent)
+        self._text = text
+        self._markdown = markdown
+        self._font_key = font.key()
+        # Layouts ask for the same heights many times per pass; answer from here
+        self._heights: dict[int, int] = {}
+        self.setFont(font)
+        self._palette = QPalette()
+        self._palette.setColor(QPalette.ColorRole.Text, QColor(color))
+        policy = QSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
+        policy.setHeightForWidth(True)
+        self.setSizePolicy(policy)
+
+    def text(self) -> str:
+        return self._text
+
+    def set_text(self, text: str):
+        """Replace the text; when text extends the old one, only the changed tail is parsed."""
+        if text != self._text:
+            self._text = text
+            self._heights.clear()
+            self.updateGeometry()
+            self.update()
+
+    def _doc(self, width: int | None) -> QTextDocument:
+        return layout(self._text, self.font(), width, self._markdown, self._font_key)
+
+    def hasHeightForWidth(self) -> bool:
+        return True
+
+    def heightForWidth(self, width: int) -> int:
+        key = bucket(width)
+        height = self._heights.get(key)
+        if height is None:
+            height = self._heights[key] = math.ceil(self._doc(width).size().height())
+        return height
+
+    def sizeHint(self) -> QSize:
+        # Rounded up to a whole bucket, so the unwrapped text fits its own hint
+        ideal = math.ceil((self._doc(None).idealWidth() + 1) / WIDTH_BUCKET) * WIDTH_BUCKET
+        return QSize(ideal, self.heightForWidth(ideal))
+
+    def minimumSizeHint(self) -> QSize:
+        # The real height comes from heightForWidth(); a narrow-width height
+        # here would only pad the scroll area
+        hint = self.sizeHint()
+        return QSize(min(hint.width(), 8 * WIDTH_BUCKET), hint.height())
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        context = QAbstractTextDocumentLayout.PaintContext()
+        context.palette = self._palette
+        context.clip = event.rect().toRectF()
+        painter.setClipRect(event.rect())
+        self._doc(self.width()).documentLayout().draw(painter, context)
+        painter.end()
+
+    def context_menu(self) -> QMenu:
+        """A menu with a copy action; callers may add their own actions to it."""
+        menu = QMenu(self)
+        menu.addAction("📋 Copiază", lambda: QApplication.clipboard().setText(self._text))
+        return menu
+
+    def contextMenuEvent(self, event):
+        self.context_menu().exec(event.globalPos())
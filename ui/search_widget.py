@@ -0,0 +1,137 @@
+import html
+from functools import partial
+
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+from PyQt6.QtGui import QFont
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QLineEdit, QListWidget, QListWidgetItem,
+    QLabel, QPushButton,
+)
+
+from db.database import SNIPPET_OPEN, SNIPPET_CLOSE
+
+ACCENT = "#7c5cbf"
+TEXT = "#e8e8f0"
+MUTED = "#888"
+PAGE_SIZE = 20
+
+
+def _snippet_html(snippet: str) -> str:
+    text = html.escape(snippet or "")
+    return (
+        text.replace(SNIPPET_OPEN, f"<b style='color: {ACCENT};'>")
+        .replace(SNIPPET_CLOSE, "</b>")
+    )
+
+
+class SearchDialog(QDialog):
+    result_activated = pyqtSignal(int, int)  # session_id, message_id
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Caută în istoric")
+        self.resize(560, 520)
+        self.setStyleSheet("background: #16161f;")
+        self._offset = 0
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(12, 12, 12, 12)
+        layout.setSpacing(8)
+
+        self._input = QLineEdit()
+        self._input.setPlaceholderText("Caută în conversații și feedback...")
+        self._input.setFont(QFont("Noto Serif", 11))
+        self._input.setStyleSheet(f"""
+            QLineEdit {{
+                background: #1e1e2e;
+                color: {TEXT};
+                border: 1px solid #3a3a5a;
+                border-radius: 6px;
+                padding: 6px;
+            }}
+        """)
+        layout.addWidget(self._input)
+
+        self._results = QListWidget()
+        self._results.setStyleSheet(f"""
+            QListWidget {{
+                background: #1a1a2a;
+                color: {TEXT};
+                border-radius: 8px;
+                border: none;
+            }}
+            QListWidget::item {{ padding: 4px; }}
+            QListWidget::item:selected {{ background: #2a2a3a; }}
+        """)
+        self._results.itemActivated.connect(self._on_activated)
+        layout.addWidget(self._results)
+
+        self._more_btn = QPushButton("Mai multe rezultate")
+        self._more_btn.setFont(QFont("Noto Serif", 10))
+        self._more_btn.setStyleSheet(f"""
+            QPushButton {{
+                background: #2a2a3a;
+                color: {TEXT};
+                border-radius: 6px;
+                padding: 6px 12px;
+                border: none;
+            }}
+            QPushButton:hover {{ background: {ACCENT}; }}
+        """)
+        self._more_btn.clicked.connect(self._load_page)
+        self._more_btn.hide()
+        layout.addWidget(self._more_btn)
+
+        # Debounce so we query once the user pauses typing
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(250)
+        self._debounce.timeout.connect(self._new_search)
+        self._input.textChanged.connect(lambda _: self._debounce.start())
+        self._input.returnPressed.connect(self._new_search)
+
+    def _new_search(self):
+        self._debounce.stop()
+        self._results.clear()
+        self._offset = 0
+        self._load_page()
+
+    def _load_page(self):
+        from core.queries import query_executor
+        from db.database import search_history
+
+        query = self._input.text()
+        query_executor().read(search_history, query, limit=PAGE_SIZE, offset=self._offset,
+                              callback=partial(self._show_page, query, self._offset))
+
+    def _show_page(self, query: str, offset: int, hits: list[dict]):
+        # Dropped if the query changed, or the page was already shown, while it was read
+        if query != self._input.text() or offset != self._offset:
+            return
+        self._offset += len(hits)
+        for hit in hits:
+            self._add_hit(hit)
+        self._more_btn.setVisible(len(hits) == PAGE_SIZE)
+
+    def _add_hit(self, hit: dict):
+        source = "Feedback" if hit["kind"] == "feedback" else (
+            "Tu" if hit["role"] == "user" else "Alex"
+        )
+        label = QLabel(
+            f"<span style='color: {MUTED};'>Sesiunea {hit['session_id']} · {source}</span><br>"
+            f"{_snippet_html(hit['snippet'])}"
+        )
+        label.setTextFormat(Qt.TextFormat.RichText)
+        label.setWordWrap(True)
+        label.setFont(QFont("Noto Serif", 10))
+        label.setStyleSheet(f"color: {TEXT}; background: transparent; padding: 4px;")
+
+        item = QListWidgetItem()
+        item.setData(Qt.ItemDataRole.UserRole, (hit["session_id"], hit["message_id"]))
+        item.setSizeHint(label.sizeHint())
+        self._results.addItem(item)
+        self._results.setItemWidget(item, label)
+
+    def _on_activated(self, item: QListWidgetItem):
+        session_id, message_id = item.data(Qt.ItemDataRole.UserRole)
+        self.result_activated.emit(session_id, message_id)
@@ -0,0 +1,477 @@
+"""One conversation tab: a session's transcript and sidebar.
+
+A tab's widgets, API history and draft prewarmer are built the first
+time it is shown (load()) and dropped again by unload(), so a tab that
+isn't loaded costs a session id and nothing runs for it. MainWindow keeps
+the most recently used tabs loaded.
+
+Everything a turn stores outside the transcript (feedback, vocabulary,
+goals, level, stats) is written by store_analysis() on the query
+executor's writer thread, from the database alone, so it comes out the
+same whether the tab is loaded, unloaded or already closed. Editing a
+message, switching branches and jumping to a search hit move the
+session's head, so they too run on the writer thread (_edit_branch,
+_switch_branch, _checkout_message) and are shown from their callbacks,
+as is the learner's message, saved before it goes to the outbox.
+"""
+import os
+import time
+from functools import partial
+
+from PyQt6 import sip
+from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtWidgets import QSplitter, QVBoxLayout, QWidget
+
+from core.history import HistoryRing
+from core.prewarm import Prewarmer
+from core.profiling import profiled
+from core.queries import query_executor
+from core.tutor import HISTORY_WINDOW
+from ui.chat_widget import ChatWidget
+from ui.sidebar_widget import SidebarWidget
+
+# Live chat bubbles kept in memory; 0 keeps every bubble of the session
+MAX_BUBBLES = int(os.getenv("TUTOR_MAX_BUBBLES", "200"))
+PAGE_SIZE = 50
+# Rows shown when a session is opened; 0 shows the whole branch
+TAIL_SIZE = max(MAX_BUBBLES // 2, HISTORY_WINDOW) if MAX_BUBBLES > 0 else 0
+
+GREETING = (
+    "Hello! I'm Alex, your English tutor. How are you today? "
+    "Feel free to write in English — I'm here to help you practice!"
+)
+ANALYSIS_FAILED = "⚠️ Analiza acestui mesaj nu a reușit; răspunsul lui Alex nu e afectat."
+
+
+def _read_tail(session_id: int) -> list:
+    from db.database import get_messages, get_messages_page
+
+    return get_messages_page(session_id, limit=TAIL_SIZE) if TAIL_SIZE else get_messages(session_id)
+
+
+def _session_state(session_id: int) -> dict:
+    """What opening a session shows, read in one go on a reader thread."""
+    from db.database import count_messages, get_goals, get_session_level
+
+    return {
+        "rows": _read_tail(session_id),
+        "user_count": count_messages(session_id, "user"),
+        "goals": get_goals(session_id),
+        "level": get_session_level(session_id),
+    }
+
+
+def _fork_of(session_id: int, message_id: int) -> int | None:
+    """The message before message_id on its branch, where its alternatives fork off."""
+    from db.database import get_messages_page
+
+    parent = get_messages_page(session_id, before_id=message_id, limit=1)
+    return parent[0]["id"] if parent else None
+
+
+def _save_turn(session_id: int, text: str, context: str | None, profile: str | None) -> tuple[int, str]:
+    """Store the learner's message; returns its id and the context to send with it (built if not given).
+
+    On the writer thread, so turns are queued in the order they were sent.
+    """
+    from core.prewarm import turn_context
+    from db.database import save_message
+
+    message_id = save_message(session_id, "user", text)
+    return message_id, turn_context(text, profile) if context is None else context
+
+
+def _edit_branch(session_id: int, message_id: int, text: str, page_size: int) -> dict:
+    """Store text as a new alternative of message_id; returns it with the rows to show and its context."""
+    from core.prewarm import turn_context
+    from db.database import get_messages_page, save_branch_message
+
+    fork_id = _fork_of(session_id, message_id)
+    new_id = save_branch_message(session_id, "user", text, fork_id)
+    return {
+        "fork_id": fork_id,
+        "message_id": new_id,
+        "context": turn_context(text),
+        "rows": get_messages_page(session_id, after_id=fork_id or 0, limit=page_size),
+        "window": get_messages_page(session_id, before_id=new_id, limit=HISTORY_WINDOW),
+    }
+
+
+def _switch_branch(session_id: int, message_id: int, step: int, page_size: int) -> dict | None:
+    """Make the step-th alternative of message_id the active branch (at its end); None if there is none."""
+    from db.database import get_branch_leaf, get_messages_page, get_siblings, set_session_head
+
+    siblings = get_siblings(session_id, message_id)
+    index = siblings.index(message_id) + step
+    if not 0 <= index < len(siblings):
+        return None
+    set_session_head(session_id, get_branch_leaf(session_id, siblings[index]))
+    fork_id = _fork_of(session_id, siblings[index])
+    return {
+        "fork_id": fork_id,
+        "rows": get_messages_page(session_id, after_id=fork_id or 0, limit=page_size),
+        "window": get_messages_page(session_id, limit=HISTORY_WINDOW),
+    }
+
+
+def _checkout_message(session_id: int, message_id: int) -> dict | None:
+    """Make message_id's branch the active one; its tail and API window, or None if it already was."""
+    from db.database import get_branch_leaf, get_messages_page, is_on_active_branch, set_session_head
+
+    if is_on_active_branch(session_id, message_id):
+        return None
+    set_session_head(session_id, get_branch_leaf(session_id, message_id))
+    return {"tail": _read_tail(session_id), "window": get_messages_page(session_id, limit=HISTORY_WINDOW)}
+
+
+def _read_around(session_id: int, message_id: int, half: int) -> tuple[list, list]:
+    """Up to half rows before message_id, and message_id with up to half after it."""
+    from db.database import get_messages_page
+
+    before = get_messages_page(session_id, before_id=message_id, limit=half)
+    after = get_messages_page(session_id, after_id=before[-1]["id"] if before else 0, limit=half + 1)
+    return before, after
+
+
+def store_analysis(session_id: int, reply_id: int, data: dict) -> dict:
+    """Store a turn's analysis against its reply; returns what the sidebar shows of it."""
+    from db.database import (
+        count_messages, get_branch_path, get_session_level, get_stats, get_vocabulary,
+        invalidate_exercises, record_daily_rollup, save_feedback, save_goals, save_vocabulary,
+        tag_feedback, update_session_level, update_stats,
+    )
+    from core.lexicon import rank_vocabulary, smooth_level
+    from core.memory import sync_memory
+    from core.mistakes import classify
+
+    feedback = data.get("feedback") or {}
+    corrected = bool(feedback.get("correction"))
+    # The model's level and word list vary from turn to turn; check both
+    # against the local word index before they are stored
+    current = get_session_level(session_id)
+    learner_texts = [r["content"] for r in get_branch_path(reply_id, HISTORY_WINDOW) if r["role"] == "user"]
+    level = smooth_level(data.get("level", current), current, learner_texts)
+    new_words = rank_vocabulary(data.get("newWords", []), level)
+    goals = data.get("goals", [])
+
+    feedback_id = save_feedback(reply_id, feedback.get("positive", ""), feedback.get("correction"),
+                                feedback.get("tip", ""))
+    tag_feedback(feedback_id, classify(feedback.get("correction")))
+    if corrected:
+        sync_memory(batch_size=50)
+
+    added_words = save_vocabulary(new_words, session_id)
+    if added_words:
+        invalidate_exercises(session_id)
+    if goals:
+        save_goals(goals, session_id)
+    update_session_level(session_id, level)
+    record_daily_rollup(level, corrected, added_words)
+
+    stats = get_stats(session_id)
+    corrections = (stats["corrections_count"] if stats else 0) + corrected
+    accuracy = max(0.0, 100.0 - (corrections / max(count_messages(session_id, "user"), 1)) * 100)
+    update_stats(session_id, accuracy, len(get_vocabulary(session_id)), corrections)
+    return {"feedback": feedback, "level": level, "goals": goals}
+
+
+class SessionTab(QWidget):
+    """A session's chat and sidebar, built on demand.
+
+    MainWindow hands it the turns the outbox delivers for its session
+    (on_reply / on_analysis / on_error) whether or not it is loaded.
+    """
+
+    level_changed = pyqtSignal(str)
+
+    def __init__(self, session_id: int, outbox, prefetcher, parent=None):
+        super().__init__(parent)
+        self.session_id = session_id
+        self.level = "beginner"
+        self.last_used = 0.0
+        self._outbox = outbox
+        self._prefetcher = prefetcher
+        # Rehydrated pages must fit alongside the rows already on screen
+        self._page_size = max(min(PAGE_SIZE, MAX_BUBBLES // 2), 1)
+        self._offline: str | None = None
+        self._chat: ChatWidget | None = None
+        self._pending: list | None = None  # then() callbacks waiting for the transcript
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._chat is not None
+
+    def load(self, then=None) -> None:
+        """Build the tab if it isn't, and read the transcript; then() runs once it is shown."""
+        if self._pending is not None:
+            if then is not None:
+                self._pending.append(then)
+            return
+        if self.is_loaded:
+            if then is not None:
+                then()
+            return
+        self.last_used = time.monotonic()
+        self._history = HistoryRing(HISTORY_WINDOW)
+        self._prewarmer = Prewarmer(self._history, self)
+
+        self._splitter = QSplitter(Qt.Orientation.Horizontal)
+        self._splitter.setStyleSheet("QSplitter::handle { background: #2a2a3a; width: 1px; }")
+        self._splitter.setHandleWidth(1)
+        self._chat = ChatWidget(max_bubbles=MAX_BUBBLES)
+        self._sidebar = SidebarWidget(self.session_id)
+        self._splitter.addWidget(self._chat)
+        self._splitter.addWidget(self._sidebar)
+        self._splitter.setStretchFactor(0, 7)
+        self._splitter.setStretchFactor(1, 3)
+        self.layout().addWidget(self._splitter)
+
+        self._chat.message_submitted.connect(self._on_user_message)
+        self._chat.draft_changed.connect(self._prewarmer.on_draft)
+        self._chat.older_requested.connect(self._load_older)
+        self._chat.newer_requested.connect(self._load_newer)
+        self._chat.edit_submitted.connect(self._on_edit)
+        self._chat.branch_requested.connect(self._on_branch)
+        if self._offline:
+            self._chat.set_status(self._offline)
+
+        self._pending = [] if then is None else [then]
+        self._chat.set_input_enabled(False)
+        query_executor().read(_session_state, self.session_id, callback=self._show_history)
+
+    def unload(self) -> None:
+        """Drop the widgets and the in-memory history; the session is all in the database."""
+        if not self.is_loaded:
+            return
+        self._prewarmer.stop()
+        self._prewarmer.deleteLater()
+        self._splitter.deleteLater()
+        self._chat = self._sidebar = self._splitter = self._prewarmer = self._history = None
+        self._pending = None
+
+    @profiled("load_history")
+    def _show_history(self, state: dict):
+        if not self.is_loaded:
+            return
+        rows = self._show_tail(state["rows"])
+        if not rows:
+            self._chat.add_message(GREETING, "assistant")
+        self._history.extend(rows[-HISTORY_WINDOW:])
+        self._history.user_count = state["user_count"]
+        if state["goals"]:
+            self._sidebar.set_goals(state["goals"])
+        self._set_level(state["level"])
+        self._chat.set_input_enabled(True)
+        self._refresh_stats()
+        pending, self._pending = self._pending, None
+        for then in pending:
+            then()
+
+    def _set_level(self, level: str):
+        self.level = level
+        self.level_changed.emit(level)
+
+    def set_offline(self, status: str | None):
+        """Show the outbox's offline status (None once it is back online)."""
+        if status is None and self._offline is None:
+            return
+        self._offline = status
+        if self.is_loaded:
+            self._chat.set_status(status)
+            if status:
+                # Nothing waits on the connection: the learner keeps
+                # writing and the outbox sends it all once it is back
+                self._chat.set_input_enabled(True)
+
+    def _on_user_message(self, text: str):
+        submitted = time.perf_counter()
+        context, profile = self._prewarmer.context(text)
+
+        query_executor().write(_save_turn, self.session_id, text, context, profile,
+                               callback=partial(self._on_saved, text, context is not None, submitted))
+
+    def _on_saved(self, text: str, prewarmed: bool, submitted: float, saved: tuple[int, str]):
+        msg_id, context = saved
+        if self.is_loaded:
+            self._chat.add_message(text, "user", msg_id)
+            self._history.append("user", text, msg_id)
+        # Closed meanwhile: the message still gets its reply, read with the transcript
+        self._start_turn(msg_id, context, prewarmed, submitted)
+
+    def _on_edit(self, message_id: int, text: str):
+        """Branch off before message_id with text in its place and ask for a new reply."""
+        query_executor().write(_edit_branch, self.session_id, message_id, text, self._page_size,
+                               callback=partial(self._show_edit, text))
+
+    def _show_edit(self, text: str, result: dict):
+        if not self.is_loaded:
+            return  # the new message is queued for a reply when the tab is next opened
+        # Only the rows after the fork change, on screen and in the API history
+        fork_id, msg_id = result["fork_id"], result["message_id"]
+        if not self._chat.replace_suffix(fork_id, result["rows"]):
+            self._reload_tail()
+        if not self._history.fork(fork_id):
+            self._history.checkout(result["window"])
+        self._history.append("user", text, msg_id)
+        self._start_turn(msg_id, result["context"])
+
+    def _on_branch(self, message_id: int, step: int):
+        """Switch to the previous/next alternative of message_id, at the end of its branch."""
+        query_executor().write(_switch_branch, self.session_id, message_id, step, self._page_size,
+                               callback=self._show_branch)
+
+    def _show_branch(self, result: dict | None):
+        if result is None or not self.is_loaded:
+            return
+        rows = result["rows"]
+        if not self._chat.replace_suffix(result["fork_id"], rows, has_newer=len(rows) == self._page_size):
+            self._reload_tail()
+        self._history.checkout(result["window"])
+
+    def _start_turn(self, message_id: int, context: str, prewarmed: bool = False,
+                    submitted: float | None = None):
+        """Queue message_id for a reply; the learner waits for it only if it goes out straight away."""
+        submitted = time.perf_counter() if submitted is None else submitted
+        self._outbox.submit(self.session_id, message_id, context, submitted, prewarmed)
+
+    def on_started(self):
+        """The learner's message went out straight away: they wait for the reply."""
+        if self.is_loaded:
+            self._chat.set_input_enabled(False)
+            self._chat.set_typing(True)
+
+    @profiled("on_reply")
+    def on_reply(self, turn: dict, reply: str):
+        """Show a reply the outbox has stored, if the learner is still at the message it answers."""
+        if not self.is_loaded:
+            return  # it is read with the rest of the transcript when the tab is next shown
+        self._chat.set_typing(False)
+        # The learner can answer while the analysis is still on its way
+        self._chat.set_input_enabled(True)
+
+        head = self._history.head
+        if head is None or head.message_id != turn["message_id"]:
+            return  # on another branch now; it's there when they go back
+        self._chat.add_message(reply, "assistant", turn["reply_id"])
+        self._history.append("assistant", reply, turn["reply_id"])
+
+    def on_analysis(self, turn: dict, data: dict | None):
+        """Store the analysis of the learner's message against the reply of its turn."""
+        if data is None:
+            # The reply stays; just don't leave the previous turn's feedback up
+            if self.is_loaded:
+                self._sidebar.update_feedback("", None, ANALYSIS_FAILED)
+            self._prefetcher.maybe_refill(self.session_id, self.level)
+            return
+        query_executor().write(store_analysis, self.session_id, turn["reply_id"], data,
+                               callback=self._show_analysis)
+
+    @profiled("on_analysis")
+    def _show_analysis(self, result: dict):
+        if sip.isdeleted(self):
+            return  # closed while it was stored
+        self._set_level(result["level"])
+        if self.is_loaded:
+            feedback = result["feedback"]
+            if result["goals"]:
+                self._sidebar.set_goals(result["goals"])
+            self._sidebar.update_feedback(
+                feedback.get("positive", ""),
+                feedback.get("correction"),
+                feedback.get("tip", ""),
+            )
+            self._refresh_stats()
+            self._sidebar.mark_dashboard_dirty()
+
+        # Build quiz exercises while the learner reads the reply
+        self._prefetcher.maybe_refill(self.session_id, result["level"])
+
+    def on_error(self, turn: dict, error_msg: str):
+        if self.is_loaded:
+            self._chat.set_typing(False)
+            self._chat.set_input_enabled(True)
+            self._chat.add_message(error_msg, "assistant")
+
+    def _show_tail(self, rows: list) -> list:
+        """Show rows, the end of the session's active branch; returns them."""
+        self._chat.load_page(rows, has_older=bool(TAIL_SIZE) and len(rows) == TAIL_SIZE)
+        return rows
+
+    def _reload_tail(self):
+        query_executor().read(_read_tail, self.session_id, callback=self._on_tail)
+
+    def _on_tail(self, rows: list):
+        if self.is_loaded:
+            self._show_tail(rows)
+
+    def _refresh_stats(self):
+        from db.database import get_stats, get_cumulative_stats, get_error_profile
+
+        queries = query_executor()
+        queries.read(get_stats, self.session_id, callback=self._show_session_stats)
+        queries.read(get_cumulative_stats, callback=self._show_cumulative_stats)
+        queries.read(get_error_profile, callback=self._show_error_profile)
+
+    def _show_session_stats(self, stats):
+        if stats and self.is_loaded:
+            self._sidebar.update_session_stats(
+                self._history.user_count,
+                stats["corrections_count"],
+                stats["words_learned"],
+                stats["accuracy_pct"],
+            )
+
+    def _show_cumulative_stats(self, cum: dict):
+        if self.is_loaded:
+            self._sidebar.update_cumulative_stats(
+                cum["total_sessions"],
+                cum["total_words"],
+                cum["total_corrections"],
+                cum["avg_accuracy"],
+            )
+
+    def _show_error_profile(self, profile):
+        if self.is_loaded:
+            self._sidebar.update_error_profile(profile)
+
+    def show_message(self, message_id: int):
+        """Scroll to message_id, switching to its branch first if it is on another one."""
+        query_executor().write(_checkout_message, self.session_id, message_id,
+                               callback=partial(self._show_checkout, message_id))
+
+    def _show_checkout(self, message_id: int, result: dict | None):
+        if not self.is_loaded:
+            return
+        if result is not None:
+            self._show_tail(result["tail"])
+            self._history.checkout(result["window"])
+        if MAX_BUBBLES > 0 and not self._chat.has_message(message_id):
+            query_executor().read(_read_around, self.session_id, message_id, self._page_size,
+                                  callback=partial(self._show_around, message_id))
+        else:
+            self._chat.scroll_to_message(message_id)
+
+    def _show_around(self, message_id: int, pages: tuple[list, list]):
+        if not self.is_loaded:
+            return
+        before, after = pages
+        half = self._page_size
+        self._chat.load_page(before + after, has_older=len(before) == half, has_newer=len(after) == half + 1)
+        self._chat.scroll_to_message(message_id)
+
+    def _load_older(self, before_id: int):
+        from db.database import get_messages_page
+        query_executor().read(get_messages_page, self.session_id, before_id=before_id, limit=self._page_size,
+                              callback=partial(self._show_page, before_id, "prepend_page"))
+
+    def _load_newer(self, after_id: int):
+        from db.database import get_messages_page
+        query_executor().read(get_messages_page, self.session_id, after_id=after_id, limit=self._page_size,
+                              callback=partial(self._show_page, after_id, "append_page"))
+
+    def _show_page(self, anchor_id: int, show: str, rows):
+        # Dropped if the transcript was replaced (or the tab unloaded) while the page was read
+        if self.is_loaded and self._chat.has_message(anchor_id):
+            getattr(self._chat, show)(rows)
@@ -6,6 +6,9 @@ from PyQt6.QtWidgets import (
     QPushButton, QInputDialog, QLineEdit,
 )
 
+from ui.dashboard_widget import DashboardTab
+from ui.rich_text import RichText
+
 BG = "#0f0f13"
 SIDEBAR_BG = "#13131c"
 ACCENT = "#7c5cbf"
@@ -46,10 +49,8 @@ def _section(title: str, color: str, body: str) -> QFrame:
     title_lbl.setFont(QFont("Noto Serif", 9, QFont.Weight.Bold))
     title_lbl.setStyleSheet(f"color: {color}; background: transparent; border: none;")
 
-    body_lbl = QLabel(body or "—")
-    body_lbl.setWordWrap(True)
-    body_lbl.setFont(QFont("Noto Serif", 10))
-    body_lbl.setStyleSheet(f"color: {TEXT}; background: transparent; border: none;")
+    # Feedback is written in Markdown, like Alex's replies
+    body_lbl = RichText(body or "—", TEXT, QFont("Noto Serif", 10))
     body_lbl.setObjectName("body")
 
     layout.addWidget(title_lbl)
@@ -75,21 +76,18 @@ class FeedbackTab(QWidget):
         layout.addWidget(self._tip_frame)
         layout.addStretch()
 
-    def _get_body(self, frame: QFrame) -> QLabel:
-        for i in range(frame.layout().count()):
-            w = frame.layout().itemAt(i).widget()
-            if isinstance(w, QLabel) and w.objectName() == "body":
-                return w
+    def _get_body(self, frame: QFrame) -> RichText:
+        return frame.findChild(RichText, "body")
 
     def update_feedback(self, positive: str, correction: str | None, tip: str):
-        self._get_body(self._positive_frame).setText(positive or "—")
-        self._get_body(self._correction_frame).setText(correction or "—")
-        self._get_body(self._tip_frame).setText(tip or "—")
+        self._get_body(self._positive_frame).set_text(positive or "—")
+        self._get_body(self._correction_frame).set_text(correction or "—")
+        self._get_body(self._tip_frame).set_text(tip or "—")
 
     def reset(self):
-        self._get_body(self._positive_frame).setText("—")
-        self._get_body(self._correction_frame).setText("—")
-        self._get_body(self._tip_frame).setText("—")
+        self._get_body(self._positive_frame).set_text("—")
+        self._get_body(self._correction_frame).set_text("—")
+        self._get_body(self._tip_frame).set_text("—")
 
 
 class GoalsTab(QWidget):
@@ -145,6 +143,10 @@ class GoalsTab(QWidget):
         btn_row.addWidget(del_btn)
         layout.addLayout(btn_row)
 
+    def set_session(self, session_id: int):
+        self._session_id = session_id
+        self._list.clear()
+
     def set_goals(self, goals: list[str]):
         self._list.clear()
         for g in goals:
@@ -160,9 +162,10 @@ class GoalsTab(QWidget):
 
     def _add_goal(self):
         from db.database import add_goal
+        from core.queries import query_executor
         text, ok = QInputDialog.getText(self, "Obiectiv nou", "Obiectiv:", QLineEdit.EchoMode.Normal)
         if ok and text.strip():
-            add_goal(text.strip(), self._session_id)
+            query_executor().write(add_goal, text.strip(), self._session_id)
             item = QListWidgetItem(f"• {text.strip()}")
             item.setData(Qt.ItemDataRole.UserRole, text.strip())
             self._list.addItem(item)
@@ -170,10 +173,11 @@ class GoalsTab(QWidget):
 
     def _delete_goal(self):
         from db.database import delete_goal
+        from core.queries import query_executor
         current = self._list.currentItem()
         if current:
             goal_text = current.data(Qt.ItemDataRole.UserRole)
-            delete_goal(goal_text, self._session_id)
+            query_executor().write(delete_goal, goal_text, self._session_id)
             self._list.takeItem(self._list.row(current))
             self.goals_changed.emit()
 
@@ -229,6 +233,18 @@ class ProgressTab(QWidget):
         layout.addWidget(self._cum_corrections)
         layout.addWidget(self._cum_accuracy)
 
+        layout.addWidget(self._make_separator())
+
+        # Recurring mistakes
+        err_lbl = QLabel("Greșeli frecvente")
+        err_lbl.setFont(QFont("Noto Serif", 10, QFont.Weight.Bold))
+        err_lbl.setStyleSheet(f"color: {ACCENT};")
+        layout.addWidget(err_lbl)
+
+        self._error_profile = self._make_stat("—")
+        self._error_profile.setWordWrap(True)
+        layout.addWidget(self._error_profile)
+
         layout.addStretch()
 
     def _make_label(self, text: str) -> QLabel:
@@ -281,6 +297,11 @@ class ProgressTab(QWidget):
         self._cum_corrections.setText(f"Corecții totale: {total_corrections}")
         self._cum_accuracy.setText(f"Acuratețe medie: {avg_accuracy:.1f}%")
 
+    def update_error_profile(self, profile: list[tuple[str, int]]):
+        from core.mistakes import LABELS
+        lines = [f"{LABELS.get(cat, cat)}: {count}" for cat, count in profile]
+        self._error_profile.setText("\n".join(lines) or "—")
+
 
 class SidebarWidget(QWidget):
     def __init__(self, session_id: int, parent=None):
@@ -300,13 +321,20 @@ class SidebarWidget(QWidget):
         self._feedback_tab = FeedbackTab()
         self._goals_tab = GoalsTab(self._session_id)
         self._progress_tab = ProgressTab()
+        self._dashboard_tab = DashboardTab()
 
         self._tabs.addTab(self._feedback_tab, "Feedback")
         self._tabs.addTab(self._goals_tab, "Obiective")
         self._tabs.addTab(self._progress_tab, "Progres")
+        self._tabs.addTab(self._dashboard_tab, "Evoluție")
 
         layout.addWidget(self._tabs)
 
+    def set_session(self, session_id: int):
+        self._session_id = session_id
+        self._goals_tab.set_session(session_id)
+        self._feedback_tab.reset()
+
     def update_feedback(self, positive: str, correction: str | None, tip: str):
         self._feedback_tab.update_feedback(positive, correction, tip)
         self._tabs.setCurrentIndex(0)
@@ -319,3 +347,9 @@ class SidebarWidget(QWidget):
 
     def update_cumulative_stats(self, sessions: int, total_words: int, total_corrections: int, avg_accuracy: float):
         self._progress_tab.update_cumulative_stats(sessions, total_words, total_corrections, avg_accuracy)
+
+    def update_error_profile(self, profile: list[tuple[str, int]]):
+        self._progress_tab.update_error_profile(profile)
+
+    def mark_dashboard_dirty(self):
+        self._dashboard_tab.mark_dirty()